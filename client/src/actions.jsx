@@ -19,11 +19,39 @@ import {
 
 const SERVER_URL = "http://localhost:5000";
 
+// Number of events in the event summary (the rest is aggregated into an "other" bar).
+const EVENT_SUMMARY_TOP_K = 20;
+
+// Identifies the session (i.e., the selected experiment) of this tab on the server.
+const SESSION_ID = (() => {
+	let sessionId = window.sessionStorage.getItem("dmv_session");
+	if (!sessionId) {
+		sessionId =
+			Math.random().toString(36).slice(2) + Date.now().toString(36);
+		window.sessionStorage.setItem("dmv_session", sessionId);
+	}
+	return sessionId;
+})();
+
+// The selected experiment is mirrored to the server on every request, so that
+// any of the (production) worker processes can serve the session.
+function sessionHeaders() {
+	return {
+		"X-DMV-Session": SESSION_ID,
+		"X-DMV-Experiment": encodeURIComponent(
+			window.sessionStorage.getItem("dmv_experiment") || ""
+		)
+	};
+}
+
 async function POSTWrapper(url_path, json_data) {
 	const request_context = {
 		// credentials: 'include',
 		method: "POST",
-		headers: { "Content-Type": "application/json" },
+		headers: {
+			"Content-Type": "application/json",
+			...sessionHeaders()
+		},
 		body: JSON.stringify(json_data),
 		mode: "cors"
 	};
@@ -37,7 +65,10 @@ async function GETWrapper(url_path) {
 	const request_context = {
 		// credentials: 'include',
 		method: "GET",
-		headers: { "Content-Type": "application/json" },
+		headers: {
+			"Content-Type": "application/json",
+			...sessionHeaders()
+		},
 		mode: "cors"
 	};
 
@@ -87,15 +118,17 @@ export const fetchTimeline = (window_start, window_end) => async (dispatch) => {
 
 export const fetchMetadata = (exp) => async (dispatch) => {
 	const metadata = await POSTWrapper("set_experiment", { experiment: exp });
+	window.sessionStorage.setItem("dmv_experiment", exp);
 	dispatch({
 		type: FETCH_METADATA,
 		payload: metadata
 	});
 };
 
-export const fetchEventSummary = (groups) => async (dispatch) => {
+export const fetchEventSummary = (groups, top_k = EVENT_SUMMARY_TOP_K) => async (dispatch) => {
 	const eventSummary = await POSTWrapper("fetch_event_summary", {
-		groups: groups
+		groups: groups,
+		top_k: top_k
 	});
 	dispatch({
 		type: FETCH_EVENT_SUMMARY,
@@ -168,7 +201,10 @@ export const updateIndividualSummary = (sorted) => async (dispatch) => {
 export const fetchTopology = () => async (dispatch) => {
 	const request_context = {
 		method: "GET",
-		headers: { "Content-Type": "application/svg" },
+		headers: {
+			"Content-Type": "application/svg",
+			...sessionHeaders()
+		},
 		mode: "cors"
 	};
 	const response = await fetch(
@@ -13,7 +13,8 @@ export const COLORS = {
 	"fg-4": "#E43F3A",
 	"fg-5": "#69ff6233",
 	"fg-6": "#41BBD9",
-	"fg-7": "#383961"
+	"fg-7": "#383961",
+	other: "#d9d9d9"
 };
 
 export const CONFIG_LEGEND = {
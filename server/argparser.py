@@ -1,8 +1,10 @@
 import argparse
+import os
 from server.logger import get_logger
 
 LOGGER = get_logger(__name__)
 ALLOWED_FORMATS = ["DMV"]
+ALLOWED_MODES = ["development", "production"]
 
 
 class ArgParser:
@@ -46,6 +48,69 @@ class ArgParser:
             type=str,
             required=False,
         )
+        parser.add_argument(
+            "--load_workers",
+            help="Number of processes used to load the experiments in --data_dir (0 uses all the cores).",
+            type=int,
+            default=1,
+            required=False,
+        )
+        parser.add_argument(
+            "--lazy",
+            help="Construct the timelines on first access and keep only the recently used ones in memory.",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--max_profiles",
+            help="Maximum number of timelines kept in memory in the --lazy mode.",
+            type=int,
+            required=False,
+        )
+        parser.add_argument(
+            "--max_profile_mb",
+            help="Maximum memory (in MB) of the timelines kept in memory in the --lazy mode.",
+            type=int,
+            required=False,
+        )
+        parser.add_argument(
+            "--no_cache",
+            help="Do not persist (or reuse) the processed timelines in the .dmv directory.",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--watch_interval",
+            help="Poll --data_dir every this many seconds and ingest the new, changed or deleted experiments (0 disables it).",
+            type=float,
+            required=False,
+        )
+        parser.add_argument(
+            "--mode",
+            help="Serving mode: development (single process, reloader) or production (preloaded data, forked workers).",
+            type=str,
+            choices=ALLOWED_MODES,
+            default="development",
+            required=False,
+        )
+        parser.add_argument(
+            "--workers",
+            help="Number of worker processes in the production mode.",
+            type=int,
+            default=os.cpu_count() or 1,
+            required=False,
+        )
+        parser.add_argument(
+            "--record_sample_rate",
+            help="Fraction of the requests recorded in the .dmv directory (0 disables the recording).",
+            type=float,
+            default=1.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--record_max_mb",
+            help="Responses larger than this (in MB) are not written by the recorder.",
+            type=int,
+            required=False,
+        )
         return parser
 
     def _verify_parser(self):
@@ -60,6 +125,31 @@ class ArgParser:
 
         _has_data_dir = self.args["data_dir"] is not None
 
+        if not 0 <= self.args["record_sample_rate"] <= 1:
+            LOGGER.error(f"Option --record_sample_rate must be between 0 and 1.")
+            self.parser.print_help()
+            exit(1)
+
+        if self.args["watch_interval"] is not None and self.args["watch_interval"] < 0:
+            LOGGER.error(f"Option --watch_interval must be a non-negative number.")
+            self.parser.print_help()
+            exit(1)
+
+        if self.args["mode"] == "production" and not _has_data_dir:
+            LOGGER.error(f"Option --data_dir is required in the production mode.")
+            self.parser.print_help()
+            exit(1)
+
+        if self.args["workers"] < 1:
+            LOGGER.error(f"Option --workers must be a positive integer.")
+            self.parser.print_help()
+            exit(1)
+
+        if self.args["load_workers"] < 0:
+            LOGGER.error(f"Option --load_workers must be a non-negative integer.")
+            self.parser.print_help()
+            exit(1)
+
         # if not _has_data_dir:
         #     LOGGER.error(f"Option --data_dir not provided.")
         #     self.parser.print_help()
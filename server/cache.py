@@ -0,0 +1,353 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # NOTE: Not available on Windows, where the entries are not locked.
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from server.logger import get_logger
+from server.timeline import Timeline
+from server.utils import create_dir_after_check
+
+LOGGER = get_logger(__name__)
+
+# NOTE: Bump the version whenever the state of a Timeline changes, so that stale entries are invalidated.
+CACHE_VERSION = 10
+
+# Number of bytes hashed from the head and tail of each file for the fingerprint.
+HASH_SAMPLE_SIZE = 1 << 20
+
+MANIFEST_FILE = "manifest.json"
+LOCK_SUFFIX = ".lock"
+STATE_FILE = "state.pkl"
+
+
+class _ArrayRef:
+    """
+    Placeholder for a numpy array stored as a `.npy` file in the cache entry.
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+
+class _FrameRef:
+    """
+    Placeholder for a pandas.DataFrame whose columns (and index) are stored in the cache entry.
+    """
+
+    def __init__(self, columns: Dict, index):
+        self.columns = columns
+        self.index = index
+
+
+class _ObjectRef:
+    """
+    Placeholder for a helper object (e.g., WindowIndex) whose attributes are stored in the cache entry.
+    """
+
+    def __init__(self, cls: type, attrs: Dict):
+        self.cls = cls
+        self.attrs = attrs
+
+
+class TimelineCache:
+    """
+    On-disk cache of the processed Timelines (typically under `.dmv/cache`).
+
+    Each experiment is stored in its own entry, keyed by the trace file path,
+    and validated by a fingerprint of the trace and metric files (path, size,
+    mtime and a hash of their content). Numeric columns are stored as `.npy`
+    files and memory-mapped on load; string columns are stored as integer
+    codes into a table of unique values.
+
+    An entry is constructed under a file lock, so that concurrent processes
+    (e.g., the production workers watching the same `data_dir`) construct it
+    once and the others load it.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        create_dir_after_check(self.cache_dir)
+
+    @staticmethod
+    def fingerprint(*file_paths: str) -> str:
+        """
+        Fingerprint of the files backing a Timeline. The content hash only
+        covers the head and tail of each file so that validating a large
+        trace stays cheap.
+        """
+        digest = hashlib.blake2b(str(CACHE_VERSION).encode(), digest_size=16)
+        for file_path in file_paths:
+            digest.update(os.path.abspath(file_path).encode())
+            if not os.path.exists(file_path):
+                digest.update(b"missing")
+                continue
+
+            stat = os.stat(file_path)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+            with open(file_path, "rb") as f:
+                digest.update(f.read(HASH_SAMPLE_SIZE))
+                if stat.st_size > HASH_SAMPLE_SIZE:
+                    f.seek(max(HASH_SAMPLE_SIZE, stat.st_size - HASH_SAMPLE_SIZE))
+                    digest.update(f.read(HASH_SAMPLE_SIZE))
+
+        return digest.hexdigest()
+
+    def entry_dir(self, trace_file_path: str) -> str:
+        name = os.path.splitext(os.path.basename(trace_file_path))[0]
+        key = hashlib.blake2b(
+            os.path.abspath(trace_file_path).encode(), digest_size=8
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}-{key}")
+
+    def load_or_construct(
+        self, metric_file_path: str, trace_file_path: str, profile_format: str
+    ) -> Timeline:
+        """
+        Returns the cached Timeline if it is still valid, else constructs the
+        Timeline and stores it in the cache.
+        """
+        fingerprint = TimelineCache.fingerprint(trace_file_path, metric_file_path)
+
+        timeline = self.load(trace_file_path, fingerprint)
+        if timeline is not None:
+            LOGGER.debug(f"Loaded {trace_file_path} from the cache.")
+            return timeline
+
+        with self._entry_lock(trace_file_path):
+            # NOTE: Another process may have stored the entry while this one waited for the lock.
+            timeline = self.load(trace_file_path, fingerprint)
+            if timeline is not None:
+                LOGGER.debug(f"Loaded {trace_file_path} from the cache.")
+                return timeline
+
+            timeline = Timeline(metric_file_path, trace_file_path, profile_format)
+            try:
+                self.store(timeline, trace_file_path, fingerprint)
+            except OSError as e:
+                LOGGER.warning(f"Failed to cache {trace_file_path}: {e}")
+        return timeline
+
+    def load_scalars(self, metric_file_path: str, trace_file_path: str) -> Optional[Dict]:
+        """
+        Returns the cached `Timeline.get_scalars`, if the entry is still valid.
+        """
+        fingerprint = TimelineCache.fingerprint(trace_file_path, metric_file_path)
+        manifest = self._read_manifest(trace_file_path, fingerprint)
+        if manifest is None:
+            return None
+        return manifest["scalars"]
+
+    def load(self, trace_file_path: str, fingerprint: str) -> Optional[Timeline]:
+        entry_dir = self.entry_dir(trace_file_path)
+        if self._read_manifest(trace_file_path, fingerprint) is None:
+            return None
+
+        try:
+            with open(os.path.join(entry_dir, STATE_FILE), "rb") as f:
+                state = pickle.load(f)
+            state = TimelineCache._resolve(state, entry_dir)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError) as e:
+            LOGGER.warning(f"Ignoring the corrupted cache entry {entry_dir}: {e}")
+            return None
+
+        timeline = Timeline.__new__(Timeline)
+        timeline.__setstate__(state)
+        return timeline
+
+    def store(self, timeline: Timeline, trace_file_path: str, fingerprint: str) -> None:
+        entry_dir = self.entry_dir(trace_file_path)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        state = TimelineCache._externalize(timeline.__getstate__(), tmp_dir, [0])
+        with open(os.path.join(tmp_dir, STATE_FILE), "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        manifest = {
+            "version": CACHE_VERSION,
+            "fingerprint": fingerprint,
+            "trace_file_path": os.path.abspath(trace_file_path),
+            "scalars": timeline.get_scalars(),
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f)
+
+        # Swap the entry in one step, so that a partially written entry is never read.
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # NOTE: A concurrent writer (e.g., without the lock) swapped in its entry in between;
+            # it is as good as this one if it is valid.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if self._read_manifest(trace_file_path, fingerprint) is None:
+                raise
+        LOGGER.debug(f"Cached {trace_file_path} at {entry_dir}.")
+
+    @contextmanager
+    def _entry_lock(self, trace_file_path: str) -> Iterator[None]:
+        """
+        Holds an exclusive (inter-process) lock on the entry of a trace.
+        """
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.entry_dir(trace_file_path) + LOCK_SUFFIX, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self, trace_file_path: str, fingerprint: str) -> Optional[Dict]:
+        manifest_path = os.path.join(self.entry_dir(trace_file_path), MANIFEST_FILE)
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get("fingerprint") != fingerprint:
+            return None
+        return manifest
+
+    ################### Serialization ###################
+    @staticmethod
+    def _externalize(obj, entry_dir: str, counter: list):
+        """
+        Replaces the DataFrames and numeric arrays (recursively inside dicts)
+        with references to the files written in `entry_dir`.
+        """
+        if isinstance(obj, pd.DataFrame):
+            columns = {
+                col: TimelineCache._dump_series(obj[col], entry_dir, counter)
+                for col in obj.columns
+            }
+            index = None
+            if not obj.index.equals(pd.RangeIndex(obj.shape[0])):
+                index = TimelineCache._dump_series(obj.index.to_series(), entry_dir, counter)
+            return _FrameRef(columns, index)
+
+        if isinstance(obj, np.ndarray) and obj.dtype != object:
+            return TimelineCache._dump_array(obj, entry_dir, counter)
+
+        if isinstance(obj, dict):
+            return {
+                key: TimelineCache._externalize(val, entry_dir, counter)
+                for key, val in obj.items()
+            }
+
+        if type(obj).__module__.startswith("server.") and hasattr(obj, "__dict__"):
+            return _ObjectRef(type(obj), TimelineCache._externalize(obj.__dict__, entry_dir, counter))
+
+        return obj
+
+    @staticmethod
+    def _dump_array(arr: np.ndarray, entry_dir: str, counter: list) -> _ArrayRef:
+        file_name = f"{counter[0]}.npy"
+        counter[0] += 1
+        np.save(os.path.join(entry_dir, file_name), np.ascontiguousarray(arr))
+        return _ArrayRef(file_name)
+
+    @staticmethod
+    def _dump_series(series: pd.Series, entry_dir: str, counter: list) -> Dict:
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            return {
+                "encoding": "category",
+                "codes": TimelineCache._dump_array(series.cat.codes.to_numpy(), entry_dir, counter),
+                "categories": series.cat.categories.tolist(),
+                "ordered": dtype.ordered,
+            }
+
+        if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+            return {
+                "encoding": "array",
+                "values": TimelineCache._dump_array(series.to_numpy(), entry_dir, counter),
+            }
+
+        if isinstance(dtype, (pd.Int64Dtype, pd.Float64Dtype)):
+            # Nullable numeric columns are stored as their values and mask.
+            return {
+                "encoding": "masked",
+                "values": TimelineCache._dump_array(
+                    series.to_numpy(dtype=dtype.numpy_dtype, na_value=0), entry_dir, counter
+                ),
+                "mask": TimelineCache._dump_array(series.isna().to_numpy(), entry_dir, counter),
+                "dtype": str(dtype),
+            }
+
+        try:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        except TypeError:
+            # Unhashable values (e.g., lists) are pickled as they are.
+            return {"encoding": "pickle", "values": series.tolist(), "dtype": str(dtype)}
+
+        return {
+            "encoding": "factorized",
+            "codes": TimelineCache._dump_array(codes, entry_dir, counter),
+            "uniques": list(uniques),
+            "dtype": str(dtype),
+        }
+
+    @staticmethod
+    def _resolve(obj, entry_dir: str):
+        if isinstance(obj, _FrameRef):
+            columns = {
+                col: TimelineCache._load_series(enc, entry_dir)
+                for col, enc in obj.columns.items()
+            }
+            index = None
+            if obj.index is not None:
+                index = pd.Index(TimelineCache._load_series(obj.index, entry_dir))
+            return pd.DataFrame(columns, index=index, copy=False)
+
+        if isinstance(obj, _ArrayRef):
+            return np.load(os.path.join(entry_dir, obj.file_name), mmap_mode="r")
+
+        if isinstance(obj, _ObjectRef):
+            ret = obj.cls.__new__(obj.cls)
+            ret.__dict__.update(TimelineCache._resolve(obj.attrs, entry_dir))
+            return ret
+
+        if isinstance(obj, dict):
+            return {key: TimelineCache._resolve(val, entry_dir) for key, val in obj.items()}
+
+        return obj
+
+    @staticmethod
+    def _load_series(enc: Dict, entry_dir: str):
+        if enc["encoding"] == "array":
+            return TimelineCache._resolve(enc["values"], entry_dir)
+
+        if enc["encoding"] == "masked":
+            values = np.asarray(TimelineCache._resolve(enc["values"], entry_dir))
+            mask = np.asarray(TimelineCache._resolve(enc["mask"], entry_dir))
+            if enc["dtype"] == "Int64":
+                return pd.arrays.IntegerArray(values, mask)
+            return pd.arrays.FloatingArray(values, mask)
+
+        if enc["encoding"] == "pickle":
+            return pd.Series(enc["values"], dtype=enc["dtype"]).array
+
+        codes = np.asarray(TimelineCache._resolve(enc["codes"], entry_dir))
+        if enc["encoding"] == "category":
+            return pd.Categorical.from_codes(
+                codes, categories=enc["categories"], ordered=enc["ordered"]
+            )
+
+        values = pd.Categorical.from_codes(codes, categories=pd.Index(enc["uniques"], dtype=object))
+        return pd.Series(values).astype(enc["dtype"]).array
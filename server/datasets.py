@@ -1,23 +1,67 @@
 import os
+import bisect
 import math
+import multiprocessing
 import random
+import threading
+import time
 import numpy as np
-from typing import List, Dict
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Iterator, List, Dict, Tuple
 from glob import glob
 
+from server.cache import TimelineCache
 from server.logger import get_logger
 from server.timeline import Timeline
 
 LOGGER = get_logger(__name__)
 
+# NOTE: The pool is started from a fresh server process rather than forked, since the
+# caller may hold threads (e.g., the watcher or the Flask workers) and their locks.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Scalars (see `Timeline.get_scalars`) the ensemble is kept sorted by.
+SORT_ORDERS = ["event_count", "start_ts", "runtime"]
+
 
 class Datasets:
-    def __init__(self, data_dir: str, profile_format: str):
+    def __init__(
+        self,
+        data_dir: str,
+        profile_format: str,
+        workers: int = 1,
+        lazy: bool = False,
+        max_profiles: int = None,
+        max_bytes: int = None,
+        cache_dir: str = None,
+        watch_interval: float = None,
+    ):
         """
         Dataset class for collecting the profiles from the input `data_dir`.
+
+        By default, all the Timelines are constructed upfront. In the lazy mode,
+        a Timeline is constructed on its first access and only a bounded number
+        of them (by count and by estimated bytes) are kept in a LRU cache. The
+        scalars required to sort and summarize the ensemble are always kept in
+        `self.index`.
+
+        In the watch mode (see `start_watching`), `data_dir` is polled every
+        `watch_interval` seconds and the new, changed or deleted experiments are
+        applied incrementally (see `refresh`).
+
+        :params: workers: Number of processes used to load the profiles (0 uses all the cores).
+        :params: lazy: Construct the Timelines on demand.
+        :params: max_profiles: Maximum number of Timelines held in lazy mode.
+        :params: max_bytes: Maximum estimated bytes of the Timelines held in lazy mode.
+        :params: cache_dir: Directory to persist the processed Timelines (see TimelineCache).
+        :params: watch_interval: Seconds between two polls of `data_dir` in the watch mode.
         """
         self.data_dir = data_dir
-        self.ensemble = set(filename.split(".")[0].split("/")[-1] for filename in glob(f"{data_dir}/*.json"))
+        self.profile_format = profile_format
+        self.files = Datasets.scan_files(data_dir)
+        self.ensemble = set(self.files)
 
         self.traces = {
             exp: os.path.join(data_dir, exp) + ".json" for exp in self.ensemble
@@ -30,26 +74,161 @@ class Datasets:
             exp: os.path.join(data_dir, exp) + ".svg" for exp in self.ensemble
         }
 
-        self.profiles = {
-            exp: Timeline(self.metrics[exp], self.traces[exp], profile_format)
-            for exp in self.ensemble
-        }
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.lazy = lazy
+        self.max_profiles = max_profiles
+        self.max_bytes = max_bytes
+        self.watch_interval = watch_interval
+        self.version = 0
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self._profile_bytes = {}
+        self._loading = {}
+        self._summary_cache = {}
+        self._individual_summary_cache = {}
+
+        if self.lazy:
+            self.profiles = OrderedDict()
+            self.index = self.scan_profiles(workers)
+        else:
+            self.profiles = self.load_profiles(workers)
+            self.index = {
+                exp: profile.get_scalars() for exp, profile in self.profiles.items()
+            }
+        self._orders = Datasets._update_orders({key: [] for key in SORT_ORDERS}, {}, self.index)
 
-        LOGGER.info(f"{len(self.ensemble)} JIT profiles loaded! ")
+        LOGGER.info(f"{len(self.ensemble)} JIT profiles {'indexed' if self.lazy else 'loaded'}! ")
         LOGGER.info(f"=====================================")
-        for name, profile in self.profiles.items():
-            LOGGER.info(f"{name} contains {profile.get_event_count()} events. ")
+        for name, scalars in self.index.items():
+            LOGGER.info(f"{name} contains {scalars['event_count']} events. ")
         LOGGER.info(f"=====================================")
 
-        self.get_summary()
+        if not self.lazy:
+            self.get_summary()
+
+    @staticmethod
+    def scan_files(data_dir: str) -> Dict[str, Tuple]:
+        """
+        Returns the (size, mtime) of the trace and the metric files of every
+        experiment in `data_dir` (None for a missing metric file).
+        """
+        files = {}
+        for trace_file_path in glob(f"{data_dir}/*.json"):
+            experiment = os.path.splitext(os.path.basename(trace_file_path))[0]
+            try:
+                trace_stat = os.stat(trace_file_path)
+            except FileNotFoundError:
+                continue
+
+            try:
+                metric_stat = os.stat(os.path.join(data_dir, experiment) + ".csv")
+                metric_stat = (metric_stat.st_size, metric_stat.st_mtime_ns)
+            except FileNotFoundError:
+                metric_stat = (None, None)
+
+            files[experiment] = (trace_stat.st_size, trace_stat.st_mtime_ns, *metric_stat)
+        return files
+
+    def load_profiles(self, workers: int = 1) -> Dict[str, Timeline]:
+        """
+        Constructs the Timeline object for every experiment. When workers != 1,
+        each experiment is loaded as a separate task in a process pool and the
+        (pickled) Timeline is returned to the parent process.
+
+        :params: workers: Number of processes (0 uses all the cores).
+        :returns: Dictionary containing all the experiment timelines.
+        """
+        experiments = sorted(self.ensemble)
+        tasks = [self._task(exp) for exp in experiments]
+        timelines = Datasets._map_tasks(Datasets._load_profile, tasks, workers)
+        return dict(zip(experiments, timelines))
+
+    def scan_profiles(self, workers: int = 1) -> Dict[str, Dict]:
+        """
+        Collects the scalars of every experiment (see `Timeline.scan`) without
+        constructing the Timelines.
+
+        :params: workers: Number of processes (0 uses all the cores).
+        :returns: Dictionary containing the scalars for all experiments.
+        """
+        experiments = sorted(self.ensemble)
+        tasks = [self._task(exp) for exp in experiments]
+        scalars = Datasets._map_tasks(Datasets._scan_profile, tasks, workers)
+        return dict(zip(experiments, scalars))
+
+    def _task(self, experiment: str) -> Tuple:
+        return (
+            os.path.join(self.data_dir, experiment) + ".csv",
+            os.path.join(self.data_dir, experiment) + ".json",
+            self.profile_format,
+            self.cache_dir,
+        )
+
+    @staticmethod
+    def _map_tasks(func: Callable, tasks: List[Tuple], workers: int) -> List:
+        if workers == 0:
+            workers = os.cpu_count()
+        workers = min(workers, len(tasks))
+
+        if workers <= 1:
+            return [func(task) for task in tasks]
+
+        LOGGER.info(f"Processing {len(tasks)} profiles using {workers} processes.")
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD)
+        ) as executor:
+            return list(executor.map(func, tasks))
+
+    @staticmethod
+    def _load_profile(task) -> Timeline:
+        metric_file_path, trace_file_path, profile_format, cache_dir = task
+        if cache_dir is None:
+            return Timeline(metric_file_path, trace_file_path, profile_format)
+
+        cache = TimelineCache(cache_dir)
+        return cache.load_or_construct(metric_file_path, trace_file_path, profile_format)
+
+    @staticmethod
+    def _scan_profile(task) -> Dict:
+        metric_file_path, trace_file_path, profile_format, cache_dir = task
+        if cache_dir is not None:
+            scalars = TimelineCache(cache_dir).load_scalars(metric_file_path, trace_file_path)
+            if scalars is not None:
+                return scalars
+
+        return Timeline.scan(trace_file_path, profile_format)
+
+    @staticmethod
+    def _try_task(func: Callable, task: Tuple) -> Tuple:
+        # NOTE: Timeline exits on an invalid profile (e.g., a file still being
+        # written), which must not stop the watcher (or the process pool).
+        try:
+            return func(task), None
+        except (Exception, SystemExit) as e:
+            return None, repr(e)
 
     def get_all_profiles(self) -> Dict[str, Timeline]:
         """
         Returns the Timeline object for all experiments.
+        NOTE: In lazy mode, this constructs every Timeline. Prefer `iter_profiles`.
 
         :returns: Dictionary containing all the experiment timelines.
         """
-        return self.profiles
+        if not self.lazy:
+            return self.profiles
+
+        return dict(self.iter_profiles())
+
+    def iter_profiles(self) -> Iterator[Tuple[str, Timeline]]:
+        """
+        Iterates over the (experiment, Timeline) pairs, constructing (and
+        evicting) the Timelines on demand in lazy mode.
+        """
+        for exp in sorted(self.ensemble):
+            yield exp, self.get_profile(exp)
 
     def get_profile(self, experiment: str) -> Timeline:
         """
@@ -58,11 +237,226 @@ class Datasets:
         :params: experiment: Name of the experiment (aka JSON file name) with prefix (i.e., .json)
         :returns: Timeline object corresponding to the experiment.
         """
-        if experiment not in self.profiles:
+        if experiment not in self.ensemble:
             LOGGER.error(
                 f"Invalid {experiment}! Check if the experiment exists in {self.data_dir}"
             )
-        return self.profiles[experiment]
+
+        if not self.lazy:
+            return self.profiles[experiment]
+
+        # NOTE: The Timeline is constructed without holding the lock, so that the
+        # requests for the other experiments are not blocked by a cold load.
+        # The concurrent requests for the same experiment wait on its future.
+        with self._lock:
+            if experiment in self.profiles:
+                self.profiles.move_to_end(experiment)
+                return self.profiles[experiment]
+
+            future = self._loading.get(experiment)
+            is_loading = future is not None
+            if not is_loading:
+                future = self._loading[experiment] = Future()
+
+        if is_loading:
+            return future.result()
+
+        LOGGER.debug(f"Constructing the timeline for {experiment}.")
+        try:
+            profile = Datasets._load_profile(self._task(experiment))
+            profile_bytes = profile.get_memory_usage()
+        except BaseException as e:
+            with self._lock:
+                if self._loading.get(experiment) is future:
+                    del self._loading[experiment]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            # NOTE: A refresh in between (see `_apply`) drops the load of a changed experiment from the cache.
+            if self._loading.get(experiment) is future:
+                del self._loading[experiment]
+                self.profiles[experiment] = profile
+                self._profile_bytes[experiment] = profile_bytes
+                self._evict()
+
+        future.set_result(profile)
+        return profile
+
+    def _evict(self) -> None:
+        """
+        Evicts the least recently used Timelines until the cache fits within
+        `max_profiles` and `max_bytes`. The most recent Timeline is always kept.
+        """
+        while len(self.profiles) > 1:
+            over_count = self.max_profiles is not None and len(self.profiles) > self.max_profiles
+            over_bytes = self.max_bytes is not None and sum(self._profile_bytes.values()) > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+
+            exp, _ = self.profiles.popitem(last=False)
+            del self._profile_bytes[exp]
+            LOGGER.debug(f"Evicted the timeline for {exp}.")
+
+    def refresh(self, min_age: float = 0) -> bool:
+        """
+        Polls `data_dir` once and applies the changes since the last poll: the
+        new or changed experiments (by the size and mtime of their files) are
+        ingested, the deleted ones are removed, and the index, the sort orders
+        and the summaries are updated for those experiments only.
+
+        The experiments are ingested without holding the lock; the state is
+        then swapped with new containers (i.e., copy-on-write), so the readers
+        never observe a partially applied refresh.
+
+        :params: min_age: Skip the files modified within the last `min_age` seconds (i.e., still being written).
+        :returns: True if the ensemble changed.
+        """
+        with self._refresh_lock:
+            files = Datasets.scan_files(self.data_dir)
+            removed = [exp for exp in self.files if exp not in files]
+            now_ns = time.time_ns()
+            updated = sorted(
+                exp
+                for exp, stat in files.items()
+                if self.files.get(exp) != stat
+                and all(now_ns - mtime >= min_age * 1e9 for mtime in stat[1::2] if mtime is not None)
+            )
+            if len(removed) == 0 and len(updated) == 0:
+                return False
+
+            func = Datasets._scan_profile if self.lazy else Datasets._load_profile
+            tasks = [self._task(exp) for exp in updated]
+            results = Datasets._map_tasks(partial(Datasets._try_task, func), tasks, self.workers)
+
+            loaded = {}
+            for exp, (result, error) in zip(updated, results):
+                if error is not None:
+                    LOGGER.warning(f"Failed to ingest {exp}: {error}")
+                    continue
+                loaded[exp] = result
+
+            if len(loaded) == 0 and len(removed) == 0:
+                return False
+            self._apply(files, removed, loaded)
+
+        LOGGER.info(
+            f"Ingested {len(loaded)} new or changed and removed {len(removed)} experiments "
+            f"from {self.data_dir}."
+        )
+        if not self.lazy:
+            self.get_summary()
+        return True
+
+    def _apply(self, files: Dict[str, Tuple], removed: List[str], loaded: Dict) -> None:
+        """
+        Swaps in the state after a refresh (see `refresh`).
+
+        NOTE: The experiments that failed to ingest keep their previous state
+        (and files), so that they are retried on the next poll.
+        """
+        with self._lock:
+            self.files = {exp: stat for exp, stat in self.files.items() if exp not in removed}
+            self.files.update({exp: files[exp] for exp in loaded})
+
+            changed = set(removed) | set(loaded)
+            scalars = {
+                exp: profile.get_scalars() if isinstance(profile, Timeline) else profile
+                for exp, profile in loaded.items()
+            }
+
+            ensemble = (self.ensemble - set(removed)) | set(loaded)
+            index = {exp: val for exp, val in self.index.items() if exp not in changed}
+            index.update(scalars)
+
+            orders = Datasets._update_orders(
+                self._orders,
+                {exp: self.index[exp] for exp in changed if exp in self.index},
+                scalars,
+            )
+            is_max_changed = orders["runtime"][-1:] != self._orders["runtime"][-1:]
+
+            if self.lazy:
+                for exp in changed:
+                    self.profiles.pop(exp, None)
+                    self._profile_bytes.pop(exp, None)
+                    self._loading.pop(exp, None)
+            else:
+                profiles = {exp: val for exp, val in self.profiles.items() if exp not in changed}
+                profiles.update(loaded)
+                self.profiles = profiles
+
+            # NOTE: The ensemble binning spans the longest run; once it
+            # changes, all the cached binnings are stale.
+            self._summary_cache = {
+                key: val
+                for key, val in self._summary_cache.items()
+                if not is_max_changed and key[0] not in changed
+            }
+            self._individual_summary_cache = {
+                key: val for key, val in self._individual_summary_cache.items() if key[0] not in changed
+            }
+
+            self.traces = {exp: os.path.join(self.data_dir, exp) + ".json" for exp in ensemble}
+            self.metrics = {exp: os.path.join(self.data_dir, exp) + ".csv" for exp in ensemble}
+            self.topologies = {exp: os.path.join(self.data_dir, exp) + ".svg" for exp in ensemble}
+            self.index = index
+            self._orders = orders
+            self.ensemble = ensemble
+            self.version += 1
+
+    @staticmethod
+    def _update_orders(orders: Dict[str, List], removed: Dict[str, Dict], added: Dict[str, Dict]) -> Dict[str, List]:
+        """
+        Returns the sorted (key, experiment) lists of `SORT_ORDERS` after
+        removing and adding the given experiments (and their scalars).
+        """
+        orders = {key: list(entries) for key, entries in orders.items()}
+        for exp, scalars in removed.items():
+            for key, entry in Datasets._order_entries(exp, scalars).items():
+                entries = orders[key]
+                del entries[bisect.bisect_left(entries, entry)]
+        for exp, scalars in added.items():
+            for key, entry in Datasets._order_entries(exp, scalars).items():
+                bisect.insort(orders[key], entry)
+        return orders
+
+    @staticmethod
+    def _order_entries(experiment: str, scalars: Dict) -> Dict[str, Tuple]:
+        # NOTE: The event count and the start are sorted in descending order; the ties by name.
+        return {
+            "event_count": (-scalars["event_count"], experiment),
+            "start_ts": (-scalars["start_ts"], experiment),
+            "runtime": (scalars["end_ts"] - scalars["start_ts"], experiment),
+        }
+
+    def start_watching(self) -> None:
+        """
+        Starts polling `data_dir` every `watch_interval` seconds in a daemon
+        thread (see `refresh`). Does nothing if the watch mode is disabled.
+
+        NOTE: The thread does not survive a fork; a forked process must start its own.
+        """
+        if not self.watch_interval:
+            return
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, name="datasets-watcher", daemon=True)
+        self._watcher.start()
+        LOGGER.info(f"Watching {self.data_dir} every {self.watch_interval} seconds.")
+
+    def stop_watching(self) -> None:
+        self._stop_watching.set()
+
+    def _watch(self) -> None:
+        while not self._stop_watching.wait(self.watch_interval):
+            try:
+                # NOTE: A file modified since the last poll may still be written.
+                self.refresh(min_age=self.watch_interval)
+            except Exception as e:
+                LOGGER.warning(f"Failed to refresh {self.data_dir}: {e}")
 
     ################### Exposed APIs ###################
     def sort_by_event_count(self) -> List[str]:
@@ -72,13 +466,7 @@ class Datasets:
         :params: None
         :returns: List of experiments
         """
-        event_counts_dict = {
-            exp: self.profiles[exp].get_event_count() for exp in self.ensemble
-        }
-        sorted_experiments = sorted(
-            event_counts_dict.items(), key=lambda item: item[1], reverse=True
-        )
-        return list(dict(sorted_experiments).keys())
+        return [exp for _, exp in self._orders["event_count"]]
 
     def sort_by_date(self) -> List[str]:
         """
@@ -87,13 +475,7 @@ class Datasets:
         :params: None
          :returns: List of experiments
         """
-        event_counts_dict = {
-            exp: self.profiles[exp].get_start_timestamp() for exp in self.ensemble
-        }
-        sorted_experiments = sorted(
-            event_counts_dict.items(), key=lambda item: item[1], reverse=True
-        )
-        return list(dict(sorted_experiments).keys())
+        return [exp for _, exp in self._orders["start_ts"]]
 
     def max_min_runtime(self) -> List[float]:
         """
@@ -102,81 +484,88 @@ class Datasets:
         :params: None
          :returns: List[min, max]
         """
-        dur_dict = {
-            exp: self.profiles[exp].get_end_timestamp() - self.profiles[exp].get_start_timestamp() for exp in self.ensemble
-        }
-        return [min(dur_dict.values()), max(dur_dict.values())]
-
+        runtimes = self._orders["runtime"]
+        if len(runtimes) == 0:
+            return [0, 0]
+        return [runtimes[0][0], runtimes[-1][0]]
 
     def get_summary(self, sample_count=12) -> Dict:
+        """
+        Returns the relative-time binning of every experiment, where the bins
+        span the longest run. The binning of an experiment is computed once
+        per (sample_count, ts_width) and served from memory afterwards.
 
+        :params: sample_count: Number of bins.
+        :returns: Dictionary containing the binning for all experiments.
+        """
         # Find the most expensive run.
-        max_profile = None
-        max_ts = 0
-    
-        for name in self.profiles:
-            profile = self.profiles[name]
-            ts = profile.end_ts - profile.start_ts
-            if max_ts < ts:
-                max_ts = ts
-                max_profile = name
+        # NOTE: An empty ensemble (or zero-length runs) would give a zero bin width; hence, a run lasts at least 1 unit.
+        max_ts = max(self.max_min_runtime()[1], 1)
 
         # Set the sample vector.
         ts_width = math.ceil(max_ts / sample_count)
-
-        max_profile_start_ts = 0
-        max_profile_end_ts = max_ts
-        ts_samples = [
-            math.ceil(sample)
-            for sample in np.arange(max_profile_start_ts, max_profile_end_ts, ts_width)
-        ]
+        ts_samples = [math.ceil(sample) for sample in np.arange(0, max_ts, ts_width)]
 
         ret = {}
-        for name in self.profiles:
-            profile = self.profiles[name]
-            timeline = self.profiles[name].get_timeline()
+        for name in sorted(self.ensemble):
+            key = (name, sample_count, ts_width)
+            if key not in self._summary_cache:
+                self._summary_cache[key] = Datasets._relative_binning(
+                    self.get_profile(name), ts_samples, ts_width
+                )
+            ret[name] = self._summary_cache[key]
 
-            events_in_sample = {
-                _s: {grp["content"]: 0 for grp in timeline["groups"]} for _s in ts_samples
-            }
+        return ret
 
-            for event in timeline["events"]:
-                group = profile.idx_to_grp[event["group"]]
-
-                ts = np.array([event["start"] - profile.start_ts, event["end"] - profile.start_ts])
-                dig = np.digitize(ts, ts_samples)
-
-                if dig[0] == dig[1]:
-                    events_in_sample[ts_samples[dig[0] - 1]][group] += (
-                        event["end"] - event["start"]
-                    )
-                else:
-                    _l = 0
-                    _h = event["end"] - event["start"]
-                    for i in range(dig[0], dig[1]):
-                        events_in_sample[ts_samples[i]][group] += ts_samples[i] - _l
-                        _l = ts_samples[i]
-
-                    if i < len(ts_samples) - 1:
-                        events_in_sample[ts_samples[i]][group] += _h - ts_samples[i]
-
-            max_ts = 0
-
-            for [sample, val] in events_in_sample.items():
-                max_ts = max(sum(val.values()), max_ts)
-                val["ts"] = sample
-            
-            ret[name] = {
-                "classNames": timeline["class_names"],
-                "dmv": random.randint(1, 805306368),
-                "startTs": timeline["start_ts"],
-                "endTs": timeline["end_ts"],
-                "dur": timeline["end_ts"] - timeline["start_ts"],
-                "xData": list(ts_samples),
-                "yData": list(events_in_sample.values()),
-                "zData": list(timeline["grouping"]),
-                "maxY": max_ts,
-                "ts_width": ts_width,
-            }
+    def get_individual_summary(self, sample_count=12) -> Dict:
+        """
+        Returns the summary (see Timeline.get_summary) of every experiment,
+        computed once per sample_count.
+
+        :params: sample_count: Number of bins.
+        :returns: Dictionary containing the summary for all experiments.
+        """
+        ret = {}
+        for name in sorted(self.ensemble):
+            key = (name, sample_count)
+            if key not in self._individual_summary_cache:
+                self._individual_summary_cache[key] = self.get_profile(name).get_summary(
+                    sample_count=sample_count
+                )
+            ret[name] = self._individual_summary_cache[key]
 
         return ret
+
+    @staticmethod
+    def _relative_binning(profile: Timeline, ts_samples: List[int], ts_width: int) -> Dict:
+        """
+        Bins the busy time of each group relative to the start of the profile.
+        """
+        groups = [grp["content"] for grp in profile.groups_for_vis_timeline()]
+        histogram = profile.coverage_index.histogram(
+            [profile.start_ts + sample for sample in ts_samples]
+        )
+        y_data = {
+            grp: histogram[profile.grp_to_idx[grp]].tolist()
+            if profile.grp_to_idx[grp] in histogram
+            else [0] * len(ts_samples)
+            for grp in groups
+        }
+        events_in_sample = [
+            {**{grp: y_data[grp][idx] for grp in y_data}, "ts": sample}
+            for idx, sample in enumerate(ts_samples)
+        ]
+        max_ts = max((sum(vals) for vals in zip(*y_data.values())), default=0)
+
+        return {
+            "classNames": profile.grp_to_cls,
+            "dmv": random.randint(1, 805306368),
+            "startTs": profile.start_ts,
+            "endTs": profile.end_ts,
+            "dur": profile.end_ts - profile.start_ts,
+            "xData": list(ts_samples),
+            "yData": events_in_sample,
+            "zData": list(profile.rules["grouping"].keys()),
+            "maxY": max_ts,
+            "ts_width": ts_width,
+        }
@@ -0,0 +1,143 @@
+import gzip
+import json
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Content-codings supported for the API responses (in the order of preference).
+ENCODINGS = ["gzip", "deflate"]
+
+# Responses smaller than this (in bytes) are sent uncompressed.
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESS_LEVEL = 6
+
+# Number of events encoded at a time by `stream_json`.
+STREAM_CHUNK_SIZE = 10000
+
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """
+    Returns the preferred content-coding accepted by the client (see `ENCODINGS`), if any.
+
+    :params: accept_encodings: The `Accept-Encoding` header (i.e., `request.accept_encodings`).
+    """
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+    if encoding == "deflate":
+        return zlib.compress(body, COMPRESS_LEVEL)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """
+    Compresses a stream of chunks incrementally.
+    """
+    # NOTE: HTTP's deflate is the zlib format; gzip uses the gzip header and trailer.
+    wbits = zlib.MAX_WBITS | 16 if encoding == "gzip" else zlib.MAX_WBITS
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, wbits)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"))
+
+
+def stream_records(frames: List[pd.DataFrame], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Encodes the records of the DataFrames as a JSON array chunk by chunk, so
+    that only `chunk_size` events are materialized at a time.
+    """
+    yield "["
+    is_first = True
+    for df in frames:
+        for start in range(0, df.shape[0], chunk_size):
+            chunk = _dumps(df.iloc[start : start + chunk_size].to_dict("records"))[1:-1]
+            yield chunk if is_first else "," + chunk
+            is_first = False
+    yield "]"
+
+
+def stream_json(
+    payload: Dict, key: str, frames: List[pd.DataFrame], chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Encodes `{**payload, key: records of frames}` as JSON chunk by chunk (see `stream_records`).
+
+    :params: payload: The remaining (small) fields of the response.
+    :params: key: The field holding the events.
+    :params: frames: The DataFrames whose records are the events.
+    """
+    yield "{"
+    for idx, field in enumerate(sorted([*payload.keys(), key])):
+        yield ("," if idx > 0 else "") + _dumps(field) + ":"
+        if field == key:
+            yield from stream_records(frames, chunk_size)
+        else:
+            yield _dumps(payload[field])
+    yield "}"
+
+
+def encode_columnar(frames: List[pd.DataFrame]) -> Dict:
+    """
+    Encodes the records of the DataFrames in the columnar wire format:
+
+    - `columns`: a parallel array per field (null for a missing value).
+    - `dictionaries`: the table of unique values of each string field, whose
+      column then holds integer codes into the table (-1 for a missing value).
+    - `aliases`: fields that duplicate another field (e.g., `content` is
+      `name`) and are not sent.
+    - `length`: the number of events.
+    """
+    frames = [df for df in frames if not df.empty]
+    if len(frames) == 0:
+        return {"columns": {}, "dictionaries": {}, "aliases": {}, "length": 0}
+
+    df = pd.concat(frames, ignore_index=True, sort=True)
+
+    aliases = {}
+    if "content" in df.columns and "name" in df.columns and df["content"].equals(df["name"]):
+        aliases["content"] = "name"
+        df = df.drop(columns="content")
+
+    columns, dictionaries = {}, {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series.dtype):
+            columns[col] = series.tolist()
+            continue
+
+        if not pd.api.types.is_numeric_dtype(series.dtype):
+            try:
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            except TypeError:
+                columns[col] = series.astype(object).where(series.notna(), None).tolist()
+                continue
+            columns[col] = codes.tolist()
+            dictionaries[col] = uniques.tolist()
+            continue
+
+        values = series.to_numpy(dtype=np.float64)
+        is_na = np.isnan(values)
+        if not np.any(np.mod(values[~is_na], 1)):
+            series = series.astype("Int64")
+        columns[col] = series.astype(object).where(~is_na, None).tolist()
+
+    return {
+        "columns": columns,
+        "dictionaries": dictionaries,
+        "aliases": aliases,
+        "length": df.shape[0],
+    }
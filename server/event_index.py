@@ -0,0 +1,131 @@
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class EventIndex:
+    """
+    Index of the groups and the events (i.e., event names) of a Timeline, to
+    answer the summary views without scanning the DataFrames.
+
+    It holds the groups present in each event type DataFrame (and in the
+    sub-group DataFrames), the group of each event, and the total duration
+    and the count of the events per event name and per group. The events and
+    the groups are also kept ordered by their duration (descending), along
+    with parallel arrays of their group, duration and count, so a (page of a)
+    summary is a vectorized filter and a slice over a precomputed order.
+
+    NOTE: The index is built once at load and is not updated afterwards; the
+    returned containers must not be modified by the caller.
+
+    - The group of an event name is the one of its first event type DataFrame
+      (in the order of `grp_df_dict`), unless it is part of a sub-group.
+    - The durations and the counts only consider the event type DataFrames
+      (i.e., the sub-group events have a duration of 0).
+    """
+
+    def __init__(self, grp_df_dict: Dict[str, pd.DataFrame], sub_grp_df_dict: Dict[str, pd.DataFrame]):
+        self.type_groups: Dict[str, FrozenSet[int]] = {
+            type: EventIndex._unique_groups(df) for type, df in grp_df_dict.items()
+        }
+        self.sub_groups: FrozenSet[int] = frozenset().union(
+            *[EventIndex._unique_groups(df) for df in sub_grp_df_dict.values()]
+        )
+
+        # Group of each event name, where the earlier DataFrames take precedence.
+        self.event_to_grp: Dict[str, int] = {}
+        for df in reversed(list(grp_df_dict.values())):
+            self.event_to_grp.update(EventIndex._name_to_group(df))
+        for df in reversed(list(sub_grp_df_dict.values())):
+            self.event_to_grp.update(EventIndex._name_to_group(df))
+
+        # Total duration and count of the events per name.
+        stats = [
+            df.groupby("name", observed=True)["dur"].agg(["sum", "size"])
+            for df in grp_df_dict.values()
+            if not df.empty
+        ]
+        if len(stats) > 0:
+            stats = pd.concat(stats).groupby(level=0, observed=True).sum()
+            durations, counts = stats["sum"].to_dict(), stats["size"].to_dict()
+        else:
+            durations, counts = {}, {}
+
+        self.event_durations: Dict[str, int] = {
+            event: durations.get(event, 0) for event in self.event_to_grp
+        }
+        self.event_counts: Dict[str, int] = {
+            event: counts.get(event, 0) for event in self.event_to_grp
+        }
+
+        self.grp_durations: Dict[int, int] = {}
+        self.grp_counts: Dict[int, int] = {}
+        for event, grp in self.event_to_grp.items():
+            self.grp_durations[grp] = self.grp_durations.get(grp, 0) + self.event_durations[event]
+            self.grp_counts[grp] = self.grp_counts.get(grp, 0) + self.event_counts[event]
+
+        # Groups and events ordered by duration (descending), the ties by group and name.
+        all_groups = self.sub_groups.union(*self.type_groups.values()).union(self.grp_durations)
+        self.groups_by_duration: Tuple[int, ...] = tuple(
+            sorted(all_groups, key=lambda grp: (-self.grp_durations.get(grp, 0), grp))
+        )
+        self.events_by_duration: Tuple[str, ...] = tuple(
+            sorted(
+                self.event_to_grp,
+                key=lambda event: (-self.event_durations[event], self.event_to_grp[event], event),
+            )
+        )
+
+        # Group, duration and count of the events (in the order of events_by_duration).
+        self.event_groups = np.array(
+            [self.event_to_grp[event] for event in self.events_by_duration], dtype=np.int64
+        )
+        self.event_duration_array = np.array(
+            [self.event_durations[event] for event in self.events_by_duration], dtype=np.int64
+        )
+        self.event_count_array = np.array(
+            [self.event_counts[event] for event in self.events_by_duration], dtype=np.int64
+        )
+
+    @staticmethod
+    def _unique_groups(df: pd.DataFrame) -> FrozenSet[int]:
+        if df.empty:
+            return frozenset()
+        return frozenset(pd.unique(df["group"].to_numpy()).tolist())
+
+    @staticmethod
+    def _name_to_group(df: pd.DataFrame) -> Dict[str, int]:
+        """
+        Returns the group of each event name in `df`, from its last event.
+        """
+        if df.empty:
+            return {}
+        names = df["name"].to_numpy()
+        groups = df["group"].to_numpy()
+        is_last = ~pd.Index(names).duplicated(keep="last")
+        return dict(zip(names[is_last].tolist(), groups[is_last].tolist()))
+
+    def groups(self, event_types: List[str], include_sub_groups: bool = False) -> FrozenSet[int]:
+        """
+        Returns the groups of the events of the given types (and of the sub-groups, if included).
+        """
+        ret = frozenset().union(*[self.type_groups.get(type, frozenset()) for type in event_types])
+        if include_sub_groups:
+            ret = ret.union(self.sub_groups)
+        return ret
+
+    def select_events(
+        self, groups: FrozenSet[int], offset: int = 0, limit: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Selects the events of the given groups, ordered by duration (descending).
+
+        :params: groups: Groups of the events.
+        :params: offset: Number of (top) events to skip.
+        :params: limit: Maximum number of events returned (all, if None).
+        :returns: positions (in events_by_duration) of the selected events, and of the events ranked after them.
+        """
+        positions = np.flatnonzero(np.isin(self.event_groups, list(groups)))
+        end = positions.shape[0] if limit is None else offset + limit
+        return positions[offset:end], positions[end:]
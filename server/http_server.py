@@ -1,13 +1,29 @@
 from audioop import cross
 import os
 import pathlib
+import time
 import warnings
+from typing import Callable, Dict, Optional
 
-from flask import Flask, json, jsonify, request, send_from_directory
+from flask import Flask, abort, g, has_request_context, json, jsonify, request, send_from_directory
 from flask_cors import CORS, cross_origin
 
 from server.logger import get_logger
 from server.datasets import Datasets
+from server.recorder import ResponseRecorder
+from server.encoding import (
+    MIN_COMPRESS_SIZE,
+    compress,
+    compress_chunks,
+    encode_columnar,
+    negotiate_encoding,
+    stream_json,
+    stream_records,
+)
+from server.response_cache import ResponseCache
+from server.production import serve
+from server.sessions import DEFAULT_SESSION, SessionStore
+from server.timeline import Timeline
 from server.utils import create_dir_after_check, load_json
 
 # Globals
@@ -41,8 +57,14 @@ class HTTPServer:
             "comb-post-send-1024_1024_1024": "./paper-data/comb-post-send-1024_1024_1024",
             "comb-post-send-wait-all-scale-up": "./paper-data/comb-post-send-wait-all-scale-up"
         }
+        self.response_cache = ResponseCache()
+        self.sessions = SessionStore()
+        self.recorder = None
+        self.is_production = args.get("mode") == "production"
+        self.is_preloaded = False
         
         self.handle_routes()
+        self.is_args_data_dir = False
         if args['data_dir']:
             self.is_args_data_dir = True
 
@@ -51,6 +73,21 @@ class HTTPServer:
         """
         Load the data directory.
         """
+        # NOTE: Reloading drops the sessions and the cached responses of all
+        # the clients; hence, a client opening the app on the loaded data
+        # directory (and format) only binds its own session.
+        if self.is_loaded(data_dir, profile_format):
+            self.experiment = ""
+            return True
+
+        # NOTE: In the production mode, the data is preloaded and shared by
+        # the workers, so it can not be replaced by a single worker.
+        if self.is_preloaded:
+            if os.path.abspath(data_dir) != self.data_dir:
+                LOGGER.warning(f"Ignoring the request to load {data_dir}; {self.data_dir} is preloaded.")
+                return False
+            return True
+
         self.data_dir = os.path.abspath(data_dir)
 
         self.project_dir = pathlib.Path(__file__).parent.parent.resolve()
@@ -59,27 +96,127 @@ class HTTPServer:
 
         if(DEV_MODE): 
             create_dir_after_check(self.dot_dmv_dir)
-            LOGGER.info(f"dev files will be dumped at {self.dot_dmv_dir}")
+            is_recorded = self.args.get("record_sample_rate", 1.0) > 0 and not self.is_production
+            if self.recorder is None and is_recorded:
+                self.recorder = ResponseRecorder(
+                    self.dot_dmv_dir,
+                    sample_rate=self.args.get("record_sample_rate", 1.0),
+                    max_bytes=self.args.get("record_max_mb") and self.args["record_max_mb"] * 1024 * 1024,
+                )
+                LOGGER.info(f"dev files will be dumped at {self.dot_dmv_dir}")
 
         # Check if the directory exists.
         HTTPServer._check_data_dir_exists(self.data_dir)
 
         self.experiments = os.listdir(self.data_dir)
-        self.experiment = ""
+        self.sessions.clear()
+        if hasattr(self, "profiles"):
+            self.profiles.stop_watching()
         self.profiles = Datasets(
-            data_dir=self.data_dir, profile_format=profile_format
+            data_dir=self.data_dir,
+            profile_format=profile_format,
+            workers=self.args.get("load_workers", 1),
+            lazy=self.args.get("lazy", False),
+            max_profiles=self.args.get("max_profiles"),
+            max_bytes=self.args.get("max_profile_mb") and self.args["max_profile_mb"] * 1024 * 1024,
+            cache_dir=None if self.args.get("no_cache") else os.path.join(self.dot_dmv_dir, "cache"),
+            watch_interval=self.args.get("watch_interval"),
         )
-        self.timeline = None
+        self.response_cache.clear()
+        if self.recorder is not None:
+            self.recorder.record_load(self.data_dir, profile_format)
+
+        # NOTE: In the production mode, each worker watches the directory
+        # (see `start`), since the watcher thread does not survive the fork.
+        # A new experiment is then processed by one worker and loaded from
+        # the cache by the others (see TimelineCache).
+        if not self.is_production:
+            self.profiles.start_watching()
 
         return True
 
+    def is_loaded(self, data_dir: str, profile_format: str) -> bool:
+        """
+        Whether `data_dir` is already loaded in `profile_format`.
+        """
+        return (
+            hasattr(self, "profiles")
+            and os.path.abspath(data_dir) == self.data_dir
+            and profile_format == self.profiles.profile_format
+        )
+
+    @property
+    def session_id(self) -> str:
+        """
+        Session of the current request (see SessionStore.session_id).
+        """
+        if not has_request_context():
+            return DEFAULT_SESSION
+        return SessionStore.session_id(request)
+
+    def is_experiment(self, experiment: str) -> bool:
+        """
+        Whether `experiment` is part of the loaded ensemble.
+        """
+        return hasattr(self, "profiles") and experiment in self.profiles.ensemble
+
+    @property
+    def experiment(self) -> str:
+        """
+        Experiment selected by the current session ("" if none).
+
+        NOTE: The experiment may come from a client-controlled header or
+        cookie; hence, it is validated against the ensemble here, before any
+        lookup (or path) is derived from it.
+        """
+        if has_request_context():
+            experiment = SessionStore.experiment_hint(request)
+            if self.is_experiment(experiment):
+                return experiment
+
+        experiment = self.sessions.get_experiment(self.session_id)
+        return experiment if self.is_experiment(experiment) else ""
+
+    @experiment.setter
+    def experiment(self, experiment: str) -> None:
+        self.sessions.set_experiment(self.session_id, experiment)
+
+    @property
+    def timeline(self) -> Optional[Timeline]:
+        """
+        Timeline of the experiment selected by the current session. The
+        Timelines are owned by `self.profiles` and shared across the sessions.
+        """
+        experiment = self.experiment
+        if experiment == "":
+            return None
+        return self.profiles.get_profile(experiment)
+
     def _dump_http_responses(self, json_data, file_name):
+        """
+        Record the response (and its request) in the background (see ResponseRecorder).
+        """
+        if self.recorder is not None:
+            self.recorder.record_response(json_data, file_name)
 
-        _path = os.path.join(self.dot_dmv_dir, file_name)
-        with open(_path, "w") as outfile:
-            json.dump(json_data, outfile)
+    @staticmethod
+    def _summary_page(params) -> Dict:
+        """
+        Returns the `offset`, `limit` and `top_k` (see Timeline.get_event_summary) of a summary request.
 
-        LOGGER.info(f"Dumped http respnse to {file_name}")
+        :param params: The request body or the query arguments.
+        """
+        page = {}
+        for key in ["offset", "limit", "top_k"]:
+            if params.get(key) is None:
+                continue
+            try:
+                page[key] = int(params[key])
+            except (TypeError, ValueError):
+                abort(400, f"`{key}` must be an integer.")
+            if page[key] < 0:
+                abort(400, f"`{key}` must be non-negative.")
+        return page
 
     @staticmethod
     def _check_data_dir_exists(data_dir: str):
@@ -105,6 +242,13 @@ class HTTPServer:
         :param port: port to run API server
         :return: None
         """
+        if self.is_production:
+            LOGGER.info("Preloading the data for the production mode")
+            self.load(self.args["data_dir"], profile_format=self.args.get("format") or "DMV")
+            self.is_preloaded = True
+            serve(app, host, port, self.args.get("workers", 1), on_fork=self.profiles.start_watching)
+            return
+
         LOGGER.info("Starting the API service")
         app.run(host=host, port=port, threaded=True, debug=True)
 
@@ -130,7 +274,113 @@ class HTTPServer:
             warnings.warn(f"[API: {endpoint}] emits no data.")
             return jsonify(isError=True, message="Error", statusCode=500)
 
+    def emit_cached_json(self, endpoint: str, compute: Callable[[], any], per_experiment: bool = True):
+        """
+        Emit the json data to the endpoint from the response cache. The data is
+        computed (and cached) only on a cache miss, and a request whose
+        `If-None-Match` matches the ETag is answered with `304 Not Modified`.
+
+        NOTE: The cache is keyed by the selected experiment (unless the data
+        spans the ensemble), so switching the experiment (`set_experiment`)
+        never serves the responses of another one. The key is checked before
+        `compute` touches `self.timeline`, so that a hit does not construct (or
+        load) the Timeline in the lazy mode.
+
+        :param endpoint: Endpoint to emit information to.
+        :param compute: Callable returning the data to emit.
+        :param per_experiment: Whether the data depends on the selected experiment (i.e., `self.timeline`).
+        :return response: Response packed with data (in JSON format).
+        """
+        experiment = self.experiment if per_experiment else ""
+        key = ResponseCache.key(
+            self.data_dir,
+            experiment,
+            endpoint,
+            request.get_json(silent=True),
+            request.args.to_dict(),
+            self.profiles.version,
+        )
+        entry = self.response_cache.get(key)
+        if entry is None:
+            if per_experiment and experiment == "":
+                LOGGER.info("Returned empty JSON. `self.timeline` not defined. Error!")
+                return jsonify({})
+            entry = self.response_cache.put(key, jsonify(compute()).get_data())
+
+        encoding = None
+        if len(entry.body) >= MIN_COMPRESS_SIZE:
+            encoding = negotiate_encoding(request.accept_encodings)
+        body, etag = entry.encoded(encoding)
+
+        # NOTE: Most of the endpoints are POST requests, which werkzeug's
+        # `make_conditional` ignores; hence, the ETag is checked here.
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(response=body, mimetype="application/json")
+        response.set_etag(etag)
+        response.vary.add("Accept-Encoding")
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def emit_stream(chunks) -> any:
+        """
+        Emit the json data, encoded chunk by chunk, to the endpoint.
+
+        :param chunks: Iterator of the JSON-encoded chunks.
+        :return response: Streamed response (in JSON format).
+        """
+        return app.response_class(response=chunks, mimetype="application/json")
+
+    @staticmethod
+    def compress_response(response):
+        """
+        Compress the JSON responses (gzip or deflate, as negotiated with the
+        client). Streamed responses are compressed incrementally.
+        """
+        if (
+            response.status_code != 200
+            or response.mimetype != "application/json"
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_chunks(response.response, encoding)
+        else:
+            body = response.get_data()
+            if len(body) < MIN_COMPRESS_SIZE:
+                return response
+            response.set_data(compress(body, encoding))
+
+        response.headers["Content-Encoding"] = encoding
+        etag, is_weak = response.get_etag()
+        if etag is not None:
+            response.set_etag(f"{etag}-{encoding}", weak=is_weak)
+        return response
+
     def handle_routes(self):
+        app.after_request(HTTPServer.compress_response)
+
+        @app.before_request
+        def start_timer():
+            g.request_start = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            if self.recorder is not None and "request_start" in g:
+                elapsed_ms = (time.perf_counter() - g.request_start) * 1000
+                self.recorder.record_request(request, response, elapsed_ms)
+            return response
+
         @app.route("/")
         @cross_origin()
         def index():
@@ -154,7 +404,12 @@ class HTTPServer:
                 example = request_context["example"]
                 status = self.load(data_dir=self.examples[example], profile_format="DMV")
             if DEV_MODE: self._dump_http_responses(status, "load_example.json")
-            return jsonify(status=status)
+
+            # NOTE: The experiment mirrored by the client would take precedence
+            # over the one reset by `load`; hence, its cookie is reset as well.
+            response = jsonify(status=status)
+            response.delete_cookie(SessionStore.experiment_cookie(self.session_id))
+            return response
 
         @app.route("/fetch_experiments", methods=["GET"])
         @cross_origin()
@@ -179,12 +434,17 @@ class HTTPServer:
             request_context = request.json
             if "experiment" not in request_context:
                 LOGGER.error("Invalid Request! experiment field missing.")
-            self.experiment = request_context["experiment"]
-            self.timeline = self.profiles.get_profile(self.experiment)
-            metadata = self.timeline.get_metadata(self.experiment)
+                abort(400, "`experiment` is missing.")
+            experiment = request_context["experiment"]
+            if not self.is_experiment(experiment):
+                abort(404, f"{experiment} is not part of the loaded ensemble.")
+            self.experiment = experiment
+            metadata = self.profiles.get_profile(experiment).get_metadata(experiment)
             if DEV_MODE: self._dump_http_responses(metadata, "set_experiment.json")
 
-            return jsonify(metadata)
+            response = jsonify(metadata)
+            response.set_cookie(SessionStore.experiment_cookie(self.session_id), experiment, samesite="Lax")
+            return response
 
         @app.route("/fetch_timeline", methods=["POST"])
         @cross_origin()
@@ -196,7 +456,18 @@ class HTTPServer:
                 request_context = request.json
                 window_start = request_context["window_start"]
                 window_end = request_context["window_end"]
-                timeline = self.timeline.get_timeline(window_start, window_end)
+                width = request_context.get("width")
+                if request_context.get("format") == "columnar":
+                    timeline = self.timeline.get_timeline_frames(window_start, window_end, width)
+                    timeline["events"] = encode_columnar(timeline["events"])
+                    return jsonify(timeline)
+
+                if request_context.get("stream", False):
+                    timeline = self.timeline.get_timeline_frames(window_start, window_end, width)
+                    events = timeline.pop("events")
+                    return self.emit_stream(stream_json(timeline, "events", events))
+
+                timeline = self.timeline.get_timeline(window_start, window_end, width)
                 if DEV_MODE: self._dump_http_responses(timeline, "fetch_timeline.json")
 
                 return jsonify(timeline)
@@ -207,21 +478,21 @@ class HTTPServer:
         @app.route("/fetch_ensemble_summary", methods=["POST"])
         @cross_origin()
         def fetch_ensemble_summary():
-            all_timelines = self.profiles.get_all_profiles()
-            ind_info = {}
-            for (exp, timeline) in all_timelines.items():
-                ind_info[exp] = timeline.get_summary(sample_count=12)
-
-            ensemble_info = {
-                "runtime_range": self.profiles.max_min_runtime(),
-                "rel_binning": self.profiles.get_summary(sample_count=12)
-            }
-            payload = {
-                'individual': ind_info,
-                'ensemble': ensemble_info
-            }
-            if DEV_MODE: self._dump_http_responses(payload, "fetch_ensemble_summary.json")
-            return jsonify(payload)
+            def compute():
+                ind_info = self.profiles.get_individual_summary(sample_count=12)
+
+                ensemble_info = {
+                    "runtime_range": self.profiles.max_min_runtime(),
+                    "rel_binning": self.profiles.get_summary(sample_count=12)
+                }
+                payload = {
+                    'individual': ind_info,
+                    'ensemble': ensemble_info
+                }
+                if DEV_MODE: self._dump_http_responses(payload, "fetch_ensemble_summary.json")
+                return payload
+
+            return self.emit_cached_json("fetch_ensemble_summary", compute, per_experiment=False)
 
 
         @app.route("/fetch_summary", methods=["POST"])
@@ -230,59 +501,64 @@ class HTTPServer:
             """
             Route to fetch the summary timeline (histogram-bin plotting of events).
             """
-            if self.timeline is not None:
+            def compute():
                 request_context = request.json
                 sample_count = request_context["sample_count"]
                 summary = self.timeline.get_summary(sample_count=sample_count)
 
                 if DEV_MODE: self._dump_http_responses(summary, "fetch_summary.json")
-                return jsonify(summary)
-            else:
-                LOGGER.info("Returned empty JSON. `self.timeline` not defined. Error!")
-                return jsonify({})
+                return summary
+
+            return self.emit_cached_json("fetch_summary", compute)
 
         @app.route("/fetch_timeline_summary", methods=["GET"])
         @cross_origin()
         def fetch_timeline_summary():
             """
             Route to fetch the summary for all range-events in the timeline.
+            Optional query arguments: `offset` and `limit` (i.e., a page of the
+            groups) or `top_k` (i.e., the top groups and an "other" bucket).
             """
-            if self.timeline is not None:
+            page = self._summary_page(request.args)
+
+            def compute():
                 timeline_summary = self.timeline.get_timeline_summary(
-                    ["range", "x-range"]
+                    ["range", "x-range"], **page
                 )
                 if DEV_MODE: self._dump_http_responses(timeline_summary, "fetch_timeline_summary.json")
+                return timeline_summary
 
-                return jsonify(timeline_summary)
-            else:
-                LOGGER.info("Returned empty JSON. `self.timeline` not defined. Error!")
-                return jsonify({})
+            return self.emit_cached_json("fetch_timeline_summary", compute)
 
         @app.route("/fetch_event_summary", methods=["POST"])
         @cross_origin()
         def fetch_event_summary():
             """
             Route to fetch the summary for all range-events in the timeline.
+            Optional fields: `offset` and `limit` (i.e., a page of the events)
+            or `top_k` (i.e., the top events and an "other" bucket).
             """
-            if self.timeline is not None:
+            page = self._summary_page(request.json)
+
+            def compute():
                 request_context = request.json
                 event_groups = request_context["groups"]
                 event_summary = self.timeline.get_event_summary(
-                    event_groups, ["range", "x-range"]
+                    event_groups, ["range", "x-range"], **page
                 )
                 if DEV_MODE: self._dump_http_responses(event_summary, "fetch_event_summary.json")
-                return jsonify(event_summary)
-            else:
-                LOGGER.info("Returned empty JSON. `self.timeline` not defined. Error!")
-                return jsonify({})
+                return event_summary
+
+            return self.emit_cached_json("fetch_event_summary", compute)
 
         @app.route("/static/topology.svg", methods=["GET"])
         @cross_origin()
         def serve_topology():
             import base64
 
-            file_path = os.path.join(self.data_dir, f"{self.experiment}.svg")
-            if not os.path.exists(file_path):
+            experiment = self.experiment
+            file_path = os.path.join(self.data_dir, f"{experiment}.svg")
+            if experiment == "" or not os.path.exists(file_path):
                 file_path = os.path.join(self.static_dir, "topology-default.svg")
 
             with open(file_path, "rb") as image_file:
@@ -308,19 +584,37 @@ class HTTPServer:
                 request_context = request.json
                 window_start = request_context["window_start"]
                 window_end = request_context["window_end"]
+                if request_context.get("format") == "columnar":
+                    frames = self.timeline.slice_events(window_start, window_end)
+                    return jsonify(encode_columnar(frames))
+
+                if request_context.get("stream", False):
+                    frames = self.timeline.slice_events(window_start, window_end)
+                    return self.emit_stream(stream_records(frames))
+
                 events = self.timeline.get_window(window_start, window_end)
                 return jsonify(events)
             else:
                 LOGGER.info("Returned empty JSON. `self.timeline` not defined. Error!")
                 return jsonify({})
 
+        @app.route("/fetch_dmv", methods=["POST"])
+        @cross_origin()
+        def fetch_dmv():
+            """
+            Route to fetch the data movement (total and per group) of the
+            events within a given window (i.e., between window_start and
+            window_end), or of the whole timeline if no window is provided.
+            """
+            def compute():
+                request_context = request.get_json(silent=True) or {}
+                return self.timeline.get_dmv_by_group(
+                    request_context.get("window_start"), request_context.get("window_end")
+                )
+
+            return self.emit_cached_json("fetch_dmv", compute)
+
         @app.route("/fetch_metrics_timeline", methods=["POST"])
         @cross_origin()
         def get_metrics_timeline():
-            if self.timeline is not None:
-                request_context = request.json
-                metrics_timeline = self.timeline.get_metrics()
-                return jsonify(metrics_timeline)
-            else:
-                LOGGER.info("Returned empty JSON. `self.timeline` not defined. Error!")
-                return jsonify({})
\ No newline at end of file
+            return self.emit_cached_json("fetch_metrics_timeline", lambda: self.timeline.get_metrics())
\ No newline at end of file
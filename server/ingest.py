@@ -0,0 +1,431 @@
+import json
+import math
+import re
+from array import array
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from server.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+# Number of characters read from the trace file at a time.
+CHUNK_SIZE = 1 << 20
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class DecimalFloat(float):
+    """
+    Float that keeps the decimal text it was parsed from, for the numbers
+    that float64 can not represent exactly (e.g., sub-microsecond epoch
+    timestamps), so that they can be converted to fixed-point ticks without
+    rounding (see `to_ticks`). Otherwise, it behaves as a float.
+    """
+
+    def __new__(cls, text: str):
+        obj = super().__new__(cls, text)
+        obj.text = text
+        return obj
+
+    def __reduce__(self):
+        return (DecimalFloat, (self.text,))
+
+
+def parse_float(text: str) -> float:
+    """
+    `parse_float` of the JSON decoders: a DecimalFloat if the float64 does not round-trip to `text`.
+    """
+    value = float(text)
+    if float.__repr__(value) == text:
+        return value
+    return DecimalFloat(text)
+
+
+def to_ticks(value, scale: int) -> int:
+    """
+    Converts a number (as parsed by `parse_float`) to `value * scale`, rounded
+    to the nearest integer from its exact decimal value. Missing values become 0.
+    """
+    if value is None or (isinstance(value, float) and not math.isfinite(value)):
+        return 0
+    if type(value) is int:
+        return value * scale
+    if isinstance(value, DecimalFloat):
+        value = Decimal(value.text)
+    elif isinstance(value, float) and value.is_integer():
+        return int(value) * scale
+    else:
+        value = Decimal(repr(value))
+    return int((value * scale).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def dumps(obj) -> str:
+    """
+    Compact JSON encoding that writes the DecimalFloats with their exact decimal text.
+    """
+    if isinstance(obj, DecimalFloat):
+        return obj.text
+    if isinstance(obj, dict):
+        return "{" + ",".join(json.dumps(str(key)) + ":" + dumps(val) for key, val in obj.items()) + "}"
+    if isinstance(obj, (list, tuple)):
+        return "[" + ",".join(dumps(val) for val in obj) + "]"
+    return json.dumps(obj)
+
+
+class TraceReader:
+    """
+    Incremental reader for Chrome-trace JSON documents.
+
+    Walks the document down `events_path` (e.g., ["traceEvents"] for DMV, or
+    ["data", "traceEvents"] for JIT) and yields the elements of that array one
+    at a time, so the array itself is never materialized. Every other value in
+    the document is decoded as-is into `self.header`, which is complete once
+    the iteration finishes.
+
+    The numbers that float64 can not represent exactly are decoded as
+    DecimalFloats; `self.has_decimals` tells whether the last yielded element
+    holds any.
+    """
+
+    def __init__(self, file_path: str, events_path: List[str], chunk_size: int = CHUNK_SIZE):
+        assert len(events_path) > 0
+        self.file_path = file_path
+        self.events_path = events_path
+        self.chunk_size = chunk_size
+
+        self.header = {}
+        self.found = False
+        self.has_decimals = False
+
+        self._decimals = 0
+        self._decoder = json.JSONDecoder(parse_float=self._parse_float)
+        self._file = None
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self) -> Iterator[Dict]:
+        with open(self.file_path, "r") as f:
+            self._file = f
+            self._buf, self._pos, self._eof = "", 0, False
+            yield from self._walk_object(self.header, 0)
+            self._file = None
+
+    def _parse_float(self, text: str) -> float:
+        value = parse_float(text)
+        if type(value) is DecimalFloat:
+            self._decimals += 1
+        return value
+
+    def _fill(self) -> None:
+        """
+        Drop the consumed part of the buffer and read the next chunk.
+        """
+        self._buf = self._buf[self._pos :]
+        self._pos = 0
+        chunk = self._file.read(max(self.chunk_size, len(self._buf)))
+        if not chunk:
+            self._eof = True
+        self._buf += chunk
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                return ""
+            self._fill()
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if char == "" or char not in chars:
+            raise ValueError(
+                f"Expected one of '{chars}' but found '{char}' in {self.file_path}"
+            )
+        self._pos += 1
+        return char
+
+    def _decode(self):
+        """
+        Decode the JSON value at the current position, reading more of the
+        file until the value is complete.
+        """
+        while True:
+            self._peek()
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+
+            # A scalar that ends exactly at the buffer boundary may be truncated.
+            if end == len(self._buf) and not self._eof:
+                self._fill()
+                continue
+
+            self._pos = end
+            return value
+
+    def _walk_object(self, target: Dict, depth: int) -> Iterator[Dict]:
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._decode()
+            self._expect(":")
+
+            if key == self.events_path[depth] and depth == len(self.events_path) - 1:
+                if self._peek() != "[":
+                    raise ValueError(f"`{key}` is not an array in {self.file_path}")
+                self.found = True
+                yield from self._walk_array()
+            elif key == self.events_path[depth] and self._peek() == "{":
+                target[key] = {}
+                yield from self._walk_object(target[key], depth + 1)
+            else:
+                target[key] = self._decode()
+
+            if self._expect(",}") == "}":
+                return
+
+    def _walk_array(self) -> Iterator[Dict]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        while True:
+            decimals = self._decimals
+            value = self._decode()
+            self.has_decimals = self._decimals != decimals
+            yield value
+            if self._expect(",]") == "]":
+                return
+
+
+class ArgsStore:
+    """
+    Compact store of the per-event `args`.
+
+    The args of each event are JSON-encoded into a single utf-8 blob, along
+    with the offsets of each event into the blob (an empty span for an event
+    without args), and decoded on demand. Once frozen, both are numpy arrays,
+    so the store can be memory-mapped from the cache.
+
+    NOTE: The DecimalFloats (e.g., the timestamps of the nested events) keep
+    their exact decimal text through the store (see `parse_float`).
+    """
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> Optional[Dict]:
+        if idx < 0:
+            idx += len(self)
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        if start == end:
+            return None
+        return json.loads(bytes(self.blob[start:end]), parse_float=parse_float)
+
+    def append(self, args: Optional[Dict], has_decimals: bool = False) -> None:
+        """
+        :params: args: The args of the event.
+        :params: has_decimals: Whether the args may hold DecimalFloats (which the json module would round).
+        """
+        if args is not None:
+            body = dumps(args) if has_decimals else json.dumps(args, separators=(",", ":"))
+            self.blob += body.encode("utf-8")
+        self.offsets.append(len(self.blob))
+
+    def freeze(self) -> "ArgsStore":
+        """
+        Convert the buffers to numpy arrays, after which no more args can be appended.
+        """
+        self.blob = np.frombuffer(bytes(self.blob), dtype=np.uint8)
+        self.offsets = np.frombuffer(self.offsets, dtype=np.int64)
+        return self
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.blob) + len(self.offsets) * 8
+
+
+class EventColumns:
+    """
+    Columnar buffers for the trace events kept during ingest.
+
+    The columns are fixed by the keys of the first appended event; missing
+    keys are filled with None. Integer and float
+    columns are kept in typed arrays and strings are interned, so the memory
+    is proportional to the kept columns rather than the JSON object graph.
+
+    The numeric `args` listed in `args_keys` (i.e., {args key: column}) are
+    extracted into sparse columns: only the events carrying at least one of
+    them get a row, indexed by the position of the event. A list-valued arg
+    (e.g., "grid") maps to a list of columns, one per component. Unless
+    `keep_args` is False, the raw `args` are kept in `self.args` (see ArgsStore).
+
+    The `ticks_keys` (e.g., the timestamps) are also converted from their
+    exact decimal value to int64 ticks (i.e., `value * ticks_scale`, see
+    `to_ticks`) in `self.ticks`, and `self.fractional` holds the keys with a
+    non-integral value.
+    """
+
+    def __init__(
+        self,
+        skip_keys: List[str] = ["args"],
+        args_keys: Dict[str, Union[str, List[str]]] = {},
+        keep_args: bool = True,
+        ticks_keys: List[str] = [],
+        ticks_scale: int = 1,
+    ):
+        self.skip_keys = skip_keys
+        self.columns = {}
+        self.args = ArgsStore() if keep_args else None
+        self.size = 0
+        self._strings = {}
+
+        self.ticks_scale = ticks_scale
+        self.ticks = {key: array("q") for key in ticks_keys}
+        self.fractional = set()
+
+        self.args_keys = args_keys
+        self.args_idx = array("q")
+        self.args_columns = {
+            col: array("d")
+            for cols in args_keys.values()
+            for col in (cols if isinstance(cols, list) else [cols])
+        }
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, event: Dict, has_decimals: bool = False) -> None:
+        """
+        :params: event: The event.
+        :params: has_decimals: Whether the event may hold DecimalFloats (see `TraceReader.has_decimals`).
+        """
+        if self.size == 0:
+            self.columns = {
+                key: EventColumns._new_column(val)
+                for key, val in event.items()
+                if key not in self.skip_keys
+            }
+
+        for key, col in self.columns.items():
+            val = event.get(key)
+            if type(val) is str:
+                val = self._strings.setdefault(val, val)
+            try:
+                col.append(val)
+            except (TypeError, OverflowError):
+                # Value does not fit the typed buffer, fallback to a list.
+                col = self.columns[key] = list(col)
+                col.append(val)
+
+        for key, ticks in self.ticks.items():
+            val = event.get(key)
+            try:
+                if type(val) is int:
+                    ticks.append(val * self.ticks_scale)
+                    continue
+                if isinstance(val, float) and math.isfinite(val) and not val.is_integer():
+                    self.fractional.add(key)
+                ticks.append(to_ticks(val, self.ticks_scale))
+            except OverflowError:
+                raise ValueError(f"`{key}` of {val} is out of the range of the fixed-point ticks")
+
+        args = event.get("args")
+        if args and self.args_keys:
+            self._append_args(args)
+        if self.args is not None:
+            self.args.append(args, has_decimals)
+        self.size += 1
+
+    def _append_args(self, args: Dict) -> None:
+        values = {}
+        for key, cols in self.args_keys.items():
+            if key not in args:
+                continue
+            if isinstance(cols, list):
+                if isinstance(args[key], list):
+                    values.update(zip(cols, args[key]))
+            else:
+                values[cols] = args[key]
+
+        if len(values) == 0:
+            return
+
+        self.args_idx.append(self.size)
+        for col, arr in self.args_columns.items():
+            try:
+                arr.append(float(values.get(col, np.nan)))
+            except (TypeError, ValueError):
+                arr.append(np.nan)
+
+    def value(self, key: str, idx: int):
+        return self.columns[key][idx]
+
+    def ticks_array(self, key: str, scale: int) -> np.ndarray:
+        """
+        Returns the ticks of `key` at `scale` ticks per unit, where `ticks_scale` must be a multiple of `scale`.
+        """
+        return np.frombuffer(self.ticks[key], dtype=np.int64) // (self.ticks_scale // scale)
+
+    def to_df(self, categorical: List[str] = []) -> pd.DataFrame:
+        """
+        Returns the columns as a DataFrame, where the (list) columns in `categorical` are categoricals.
+        """
+        return pd.DataFrame(
+            {
+                key: np.frombuffer(col, dtype=col.typecode)
+                if isinstance(col, array)
+                else EventColumns._to_categorical(col)
+                if key in categorical
+                else col
+                for key, col in self.columns.items()
+            }
+        )
+
+    def args_to_df(self, int_columns: List[str] = []) -> pd.DataFrame:
+        """
+        Returns the extracted args, where the `int_columns` are nullable integers (the others are floats with NaN).
+        """
+        return pd.DataFrame(
+            {
+                col: pd.array(np.frombuffer(arr, dtype=np.float64)).astype("Int64")
+                if col in int_columns
+                else np.frombuffer(arr, dtype=np.float64)
+                for col, arr in self.args_columns.items()
+            },
+            index=pd.Index(np.frombuffer(self.args_idx, dtype=np.int64), name="idx"),
+        )
+
+    @staticmethod
+    def _to_categorical(col: List):
+        try:
+            return pd.Categorical(col)
+        except TypeError:
+            # Unhashable values (e.g., lists) are kept as-is.
+            return col
+
+    @staticmethod
+    def _new_column(val):
+        if type(val) is int:
+            return array("q")
+        if isinstance(val, float):
+            return array("d")
+        return []
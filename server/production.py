@@ -0,0 +1,142 @@
+import gc
+import io
+import os
+import signal
+import socket
+from typing import Callable, List, Optional
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from server.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+# Seconds an idle keep-alive connection is kept open.
+KEEP_ALIVE_TIMEOUT = 30
+
+# Maximum number of pending connections on the shared socket.
+LISTEN_BACKLOG = 128
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    Request handler speaking HTTP/1.1, so that the client reuses the connection
+    across requests (streamed responses are sent with chunked encoding).
+
+    NOTE: Werkzeug always closes the connection, since the request body may be
+    left unread (or the next request drained) before the next request line.
+    Here, the body is read upfront into a buffer (when its length is known),
+    which Werkzeug then reads and drains, so the connection can be kept alive.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    def run_wsgi(self) -> None:
+        self.is_keep_alive = (
+            self.request_version == "HTTP/1.1"
+            and self.headers.get("Connection", "").lower() != "close"
+            and self.headers.get("Transfer-Encoding", "").lower() != "chunked"
+        )
+        if not self.is_keep_alive:
+            return super().run_wsgi()
+
+        rfile = self.rfile
+        self.rfile = io.BytesIO(rfile.read(int(self.headers.get("Content-Length") or 0)))
+        try:
+            super().run_wsgi()
+        finally:
+            self.rfile = rfile
+
+    def send_header(self, keyword: str, value: str) -> None:
+        if keyword.lower() == "connection" and getattr(self, "is_keep_alive", False):
+            return
+        super().send_header(keyword, value)
+
+
+def serve(app, host: str, port: int, workers: int, on_fork: Optional[Callable[[], None]] = None) -> None:
+    """
+    Serve the (already loaded) application from `workers` forked processes.
+
+    The processed data of the parent is shared copy-on-write with the
+    workers; `gc.freeze` moves the preloaded objects out of the garbage
+    collector's reach so that collections in the workers do not touch (and
+    copy) their pages. The workers accept the connections of a single
+    listening socket, each with a threaded WSGI server.
+
+    :params: app: The WSGI application.
+    :params: host: Host to bind.
+    :params: port: Port to bind.
+    :params: workers: Number of worker processes.
+    :params: on_fork: Called in each worker before serving (e.g., to start its threads).
+    """
+    if not hasattr(os, "fork"):
+        LOGGER.error("The production mode requires os.fork (i.e., a POSIX system).")
+        exit(1)
+
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(app, host, port, sock, on_fork)
+        pids.append(pid)
+
+    LOGGER.info(f"Serving on http://{host}:{port} with {workers} workers (pids: {pids}).")
+    _wait_for_workers(pids)
+    sock.close()
+
+
+def _run_worker(app, host: str, port: int, sock: socket.socket, on_fork: Optional[Callable[[], None]]) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if on_fork is not None:
+        on_fork()
+
+    server = make_server(
+        host,
+        port,
+        app,
+        threaded=True,
+        request_handler=KeepAliveRequestHandler,
+        fd=sock.fileno(),
+    )
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def _wait_for_workers(pids: List[int]) -> None:
+    is_stopping = False
+
+    def stop(signum, frame):
+        nonlocal is_stopping
+        is_stopping = True
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    remaining = set(pids)
+    while remaining:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        remaining.discard(pid)
+        if status != 0 and not is_stopping:
+            LOGGER.warning(f"Worker {pid} exited with status {status}.")
+            stop(None, None)
@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+from server.logger import get_logger, init_logger
+from server.sessions import EXPERIMENT_HEADER, SESSION_HEADER, SessionStore
+from server.utils import create_dir_after_check
+
+LOGGER = get_logger(__name__)
+
+# Maximum number of responses waiting to be written; further responses are dropped.
+MAX_QUEUE_SIZE = 64
+
+# Maximum number of (serialized) response bytes waiting to be written; further responses are dropped.
+MAX_QUEUE_BYTES = 64 * 1024 * 1024
+
+RECORDINGS_DIR = "recordings"
+
+# Type of the records of the data directory loaded by the recorded server (the other records are requests).
+LOAD_RECORD = "load"
+
+
+class ResponseRecorder:
+    """
+    Background recorder of the HTTP requests and responses (DEV_MODE).
+
+    The request thread only enqueues; a writer thread appends every request
+    to a JSONL recording under `<out_dir>/recordings` (which can be replayed
+    with `python -m server.recorder <recording>`) and writes the response
+    payloads to `<out_dir>/<file_name>` (i.e., the latest response of each
+    endpoint).
+
+    NOTE: The sampled response payloads are serialized before they are
+    enqueued, so that the oversized ones are rejected upfront and the queue
+    holds at most `max_queue_bytes` of pending payloads (rather than up to
+    `max_queue_size` full response objects).
+
+    NOTE: Sampling and the size cap only apply to the response payloads; the
+    requests are small and always recorded, so that a replay stays consistent
+    (e.g., `set_experiment` before `fetch_timeline`). The session (and the
+    experiment hint) of each request is recorded as headers, so that a replay
+    keeps the sessions apart, and each loaded data directory is recorded as a
+    "load" record, which a replay loads by default.
+
+    :params: out_dir: Directory to write the responses and the recording.
+    :params: sample_rate: Fraction of the response payloads that are written.
+    :params: max_bytes: Response payloads larger than this are not written.
+    :params: max_queue_size: Maximum number of pending writes.
+    :params: max_queue_bytes: Maximum number of pending response bytes.
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        sample_rate: float = 1.0,
+        max_bytes: int = None,
+        max_queue_size: int = MAX_QUEUE_SIZE,
+        max_queue_bytes: int = MAX_QUEUE_BYTES,
+    ):
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_queue_bytes = max_queue_bytes
+        self.dropped = 0
+        self._pending_bytes = 0
+        self._pending_lock = threading.Lock()
+
+        create_dir_after_check(os.path.join(self.out_dir, RECORDINGS_DIR))
+        self.recording_path = os.path.join(
+            self.out_dir,
+            RECORDINGS_DIR,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl",
+        )
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    def record_request(self, request, response, elapsed_ms: float) -> None:
+        """
+        Enqueue a request (along with the status, size and latency of its response).
+
+        :params: request: The flask request.
+        :params: response: The flask response.
+        :params: elapsed_ms: Time taken by the handler.
+        """
+        record = {
+            "time": time.time(),
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "path": request.path,
+            "query": request.args.to_dict(),
+            "body": request.get_json(silent=True),
+            "headers": ResponseRecorder._session_headers(request),
+            "status": response.status_code,
+            "response_bytes": response.content_length,
+            "elapsed_ms": elapsed_ms,
+        }
+        self._put(("request", record))
+
+    def record_load(self, data_dir: str, profile_format: str) -> None:
+        """
+        Enqueue the data directory (and the profile format) loaded by the server.
+        """
+        record = {
+            "type": LOAD_RECORD,
+            "time": time.time(),
+            "data_dir": data_dir,
+            "format": profile_format,
+        }
+        self._put(("request", record))
+
+    @staticmethod
+    def _session_headers(request) -> Dict[str, str]:
+        """
+        Returns the session headers of a request (whether sent as headers or as cookies).
+        """
+        headers = {
+            SESSION_HEADER: SessionStore.session_id(request),
+            EXPERIMENT_HEADER: quote(SessionStore.experiment_hint(request)),
+        }
+        return {key: val for key, val in headers.items() if val != ""}
+
+    def record_response(self, json_data, file_name: str) -> None:
+        """
+        Serialize a response payload and enqueue it to be dumped to `<out_dir>/<file_name>`.
+        The payloads larger than `max_bytes`, or than the room left in the queue, are not enqueued.
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+
+        try:
+            body = json.dumps(json_data).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            LOGGER.warning(f"Failed to record {file_name}: {e}")
+            return
+        if self.max_bytes is not None and len(body) > self.max_bytes:
+            LOGGER.debug(f"Skipped dumping {file_name} ({len(body)} bytes).")
+            return
+
+        with self._pending_lock:
+            if self._pending_bytes + len(body) > self.max_queue_bytes:
+                self.dropped += 1
+                LOGGER.debug(f"Recorder queue is full, dropped a response ({self.dropped} so far).")
+                return
+            self._pending_bytes += len(body)
+
+        if not self._put(("response", body, file_name)):
+            self._release(len(body))
+
+    def flush(self) -> None:
+        """
+        Block until all the enqueued writes are done.
+        """
+        self._queue.join()
+
+    def _put(self, item) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            LOGGER.debug(f"Recorder queue is full, dropped a {item[0]} ({self.dropped} so far).")
+            return False
+
+    def _release(self, nbytes: int) -> None:
+        with self._pending_lock:
+            self._pending_bytes -= nbytes
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item[0] == "request":
+                    with open(self.recording_path, "a") as outfile:
+                        outfile.write(json.dumps(item[1]) + "\n")
+                else:
+                    try:
+                        self._write_response(*item[1:])
+                    finally:
+                        self._release(len(item[1]))
+            except (OSError, TypeError, ValueError) as e:
+                LOGGER.warning(f"Failed to record a {item[0]}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write_response(self, body: bytes, file_name: str) -> None:
+        with open(os.path.join(self.out_dir, file_name), "wb") as outfile:
+            outfile.write(body)
+        LOGGER.debug(f"Dumped http response to {file_name}")
+
+
+def load_recording(recording_path: str) -> List[Dict]:
+    with open(recording_path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(recording_path: str, data_dir: Optional[str] = None, repeat: int = 1) -> Dict[str, List[float]]:
+    """
+    Replays a recording against the Flask test client.
+
+    :params: recording_path: Path to the JSONL recording.
+    :params: data_dir: Data directory to load (by default, the first one loaded by the recorded server).
+    :params: repeat: Number of times the recording is replayed.
+    :returns: Latencies (in ms) per endpoint.
+    """
+    from server.http_server import HTTPServer, app
+
+    records = load_recording(recording_path)
+    if data_dir is None:
+        loads = [record for record in records if record.get("type") == LOAD_RECORD]
+        if len(loads) == 0:
+            raise ValueError(f"{recording_path} does not record a data directory; pass one to replay it.")
+        data_dir = loads[0]["data_dir"]
+    records = [record for record in records if record.get("type") != LOAD_RECORD]
+
+    HTTPServer({"data_dir": data_dir, "record_sample_rate": 0})
+    client = app.test_client()
+
+    latencies = defaultdict(list)
+    for _ in range(repeat):
+        for record in records:
+            start = time.perf_counter()
+            response = client.open(
+                record["path"],
+                method=record["method"],
+                query_string=record["query"],
+                json=record["body"],
+                headers=record.get("headers", {}),
+            )
+            response.get_data()
+            latencies[record["endpoint"]].append((time.perf_counter() - start) * 1000)
+
+            if response.status_code >= 400:
+                LOGGER.warning(f"{record['method']} {record['path']} returned {response.status_code}.")
+
+    return latencies
+
+
+def main():
+    """
+    Replay a recording and report the latency per endpoint.
+    """
+    init_logger(level=2)
+
+    parser = argparse.ArgumentParser(prefix_chars="--")
+    parser.add_argument("recording", help="Path to the JSONL recording", type=str)
+    parser.add_argument(
+        "--data_dir",
+        help="Performance directory path (by default, the one loaded by the recorded server)",
+        type=str,
+        required=False,
+    )
+    parser.add_argument("--repeat", help="Number of replays", type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        latencies = replay(args.recording, args.data_dir, args.repeat)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{'endpoint':<28}{'count':>8}{'mean (ms)':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+    for endpoint, values in sorted(latencies.items()):
+        values = np.asarray(values)
+        print(
+            f"{endpoint:<28}{len(values):>8}{values.mean():>12.2f}"
+            f"{np.percentile(values, 50):>12.2f}{np.percentile(values, 95):>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
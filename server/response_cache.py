@@ -0,0 +1,92 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from server.encoding import compress
+from server.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+# Maximum number of responses held in memory.
+MAX_ENTRIES = 256
+
+
+class CachedResponse:
+    """
+    Serialized JSON response along with its (content-hash) ETag. The
+    compressed variants are computed on first use and kept along.
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self._encoded = {}
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[bytes, str]:
+        """
+        Returns the body and the ETag of the variant for a content-coding (None for identity).
+        """
+        if encoding is None:
+            return self.body, self.etag
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding], f"{self.etag}-{encoding}"
+
+
+class ResponseCache:
+    """
+    LRU cache of the serialized responses of the read-only endpoints.
+
+    The responses are keyed by (dataset, experiment, endpoint, request body, query arguments,
+    dataset version), so a repeated request is answered with the cached bytes
+    (or a `304 Not Modified`) without touching the Timeline. The cache must be
+    cleared whenever the underlying data changes (e.g., on `load`); the
+    incremental refreshes of the watch mode bump the dataset version instead.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        dataset: str,
+        experiment: str,
+        endpoint: str,
+        body: Optional[dict],
+        query: Optional[dict] = None,
+        version: int = 0,
+    ) -> Tuple:
+        # NOTE: The body is canonicalized so that the key does not depend on the key order or whitespace.
+        return (
+            dataset,
+            experiment,
+            endpoint,
+            json.dumps(body, sort_keys=True),
+            json.dumps(query or {}, sort_keys=True),
+            version,
+        )
+
+    def get(self, key: Tuple) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, body: bytes) -> CachedResponse:
+        entry = CachedResponse(body)
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+        LOGGER.debug("Cleared the response cache.")
@@ -1,11 +1,57 @@
+import functools
+import re
 from os import stat
 from typing import Dict
 
+import pandas as pd
+
 from server.logger import get_logger
 
 LOGGER = get_logger(__name__)
 
 
+class Classifier:
+    """
+    Classifies event names into the groups of a rules profile.
+
+    The regexes are compiled once and, within a call to `classify`, every
+    unique event name is matched only once. Same as before, the first
+    matching regex (in the order of the "grouping") decides the group.
+    """
+
+    def __init__(self, grouping: Dict) -> None:
+        regex_to_group = {}
+        for grp, rule in grouping.items():
+            for reg in rule["regex"]:
+                regex_to_group[reg] = grp
+
+        self.patterns = [(re.compile(reg), grp) for reg, grp in regex_to_group.items()]
+        self.group_to_type = {
+            grp: rule["event_type"]
+            for grp, rule in grouping.items()
+            if "event_type" in rule
+        }
+
+    def match(self, name: str) -> str:
+        """
+        Returns the group of an event name (None, if no regex matches).
+        """
+        for pattern, grp in self.patterns:
+            if pattern.search(name):
+                return grp
+        return None
+
+    def classify(self, names: pd.Series) -> pd.Series:
+        """
+        Returns the group for each event name.
+
+        NOTE: The classifier is shared by the whole process (see `Rules.get_classifier`),
+        so the names are not memoized across calls.
+        """
+        mapper = {name: self.match(name) for name in names.unique()}
+        return names.map(mapper)
+
+
 class Rules:
     """
     Class to define the rules for supported timeline formats
@@ -20,6 +66,25 @@ class Rules:
     def __init__(self) -> None:
         pass
 
+    def get(self, format: str) -> Dict:
+        """
+        Returns the rules for a given profile format.
+        """
+        if format == "JIT":
+            return self.jit()
+        elif format == "DMV":
+            return self.dmv()
+
+        LOGGER.error(f"No rules defined for the {format} format.")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_classifier(profile: str) -> Classifier:
+        """
+        Returns the (compiled once) Classifier for a rules profile, i.e., "dmv", "jit" or "snprof".
+        """
+        return Classifier(getattr(Rules(), profile)()["grouping"])
+
     def validate(self) -> bool:
         """
         TODO: Add validation and tests for the `self.rules`.
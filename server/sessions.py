@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+
+from server.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+# Header (or cookie) identifying the session of a client.
+SESSION_HEADER = "X-DMV-Session"
+SESSION_COOKIE = "dmv_session"
+
+# Header (or cookie) mirroring the experiment selected by a client.
+EXPERIMENT_HEADER = "X-DMV-Experiment"
+EXPERIMENT_COOKIE = "dmv_experiment"
+
+# Session used by the clients that do not identify themselves.
+DEFAULT_SESSION = ""
+
+# Maximum number of sessions kept; the least recently used ones are dropped.
+MAX_SESSIONS = 1024
+
+
+class SessionStore:
+    """
+    Per-session state (i.e., the selected experiment) of the clients.
+
+    Only the experiment name is kept per session; the Timelines (and the
+    response cache) are shared across the sessions.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.experiments = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def session_id(request) -> str:
+        """
+        Returns the session of a request, from the `X-DMV-Session` header or
+        the `dmv_session` cookie.
+        """
+        return request.headers.get(
+            SESSION_HEADER, request.cookies.get(SESSION_COOKIE, DEFAULT_SESSION)
+        )
+
+    @staticmethod
+    def experiment_cookie(session_id: str) -> str:
+        """
+        Returns the name of the cookie mirroring the experiment of a session.
+
+        NOTE: The cookies are shared by the tabs of a browser, so the cookie is
+        scoped to the session; otherwise, two tabs (i.e., sessions) overwrite
+        each other's experiment.
+        """
+        if session_id == DEFAULT_SESSION:
+            return EXPERIMENT_COOKIE
+        return f"{EXPERIMENT_COOKIE}.{quote(session_id, safe='')}"
+
+    @staticmethod
+    def experiment_hint(request) -> str:
+        """
+        Returns the experiment mirrored by the client, from the
+        `X-DMV-Experiment` header or the `dmv_experiment` cookie of its session.
+
+        NOTE: With several worker processes, the session may have been set
+        on another worker; hence, the client's copy takes precedence.
+        """
+        if EXPERIMENT_HEADER in request.headers:
+            return unquote(request.headers[EXPERIMENT_HEADER])
+        session_id = SessionStore.session_id(request)
+        return request.cookies.get(SessionStore.experiment_cookie(session_id), "")
+
+    def get_experiment(self, session_id: str) -> str:
+        with self._lock:
+            if session_id not in self.experiments:
+                return ""
+            self.experiments.move_to_end(session_id)
+            return self.experiments[session_id]
+
+    def set_experiment(self, session_id: str, experiment: str) -> None:
+        with self._lock:
+            self.experiments[session_id] = experiment
+            self.experiments.move_to_end(session_id)
+            while len(self.experiments) > self.max_sessions:
+                dropped, _ = self.experiments.popitem(last=False)
+                LOGGER.debug(f"Dropped the session {dropped}.")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.experiments.clear()
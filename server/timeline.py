@@ -1,27 +1,92 @@
-import copy
+from array import array
+from decimal import ROUND_HALF_EVEN, Decimal
 import itertools
 import math
 import json
 import numpy as np
 import pandas as pd
-import re
 from typing import Dict, List, Tuple
 import random
 
+from server.event_index import EventIndex
+from server.ingest import EventColumns, TraceReader
 from server.logger import get_logger
 from server.rules import Rules
-from server.utils import (
-    load_json,
-    group_by_and_apply_sum,
-    combine_dicts_and_sum_values,
-    dict_to_list_of_vals,
-)
+from server.window_index import CoverageIndex, WindowIndex
+from server.utils import dict_to_list_of_vals
 
 LOGGER = get_logger(__name__)
 
 EVENT_TYPES = ["background", "point", "range"]
 ALLOWED_EVENT_PH = ["B", "E", "X"]
 
+# Vis-type of an event based on its phase.
+PH_TO_TYPE = {"B": "range", "E": "range", "i": "point", "X": "x-range"}
+
+# Vis-types of the events (i.e., the categories of the "type" column).
+TYPE_DTYPE = pd.CategoricalDtype(["background", "point", "range", "x-range"])
+
+# String columns of the event DataFrames that are stored as categoricals.
+CATEGORICAL_COLUMNS = ["ph", "cat", "name", "group", "type", "content", "className"]
+
+# Integer columns of the event DataFrames that are downcast to the smallest width that fits.
+DOWNCAST_COLUMNS = ["pid", "tid"]
+
+# dtype of the (numeric) group of the events in grp_df_dict and sub_grp_df_dict.
+GROUP_DTYPE = np.int16
+
+# Timestamp columns of the event DataFrames, stored as int64 fixed-point ticks (see Timeline.ts_scale).
+TS_COLUMNS = ["ts", "dur", "start", "end"]
+
+# Ticks per trace time unit, when the timestamps are not integral (i.e., nanoseconds for the microsecond Chrome traces).
+TS_SCALE = 1000
+
+# Numeric args (of DMTracker / PyTorch-profiler traces) extracted into `Timeline.args_df` at ingest (i.e., {args key: column(s)}).
+ARGS_COLUMNS = {
+    "bytes": "bytes",
+    "memory bandwidth (GB/s)": "mem_bandwidth",
+    "est. achieved occupancy %": "occupancy",
+    "blocks per SM": "blocks_per_sm",
+    "shared memory": "shared_memory",
+    "registers per thread": "registers_per_thread",
+    "grid": ["grid_x", "grid_y", "grid_z"],
+    "block": ["block_x", "block_y", "block_z"],
+    "correlation": "correlation",
+    "stream": "stream",
+    "device": "device",
+}
+
+# Columns of `Timeline.args_df` that hold integers (the others are floats).
+ARGS_INT_COLUMNS = [
+    "bytes",
+    "shared_memory",
+    "registers_per_thread",
+    "grid_x",
+    "grid_y",
+    "grid_z",
+    "block_x",
+    "block_y",
+    "block_z",
+    "correlation",
+    "stream",
+    "device",
+]
+
+# Capacity (in bytes) used to normalize the shared memory and blocks per SM utilization.
+SHARED_MEM_PER_BLOCK = 49152
+
+# Name (and class name) of the remainder bucket of the top-k summaries.
+OTHER_SUMMARY = "other"
+
+# Directions of the data movement, matched against the event names.
+DMV_DIRECTIONS = ["HtoD", "DtoH", "DtoD", "PtoP"]
+
+# Location of the "traceEvents" array in the trace for each profile format.
+EVENTS_PATH = {
+    "JIT": ["data", "traceEvents"],
+    "DMV": ["traceEvents"],
+}
+
 # Pandas automatically converts to scientific notation when creating new dataframes.
 # To avoid this, we set the pandas options to format to float gloablly.
 pd.options.display.float_format = "{:.3f}".format
@@ -33,23 +98,36 @@ class Timeline:
         Initializes a Timeline object.
         """
         self.profile_format = profile_format
-        # Derive the rules based on profile_format and read json from file_path.
-        self.rules, self.timeline, self.metadata, self.metrics = self.init(metric_file_path, trace_file_path, profile_format)
+        # Derive the rules based on profile_format and stream the events from file_path.
+        self.rules, events, self.metadata, self.metrics = self.init(metric_file_path, trace_file_path, profile_format)
 
         self.calculate_mappers()
 
         # Set the start and end timestamp.
-        self.start_ts = self.timeline[0]["ts"]
-        self.end_ts = self.timeline[-1]["ts"]
-
-        # Convert the timeline to a pandas.DataFrame
-        # NOTE: We skip args at the moment because of its dtype=JSON, which requires further refactor to convert to a valid column in timeline_df.
-        # TODO: Add `args` to the final timeline_df.
-        self.timeline_df = self.to_df(self.timeline, skip_keys=["args"])
+        self.start_ts = events.value("ts", 0)
+        self.end_ts = events.value("ts", -1)
+
+        # Convert the event columns to a pandas.DataFrame
+        # NOTE: `args` are not part of the timeline_df because of its dtype=JSON. They are kept aside (JSON-encoded)
+        # in self.event_args, and the numeric args (see ARGS_COLUMNS) are extracted into self.args_df (indexed by the event's position).
+        self.timeline_df = Timeline.compact_columns(events.to_df(categorical=CATEGORICAL_COLUMNS))
+        self.event_args = events.args.freeze()
+        self.args_df = events.args_to_df(int_columns=ARGS_INT_COLUMNS)
         LOGGER.debug(
             f"Constructed the timeline dataframe with {self.timeline_df.shape[0]} events"
         )
 
+        # Read the sub_group events (nested in the args of their parent events) of the rules.
+        sub_grp_events, is_sub_grp_fractional = self.read_subgroup_events()
+
+        # Store the timestamps as int64 fixed-point ticks (i.e., `ts * self.ts_scale`), converted from
+        # their exact decimal text at ingest, so that fractional timestamps do not lose precision.
+        # The exposed APIs convert them back to the trace units.
+        self.ts_scale = TS_SCALE if len(events.fractional) > 0 or is_sub_grp_fractional else 1
+        for col in ["ts", "dur"]:
+            if col in self.timeline_df.columns:
+                self.timeline_df[col] = events.ticks_array(col, self.ts_scale)
+
         # Add vis-related fields as columns in the dataframe.
         #   "group": determined by the self.rules
         #   "type": determined by the event type: 'point', 'range', and 'background'.
@@ -62,60 +140,101 @@ class Timeline:
         # Process the sub_group timelines in the events.
         # If a sub_group is not present, there will be an empty dataframe.
         # Format: { grp: pd.DataFrame({Event} for grp in self.rules.keys() }
-        self.sub_grp_df_dict = self.construct_subgroup_timeline_df_dict()
+        self.sub_grp_df_dict = self.construct_subgroup_timeline_df_dict(sub_grp_events)
 
-        self.event_to_grp = self.construct_event_to_grp_dict()
-        self.grp_to_events = dict_to_list_of_vals(self.event_to_grp)
+        # Index the groups and events (i.e., membership, durations and counts) for the summary views.
+        self.event_index = EventIndex(self.grp_df_dict, self.sub_grp_df_dict)
 
-        self.event_durations = self.construct_event_duration_dict()
+        # Groups in the vis-timeline format.
+        self.vis_groups = self.construct_vis_groups()
+
+        # Data movement of the events (e.g., cudaMemcpy) and its totals.
+        self.dmv_df = self.construct_dmv_df()
+        self.dmv = Timeline.dmv_stats(self.dmv_df)
+        LOGGER.debug(f"Total bytes moved (in bytes): {sum(self.dmv[f'total_bytes_{d}'] for d in DMV_DIRECTIONS)}")
+
+        # Index the events by their start and end timestamps for the window queries.
+        self.grp_window_index = WindowIndex(self.grp_df_dict)
+        self.sub_grp_window_index = WindowIndex(self.sub_grp_df_dict)
+
+        # Index the busy time of each group for the summary (i.e., histogram) views.
+        self.coverage_index = CoverageIndex(
+            [df for type, df in self.grp_df_dict.items() if type != "background"]
+            + list(self.sub_grp_df_dict.values()),
+            origin=self.start_ts,
+            scale=self.ts_scale,
+        )
+
+    def __getstate__(self) -> Dict:
+        # NOTE: self.rules contain lambdas that cannot be pickled, so they are re-derived from the profile_format.
+        state = self.__dict__.copy()
+        del state["rules"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.rules = Rules().get(self.profile_format)
 
     ################### Pre-processing functions ###################
     def init(self, metric_file_path: str, trace_file_path: str, format: str) -> None:
         """
-        1. Reads the JSON object.
+        1. Streams the "traceEvents" from the JSON file into columnar buffers.
         2. Validate JSON (TODO).
         3. Based on format, self.rules object is created. NOTE: For new formats, add a new rule in Rules.py.
-        4. Assign the "traceEvents" to the self.timeline
+        4. Filters out the events that are not part of ALLOWED_EVENT_PH while streaming.
         5. Adds metadata, if available.
 
         :params: file_path : Path of the Chrome trace JSON.
         :params: format : supports two formats, JIT.
         """
         LOGGER.debug(f"Loading {trace_file_path} as a timeline.")
-        # Read the trace from the timeline JSON.
-        profile = load_json(file_path=trace_file_path)
 
-        timeline = []
         metrics = {}
         metadata = {}
 
-        # Derive the rules, timeline and metadata based on the format.
+        # Derive the rules and the location of the "traceEvents" based on the format.
+        # NOTE: Current structure in JIT Profiler dumps the data into json["data"]["traceEvents"].
         if format == "JIT":
             rules = Rules().jit()
+        elif format == "DMV":
+            rules = Rules().dmv()
+        else:
+            LOGGER.error("Invalid profile format!")
 
-            # NOTE: Current structure in JIT Profiler dumps the data into json["data"]["traceEvents"].
-            if "data" not in profile.keys():
-                LOGGER.error(
-                    f"Are you sure the timeline format for {trace_file_path} is {format}? Looks like it's not ;("
-                )
-                exit(1)
+        # Assert if the required fields in rules that are used by this class are present.
+        assert set(["grouping", "ordering"]) == set(rules.keys())
+
+        # Read the trace incrementally and filter out events that are not part of ALLOWED_EVENT_PH
+        # NOTE: Some of the metadata events are ignored because they dont have a Begin or End phase.
+        reader = TraceReader(trace_file_path, EVENTS_PATH[format])
+        events = EventColumns(
+            skip_keys=["args"], args_keys=ARGS_COLUMNS, ticks_keys=["ts", "dur"], ticks_scale=TS_SCALE
+        )
+        try:
+            for event in reader:
+                if event["ph"] in ALLOWED_EVENT_PH:
+                    events.append(event, reader.has_decimals)
+        except ValueError as e:
+            LOGGER.error(f"Unable to parse {trace_file_path}: {e}")
+            exit(1)
+        profile = reader.header
+
+        if format == "JIT" and "data" not in profile.keys():
+            LOGGER.error(
+                f"Are you sure the timeline format for {trace_file_path} is {format}? Looks like it's not ;("
+            )
+            exit(1)
 
-            if "traceEvents" not in profile["data"].keys():
-                LOGGER.error(f"Missing field: `traceEvents`")
-                exit(1)
+        if not reader.found:
+            LOGGER.error(f"Missing field: `traceEvents`")
+            exit(1)
 
-            timeline = profile["data"]["traceEvents"]
+        # Derive the metadata and metrics based on the format.
+        if format == "JIT":
             metadata = Timeline.jit_metadata(profile)
             metrics = {} # No metrics were collected for the JIT format. 
 
         elif format == "DMV":
-            rules = Rules().dmv()
-
-            if "traceEvents" not in profile.keys():
-                LOGGER.error(f"Missing field: `traceEvents`")
-                exit(1)
-
-            timeline = profile["traceEvents"]
             metadata = [
                 {"name": _k, "key": _v}
                 for _k, _v in profile["deviceProperties"][0].items()
@@ -130,21 +249,11 @@ class Timeline:
             metadata.append({"name": 'gpuUtilization', "key": metrics['utilization_gpu'] })
             metadata.append({"name": 'memUtilization', "key": metrics['utilization_memory']})
 
-        else:
-            LOGGER.error("Invalid profile format!")
-
-        # Assert if the required fields in rules that are used by this class are present.
-        assert set(["grouping", "ordering"]) == set(rules.keys())
-
-        # Filter out events that are not part of ALLOWED_EVENT_PH
-        # NOTE: Some of the metadata events are ignored because they dont have a Begin or End phase.
-        timeline = [e for e in timeline if e["ph"] in ALLOWED_EVENT_PH]
-
-        # assert(len(timeline) != 0)
+        # assert(len(events) != 0)
         # assert(len(metrics.keys()) != 0)
         # assert(len(metadata) != 0)
 
-        return rules, timeline, metadata, metrics
+        return rules, events, metadata, metrics
 
     def calculate_mappers(self):
         self.grp_to_idx = {grp: idx for idx, grp in enumerate(self.rules["ordering"])}
@@ -165,39 +274,75 @@ class Timeline:
             self.grp_to_cls[grp] = class_prefix + "-" + str(idx % 4 + 1)
         self.cls_to_grp = dict_to_list_of_vals(self.grp_to_cls)
 
-    def to_df(self, timeline: json, skip_keys=[]) -> pd.DataFrame:
-        keys = timeline[0].keys()
-        f_keys = [i for i in keys if i not in skip_keys]
-        _df = pd.DataFrame({key: [e[key] for e in timeline] for key in f_keys})
+    @staticmethod
+    def compact_columns(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Stores the string columns (see CATEGORICAL_COLUMNS) as categoricals and
+        downcasts the integer columns (see DOWNCAST_COLUMNS) in-place.
+        """
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                try:
+                    df[col] = df[col].astype("category")
+                except TypeError:
+                    pass  # Unhashable values (e.g., lists) are kept as-is.
+
+        for col in DOWNCAST_COLUMNS:
+            if col in df.columns and pd.api.types.is_integer_dtype(df[col].dtype):
+                df[col] = pd.to_numeric(df[col], downcast="integer")
 
-        # NOTE: We lose a bit of precision here because we round to the nearest integer.
-        # _df["ts"] = _df["ts"].apply(lambda d: int(d))
-        return _df
+        return df
 
-    def add_vis_fields(self) -> None:
+    def from_ticks(self, value):
         """
-        Add the vis fields to each row in timeline_df based on the type of event.
-        # TODO: Consider employing builder pattern to add/remove fields on the dataframe.
+        Converts fixed-point ticks (a scalar or an array) back to the trace units.
         """
-        group_rules = self.rules["grouping"]
-
-        for idx, event in self.timeline_df.iterrows():
-            # Add "group", "type" fields.
-            _group, _type = Timeline.match_event_group_and_type(event, group_rules)
-            _event = self.get_event_by_id(idx)
-            _event = self.get_event_by_id(idx)
+        return value if self.ts_scale == 1 else value / self.ts_scale
 
-            self.timeline_df.at[idx, "group"] = _group
-            self.timeline_df.at[idx, "type"] = _type
+    def to_ticks(self, value) -> int:
+        """
+        Converts a timestamp (in the trace units) to fixed-point ticks, e.g., for the window queries.
+        NOTE: The ticks are rounded from the exact value of the timestamp, since a float64 product
+        is off by up to hundreds of ticks at the epoch timestamps.
+        """
+        if isinstance(value, (int, np.integer)):
+            return int(value) * self.ts_scale
+        return int((Decimal(float(value)) * self.ts_scale).to_integral_value(rounding=ROUND_HALF_EVEN))
 
-            # Add "content" field.
-            if "content" in group_rules[_group].keys():
-                _args = self.get_event_args(idx)
-                _content = group_rules[_group]["content"](_args)
-            else:
-                _content = ""
+    def frame_from_ticks(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns the events with their timestamp columns (see TS_COLUMNS) in the trace units.
+        """
+        if self.ts_scale == 1:
+            return df
+        return df.assign(
+            **{col: df[col] / self.ts_scale for col in TS_COLUMNS if col in df.columns}
+        )
 
-            self.timeline_df.at[idx, "content"] =  event["name"]
+    def add_vis_fields(self) -> None:
+        """
+        Add the vis fields (i.e., "group", "type" and "content") as columns to timeline_df.
+        # TODO: Consider employing builder pattern to add/remove fields on the dataframe.
+        """
+        classifier = Rules.get_classifier(self.profile_format.lower())
+
+        # Add "group" field.
+        groups = classifier.classify(self.timeline_df["name"])
+        unmatched = self.timeline_df.loc[groups.isna(), "name"].unique().tolist()
+        assert len(unmatched) == 0, f"No matching group identified for {unmatched}."
+        self.timeline_df["group"] = groups
+
+        # Add "type" field, determined by the phase unless an override is specified in the rules.
+        phase_types = self.timeline_df["ph"].map(PH_TO_TYPE).astype(object)
+        types = groups.map(classifier.group_to_type).astype(object).fillna(phase_types)
+        if not types.isin(TYPE_DTYPE.categories).all():
+            raise ValueError("Invalid type detected in the `self.rules`")
+        self.timeline_df["type"] = types.astype(TYPE_DTYPE)
+
+        # Add "content" field.
+        # NOTE: The "content" in the rules is not used at the moment, we use the event name instead.
+        self.timeline_df["content"] = self.timeline_df["name"]
+        Timeline.compact_columns(self.timeline_df)
 
     def construct_point_df(
         self, df: pd.DataFrame, column: str = "ph", override: Dict = {}
@@ -206,74 +351,63 @@ class Timeline:
         Construct the dataframe containing the point-based events.
         """
         assert column in df.columns
-        grouping_rules = self.rules["grouping"]
-
-        ret = []
-        for idx, row in df.iterrows():
-            _e = row.to_dict()
 
-            _e["className"] = self.grp_to_cls[_e["group"]]
-            _e["idx"] = idx
-            _e["dur"] = (
-                0 if _e["ph"] == "i" else _e["dur"]
-            )  # Duration for a point event is 0
-            _e["group"] = self.grp_to_idx[_e["group"]]
-            _e["start"] = _e["ts"]
+        is_point = (df[column] == "i").to_numpy()
+        is_x_range = (df[column] == "X").to_numpy()
+        start_ts = df["ts"].to_numpy()
+        dur = df["dur"].to_numpy() if "dur" in df.columns else np.zeros(df.shape[0], dtype=np.int64)
+
+        ret_df = df.drop(columns=["ts"]).reset_index(drop=True)
+        ret_df["className"] = ret_df["group"].map(self.grp_to_cls).astype("category")
+        ret_df["idx"] = df.index.to_numpy()
+        ret_df["dur"] = np.where(is_point, 0, dur)  # Duration for a point event is 0
+        ret_df["group"] = ret_df["group"].map(self.grp_to_idx).astype(GROUP_DTYPE)
+        ret_df["start"] = start_ts
+
+        if is_x_range.all():
+            ret_df["end"] = start_ts + dur
+            ret_df["type"] = pd.Categorical(["range"] * ret_df.shape[0], dtype=TYPE_DTYPE)
+        elif is_x_range.any():
+            ret_df["end"] = np.where(is_x_range, start_ts + dur, np.nan)
+            ret_df["type"] = ret_df["type"].where(~is_x_range, "range")
 
-            if _e["ph"] == "X":
-                _e["end"] = _e["start"] + _e["dur"]
-                _e["type"] = "range"
-
-            del _e["ts"]
-            ret.append(_e)
-
-        return pd.DataFrame(ret)
+        return ret_df
 
     def construct_range_df(
-        self, df: pd.DataFrame, column: str = "ph", override: Dict = {}
+        self,
+        df: pd.DataFrame,
+        column: str = "ph",
+        override: Dict = {},
+        partition_keys: List[str] = ["pid", "tid"],
     ) -> pd.DataFrame:
         """
         Construct the dataframe containing the range-based events.
         """
         assert column in df.columns
 
-        grouping_rules = self.rules["grouping"]
+        begin, end = Timeline.match_start_and_end_events(df, column, partition_keys)
 
-        ret = []
-        indexes = Timeline.match_start_and_end_events(df)
-        for index in indexes:
-            _range_event = {}
-            event, [bt, et] = index
-
-            _s = df.iloc[bt].to_dict()
-            _e = df.iloc[et].to_dict()
-
-            assert _s["name"] == _e["name"]
-            assert _s[column] == "B" and _e[column] == "E"
-
-            _range_event = copy.deepcopy(_s)
-            _range_event["className"] = (
-                self.grp_to_cls[_e["group"]]
-                if "className" not in override
-                else override["className"]
-            )
-            _range_event["dur"] = _e["ts"] - _s["ts"]
-            _range_event["end"] = _e["ts"]
-            _range_event["group"] = (
-                self.grp_to_idx[_s["group"]]
-                if "group" not in override
-                else override["group"]
-            )
-            _range_event["start"] = _s["ts"]
-
-            del _range_event["ts"]
-
-            ret.append(_range_event)
+        ret_df = df.iloc[begin].reset_index(drop=True)
+        start_ts = ret_df["ts"].to_numpy()
+        end_ts = df["ts"].to_numpy()[end]
 
-        ret_df = pd.DataFrame(ret)
-        ret_df = ret_df.drop(columns=["ph"])
+        ret_df["className"] = (
+            ret_df["group"].map(self.grp_to_cls)
+            if "className" not in override
+            else override["className"]
+        )
+        ret_df["className"] = ret_df["className"].astype("category")
+        ret_df["dur"] = end_ts - start_ts
+        ret_df["end"] = end_ts
+        ret_df["group"] = (
+            ret_df["group"].map(self.grp_to_idx)
+            if "group" not in override
+            else override["group"]
+        )
+        ret_df["group"] = ret_df["group"].astype(GROUP_DTYPE)
+        ret_df["start"] = start_ts
 
-        return ret_df
+        return ret_df.drop(columns=["ts", column])
 
     def construct_timeline_df_dict(self) -> Dict[str, pd.DataFrame]:
         """
@@ -281,7 +415,7 @@ class Timeline:
         """
         df_dict = {}
         assert "type" in self.timeline_df.columns
-        _grp_df = self.timeline_df.groupby("type")
+        _grp_df = self.timeline_df.groupby("type", observed=True)
 
         for type, grp in _grp_df:
             grp = grp.sort_values(by=["ts"])
@@ -297,13 +431,22 @@ class Timeline:
 
         return df_dict
 
-    def construct_subgroup_timeline_df_dict(self) -> Dict[str, pd.DataFrame]:
+    def read_subgroup_events(self) -> Tuple[Dict[str, Tuple[pd.DataFrame, pd.DataFrame]], bool]:
         """
-        Construct a timeline df for the sub_group's present inside the rule for a given group.
-        NOTE: Sub-groups are only supported for "range" and "background" events.
+        Read the events of the sub_group's present inside the rule for a given group.
+
+        The nested events of all the spans (i.e., the begin and end events of
+        the group) are flattened in a single pass into one DataFrame per
+        group, where the "span" column points to their span.
+
+        The "ts" and "dur" of the events are int64 ticks at TS_SCALE (see EventColumns).
+
+        :returns: { grp: (pd.DataFrame({start_pos, end_pos, rt_id} per span), pd.DataFrame({Event})) },
+            and whether any of the timestamps is fractional.
         """
         grouping_rules = self.rules["grouping"]
-        sub_group_df_dict = {}
+        sub_group_events = {}
+        is_fractional = False
         for grp in grouping_rules:
             if "sub_groups" in grouping_rules[grp]:
                 _rule = grouping_rules[grp]["sub_groups"]
@@ -316,199 +459,341 @@ class Timeline:
                 sub_group_data_key = _rule["data"]
                 sub_group_name = _rule["name"]
 
-                sub_group_df_dict[grp] = pd.DataFrame({})
-
-                _start_df = self.timeline_df.loc[
+                _start_pos = np.flatnonzero(
                     (self.timeline_df["name"] == grp) & (self.timeline_df["ph"] == "B")
-                ]
-                _end_df = self.timeline_df.loc[
+                )
+                _end_pos = np.flatnonzero(
                     (self.timeline_df["name"] == grp) & (self.timeline_df["ph"] == "E")
-                ]
-
-                assert _start_df.shape == _end_df.shape
-
-                for idx in range(_start_df.shape[0]):
-                    # NOTE: There is an assumption here that only `End` events might have `traceEvents`.
-                    # This was mainly because we collect `snprof` events and attach to `runtime` context.
-                    # TODO: Make this more generalizable to consume `traceEvents` even from the `Begin` events.
-                    rt_start_time = _start_df["ts"].tolist()[idx]
-                    rt_end_time = _end_df["ts"].tolist()[idx]
+                )
 
-                    row = _end_df.iloc[idx]
+                assert _start_pos.shape == _end_pos.shape
 
-                    args = self.get_event_args(row["id"])
+                spans = pd.DataFrame(
+                    {
+                        "start_pos": _start_pos,
+                        "end_pos": _end_pos,
+                        "rt_id": self.timeline_df["id"].to_numpy()[_end_pos],
+                    }
+                )
 
+                # NOTE: There is an assumption here that only `End` events might have `traceEvents`.
+                # This was mainly because we collect `snprof` events and attach to `runtime` context.
+                # TODO: Make this more generalizable to consume `traceEvents` even from the `Begin` events.
+                events = EventColumns(
+                    skip_keys=["args"], keep_args=False, ticks_keys=["ts", "dur"], ticks_scale=TS_SCALE
+                )
+                event_spans = array("q")
+                for span, rt_id in enumerate(spans["rt_id"].tolist()):
+                    args = self.get_event_args(rt_id)
                     if args is not None and sub_group_data_key in args.keys():
-                        _df = self.to_df(args[sub_group_data_key], skip_keys=["args"])
-                        _df["rt_id"] = row["id"]
-                        _df["content"] = _df["name"]
-                        _df["group"] = sub_group_name
-
-                        _range_df = self.construct_range_df(
-                            _df,
-                            override={"className": grp},
-                        )
-
-                        # NOTE: Special condition to add Runtime setup and teardown events.
-                        # We did this because `snprof` was not outputting the setup and teardown stages.
-                        # if self.profile_format == "JIT" and grp == "runtime":
-                        new_rt_events_df = Timeline.add_rt_setup_and_teardown_events(
-                            _range_df, rt_start_time, rt_end_time
-                        )
+                        for event in args[sub_group_data_key]:
+                            events.append(event)
+                        event_spans.extend([span] * len(args[sub_group_data_key]))
+
+                if len(events) == 0:
+                    sub_group_events[grp] = (spans, pd.DataFrame({}))
+                    continue
+
+                _df = events.to_df(categorical=CATEGORICAL_COLUMNS)
+                for col in ["ts", "dur"]:
+                    if col in _df.columns:
+                        _df[col] = events.ticks_array(col, TS_SCALE)
+                is_fractional = is_fractional or len(events.fractional) > 0
+                _df["span"] = np.frombuffer(event_spans, dtype=np.int64)
+                _df["rt_id"] = spans["rt_id"].to_numpy()[_df["span"].to_numpy()]
+                _df["content"] = _df["name"]
+                _df["group"] = sub_group_name
+                sub_group_events[grp] = (spans, _df)
+
+        return sub_group_events, is_fractional
+
+    def construct_subgroup_timeline_df_dict(
+        self, sub_group_events: Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Construct a timeline df for the sub_group's present inside the rule for a given group (see read_subgroup_events).
+        The begin and end events are paired at once for all the spans (i.e., partitioned by span, pid and tid),
+        followed by the runtime setup and teardown events of every span.
+        NOTE: Sub-groups are only supported for "range" and "background" events.
+        """
+        ts = self.timeline_df["ts"].to_numpy()
+        sub_group_df_dict = {}
+        for grp, (spans, _df) in sub_group_events.items():
+            if _df.empty:
+                sub_group_df_dict[grp] = pd.DataFrame({})
+                continue
 
-                        _range_df = pd.concat([_range_df, new_rt_events_df], sort=False)
+            # NOTE: The ticks are read at TS_SCALE (see read_subgroup_events).
+            for col in ["ts", "dur"]:
+                if col in _df.columns:
+                    _df[col] = _df[col].to_numpy() // (TS_SCALE // self.ts_scale)
 
-                        sub_group_df_dict[grp] = pd.concat(
-                            [sub_group_df_dict[grp], _range_df]
-                        )
+            _range_df = self.construct_range_df(
+                _df,
+                override={"className": grp},
+                partition_keys=["span", "pid", "tid"],
+            )
 
-        return sub_group_df_dict
+            # NOTE: Special condition to add Runtime setup and teardown events.
+            # We did this because `snprof` was not outputting the setup and teardown stages.
+            # if self.profile_format == "JIT" and grp == "runtime":
+            new_rt_events_df = Timeline.add_rt_setup_and_teardown_events(
+                _range_df,
+                ts[spans["start_pos"].to_numpy()],
+                ts[spans["end_pos"].to_numpy()],
+            )
 
-    def construct_event_to_grp_dict(self) -> Dict[str, str]:
-        """ """
-        # event_to_grp = self.timeline_df.set_index("name").to_dict()["group"]
-
-        event_to_grp = {}
-        for key in self.grp_df_dict:
-            if key in self.grp_df_dict:
-                _df = self.grp_df_dict[key]
-                event_to_grp = {
-                    **_df.set_index("name").to_dict()["group"],
-                    **event_to_grp,
-                }
+            # Order the events by span, where the setup and teardown events follow the events of their span.
+            _range_df = pd.concat(
+                [_range_df.assign(_order=0), new_rt_events_df], ignore_index=True, sort=False
+            )
+            _range_df = (
+                _range_df.sort_values(by=["span", "_order"], kind="stable")
+                .drop(columns=["span", "_order"])
+                .reset_index(drop=True)
+            )
 
-        event_to_subgrp = {}
-        for grp in self.sub_grp_df_dict:
-            _df = self.sub_grp_df_dict[grp]
-            if not _df.empty:
+            sub_group_df_dict[grp] = Timeline.compact_columns(_range_df)
 
-                event_to_subgrp = {
-                    **_df.set_index("name").to_dict()["group"],
-                    **event_to_subgrp,
-                }
+        return sub_group_df_dict
 
-                event_to_grp = {**event_to_grp, **event_to_subgrp}
+    def construct_dmv_df(self) -> pd.DataFrame:
+        """
+        Construct the dataframe of the events that carry data movement args
+        (i.e., bytes or memory bandwidth), with their timestamps, group and direction.
+        """
+        df = self.args_df.loc[
+            self.args_df["bytes"].notna() | self.args_df["mem_bandwidth"].notna()
+        ]
+        idx = df.index.to_numpy()
 
-        return event_to_grp
+        start = self.timeline_df["ts"].to_numpy()[idx] / self.ts_scale
+        dur = np.zeros(idx.shape[0])
+        if "dur" in self.timeline_df.columns:
+            dur = self.timeline_df["dur"].to_numpy()[idx] / self.ts_scale
 
-    def construct_event_duration_dict(self, include_sub_groups=False) -> Dict[str, str]:
-        all_events = list(self.event_to_grp.keys())
-        event_types = list(self.grp_df_dict.keys())
-        durations = {event: 0 for event in all_events}
+        names = self.timeline_df["name"].iloc[idx].reset_index(drop=True)
+        direction = names.str.extract(f"({'|'.join(DMV_DIRECTIONS)})", expand=False)
 
-        # Collect event durations from the group events.
-        for _type in event_types:
-            if _type in self.grp_df_dict:
-                _df = self.grp_df_dict[_type]
-                agg = group_by_and_apply_sum(_df, "dur")
-                durations = combine_dicts_and_sum_values(durations, agg["dur"])
+        return pd.DataFrame(
+            {
+                "start": start,
+                "end": start + dur,
+                "group": self.timeline_df["group"].iloc[idx].array,
+                "direction": direction.to_numpy(),
+                "bytes": df["bytes"].to_numpy(),
+                "bandwidth": df["mem_bandwidth"].to_numpy(),
+            },
+            index=df.index,
+        )
 
-        # Collect event durations from the sub-group events.
-        if include_sub_groups:
-            for grp in self.sub_grp_df_dict:
-                _df = self.sub_grp_df_dict[grp]
-                if not _df.empty:
-                    agg = group_by_and_apply_sum(_df, "dur")
-                    durations = combine_dicts_and_sum_values(durations, agg["dur"])
+    @staticmethod
+    def dmv_stats(df: pd.DataFrame) -> Dict:
+        """
+        Sums the bytes moved per direction and summarizes the memory bandwidth (in GB/s) of the events in `df` (see construct_dmv_df).
 
-        return durations
+        NOTE: The mean of the per-event bandwidths weighs a short memcpy like a
+        long one; hence, the byte-weighted mean (i.e., the total bytes over the
+        total duration of the memcpys) is reported as well.
+        """
+        ret = {
+            f"total_bytes_{direction}": int(df.loc[df["direction"] == direction, "bytes"].sum())
+            for direction in DMV_DIRECTIONS
+        }
+        bandwidth = df["bandwidth"].dropna()
+        ret["avg_mem_bandwidth"] = float(bandwidth.mean()) if len(bandwidth) > 0 else 0
+        ret["min_mem_bandwidth"] = float(bandwidth.min()) if len(bandwidth) > 0 else 0
+        ret["max_mem_bandwidth"] = float(bandwidth.max()) if len(bandwidth) > 0 else 0
+
+        # The timestamps are in microseconds, i.e., bytes/us = 1e-3 GB/s.
+        moved = df.loc[df["bytes"].notna() & (df["end"] > df["start"])]
+        duration = float((moved["end"] - moved["start"]).sum())
+        ret["weighted_mem_bandwidth"] = float(moved["bytes"].sum()) / duration / 1e3 if duration > 0 else 0
+        return ret
 
     ################### Supporting functions ###################
     @staticmethod
-    def match_event_group_and_type(event, rules):
-        """
-        Utility function to match the events to correspoinding group and vis_type based on the rules object.
+    def match_start_and_end_events(
+        df: pd.DataFrame, column: str = "ph", partition_keys: List[str] = ["pid", "tid"]
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        group = None
-        type = None
-
-        if event["ph"] in ["B", "E"]:
-            type = "range"
-        elif event["ph"] == "i":
-            type = "point"
-        elif event["ph"] == "X":
-            type = "x-range"
-        else:
-            LOGGER.debug(f"Unsupported event type: {event['ph']}")
-            return {"group": group, "type": type}
+        Match the begin and end events from the dataframe.
 
-        regex_to_group = {}
-        for [grp, rule] in rules.items():
-            for reg in rule["regex"]:
-                regex_to_group[reg] = grp
+        The events are partitioned by `partition_keys` (i.e., pid and tid) and, within a partition, a
+        begin event at nesting depth `d` is paired with the next end event
+        that closes depth `d`.
 
-        for [regex, grp] in regex_to_group.items():
-            if re.search(regex, event["name"]):
-                group = grp
-                LOGGER.debug(f"Match found: {regex}: {grp}")
-                break
+        NOTE: An end event whose name differs from the innermost open begin
+        event (or that has no open begin event) is skipped, and the begin event
+        stays open. The partitions with such (malformed) end events are paired
+        with a stack instead, since a skipped end event shifts the depths of
+        the events after it.
 
-        assert group, f"No matching group identified for {event}."
+        :returns: positions (in df) of the begin events and their corresponding end events, ordered by the end events.
+        """
+        is_begin = (df[column] == "B").to_numpy()
+        is_end = (df[column] == "E").to_numpy()
 
-        # If an override is specified in the rules.
-        if "event_type" in rules[group]:
-            type = rules[group]["event_type"]
+        keys = [key for key in partition_keys if key in df.columns]
+        if len(keys) > 0:
+            partitions = df.groupby(keys, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+        else:
+            partitions = np.zeros(df.shape[0], dtype=np.int64)
+
+        # Keep only the begin and end events, in their order of appearance within each partition.
+        position = np.flatnonzero(is_begin | is_end)
+        position = position[np.argsort(partitions[position], kind="stable")]
+        partition = partitions[position]
+        step = np.where(is_begin[position], 1, -1)
+
+        # Nesting depth after each event (per partition); a begin event and its
+        # end event share the same level.
+        depth = np.cumsum(step)
+        first = np.r_[True, partition[1:] != partition[:-1]]
+        offset = np.maximum.accumulate(np.where(first, np.arange(len(step)), 0))
+        depth = depth - (depth - step)[offset]
+        level = np.where(step == 1, depth, depth + 1)
+
+        # Within a (partition, level), the events alternate between begin and end.
+        order = np.lexsort((np.arange(len(step)), level, partition))
+        position, partition, level = position[order], partition[order], level[order]
+        is_pair = (
+            is_begin[position[:-1]]
+            & is_end[position[1:]]
+            & (partition[:-1] == partition[1:])
+            & (level[:-1] == level[1:])
+        )
+        begin = position[:-1][is_pair]
+        end = position[1:][is_pair]
+
+        # NOTE: The names are compared by their categorical codes, when available.
+        names = df["name"]
+        names = names.cat.codes.to_numpy() if isinstance(names.dtype, pd.CategoricalDtype) else names.to_numpy()
+        is_match = names[begin] == names[end]
+        begin, end = begin[is_match], end[is_match]
+
+        # Every end event of a well-formed partition is paired.
+        unpaired = np.setdiff1d(np.flatnonzero(is_end), end)
+        if len(unpaired) > 0:
+            malformed = np.unique(partitions[unpaired])
+            is_kept = ~np.isin(partitions[end], malformed)
+            begin, end = [begin[is_kept]], [end[is_kept]]
+            skipped = 0
+            for _partition in malformed:
+                _begin, _end, _skipped = Timeline._match_with_a_stack(
+                    names, is_begin, is_end, np.flatnonzero(partitions == _partition)
+                )
+                begin.append(_begin)
+                end.append(_end)
+                skipped += _skipped
+            begin, end = np.concatenate(begin), np.concatenate(end)
+            LOGGER.warning(f"Skipped {skipped} end events that do not close the innermost open begin event.")
 
-        return group, type
+        order = np.argsort(end, kind="stable")
+        return begin[order], end[order]
 
     @staticmethod
-    def match_start_and_end_events(df) -> List:
+    def _match_with_a_stack(
+        names: np.ndarray, is_begin: np.ndarray, is_end: np.ndarray, positions: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
         """
-        Match the begin and end events from the dataframe.
-        """
-        ret = []
-        stack = []
-        for idx, [id, row] in enumerate(df.iterrows()):
-            if row["ph"] == "B":
-                stack.append((idx, row))
-            elif row["ph"] == "E" and row["name"] == stack[-1][1]["name"]:
-                begin = stack.pop()
-                ret.append((row["name"], [begin[0], idx]))
+        Match the begin and end events at `positions` (i.e., of a partition) with a stack (see match_start_and_end_events).
 
-        return ret
+        :returns: positions of the begin events, of their corresponding end events, and the number of skipped end events.
+        """
+        begin, end, stack = [], [], []
+        skipped = 0
+        for pos in positions:
+            if is_begin[pos]:
+                stack.append(pos)
+            elif is_end[pos]:
+                if len(stack) > 0 and names[stack[-1]] == names[pos]:
+                    begin.append(stack.pop())
+                    end.append(pos)
+                else:
+                    skipped += 1
+        return np.array(begin, dtype=np.int64), np.array(end, dtype=np.int64), skipped
 
     @staticmethod
     def add_rt_setup_and_teardown_events(
-        rt_df, rt_start_time, rt_end_time
+        rt_df: pd.DataFrame, rt_start_times: np.ndarray, rt_end_times: np.ndarray
     ) -> pd.DataFrame:
         """
-        Adds runtime setup and teardown events to the runtime dataframe.
-        """
-        pid = rt_df["pid"].unique().tolist()[0]
-        tid = rt_df["tid"].unique().tolist()[0]
-        rt_id = rt_df["rt_id"].unique().tolist()[0]
-        className = rt_df["className"].unique().tolist()[0]
-        group = rt_df["group"].unique().tolist()[0]
-
-        rt_setup_dict = {
-            "className": className,
-            "content": "RT_SETUP",
-            "dur": rt_df["start"].min() - rt_start_time,
-            "end": rt_df["start"].min(),
-            "rt_id": rt_id,
-            "group": group,
-            "name": "RT_SETUP",
-            "pid": pid,
-            "start": rt_start_time,
-            "tid": tid,
-        }
+        Constructs the runtime setup and teardown events of every span in the runtime dataframe
+        (i.e., from the start of a span to its first event, and from its last event to its end).
 
-        rt_teardown_dict = {
-            "className": className,
-            "content": "RT_TEARDOWN",
-            "dur": rt_end_time - rt_df["end"].max(),
-            "end": rt_end_time,
-            "rt_id": rt_id,
-            "group": group,
-            "name": "RT_TEARDOWN",
-            "pid": pid,
-            "start": rt_df["end"].max(),
-            "tid": tid,
-        }
+        :params: rt_df: Runtime events, where the "span" column points to their span.
+        :params: rt_start_times, rt_end_times: Start and end timestamps of the spans.
+        :returns: The setup and teardown events, with their "span" and "_order" (1 for setup and 2 for teardown).
+        """
+        spans = rt_df.groupby("span", sort=True, observed=True).agg(
+            className=("className", "first"),
+            rt_id=("rt_id", "first"),
+            group=("group", "first"),
+            pid=("pid", "first"),
+            tid=("tid", "first"),
+            first_start=("start", "min"),
+            last_end=("end", "max"),
+        )
+        span = spans.index.to_numpy()
+        rt_start_time = rt_start_times[span]
+        rt_end_time = rt_end_times[span]
+
+        rt_setup_df = pd.DataFrame(
+            {
+                "className": spans["className"].to_numpy(),
+                "content": "RT_SETUP",
+                "dur": spans["first_start"].to_numpy() - rt_start_time,
+                "end": spans["first_start"].to_numpy(),
+                "rt_id": spans["rt_id"].to_numpy(),
+                "group": spans["group"].to_numpy(),
+                "name": "RT_SETUP",
+                "pid": spans["pid"].to_numpy(),
+                "start": rt_start_time,
+                "tid": spans["tid"].to_numpy(),
+                "span": span,
+                "_order": 1,
+            }
+        )
+
+        rt_teardown_df = pd.DataFrame(
+            {
+                "className": spans["className"].to_numpy(),
+                "content": "RT_TEARDOWN",
+                "dur": rt_end_time - spans["last_end"].to_numpy(),
+                "end": rt_end_time,
+                "rt_id": spans["rt_id"].to_numpy(),
+                "group": spans["group"].to_numpy(),
+                "name": "RT_TEARDOWN",
+                "pid": spans["pid"].to_numpy(),
+                "start": spans["last_end"].to_numpy(),
+                "tid": spans["tid"].to_numpy(),
+                "span": span,
+                "_order": 2,
+            }
+        )
 
-        rt_setup_df = pd.DataFrame(data=rt_setup_dict, index=[rt_df.shape[0] + 1])
-        rt_teardown_df = pd.DataFrame(data=rt_teardown_dict, index=[rt_df.shape[0] + 1])
-        return pd.concat([rt_setup_df, rt_teardown_df])
+        return pd.concat([rt_setup_df, rt_teardown_df], ignore_index=True)
+
+    @staticmethod
+    def scan(trace_file_path: str, format: str) -> Dict:
+        """
+        Streams the trace to collect the scalars returned by `get_scalars`
+        without constructing the Timeline.
+
+        :params: trace_file_path : Path of the Chrome trace JSON.
+        :params: format : profile format.
+        :returns: Dict with the event_count, start_ts and end_ts.
+        """
+        event_count, start_ts, end_ts = 0, None, None
+        for event in TraceReader(trace_file_path, EVENTS_PATH[format]):
+            if event["ph"] in ALLOWED_EVENT_PH:
+                if event_count == 0:
+                    start_ts = event["ts"]
+                end_ts = event["ts"]
+                event_count += 1
+
+        return {"event_count": event_count, "start_ts": start_ts, "end_ts": end_ts}
 
     @staticmethod
     def jit_metadata(profile: json) -> List[Dict]:
@@ -560,27 +845,79 @@ class Timeline:
 
         return list(itertools.chain.from_iterable(combined_events_list))
 
-    @staticmethod
-    def slice_and_combine_events(
-        grp_df_dict: Dict[str, pd.DataFrame],
+    def slice_events(
+        self,
         window_start: float,
         window_end: float,
         exclude_background: bool = False,
-    ): 
-        types = list(grp_df_dict.keys())
+        include_sub_groups: bool = True,
+    ) -> List[pd.DataFrame]:
+        """
+        Returns the events (per event type and sub-group dataframe) that overlap the window.
+        NOTE: The window and the timestamps of the returned events are in the trace units (see self.ts_scale).
+        """
+        window_start, window_end = self.to_ticks(window_start), self.to_ticks(window_end)
 
-        if "background" in grp_df_dict and exclude_background:
-            types.remove("background")
+        ret = []
+        for type, positions in self.grp_window_index.query(window_start, window_end).items():
+            if type == "background" and exclude_background:
+                continue
+            ret.append(self.frame_from_ticks(self.grp_df_dict[type].iloc[positions]))
 
-        combined_events_list = []
-        for type in types:
-            _df = grp_df_dict[type]
-            _fdf = _df.loc[(_df['start'] <= window_end) & (_df["start"] >= window_start)]
-            combined_events_list.append(_fdf.to_dict("records"))
+        if include_sub_groups:
+            for grp, positions in self.sub_grp_window_index.query(window_start, window_end).items():
+                ret.append(self.frame_from_ticks(self.sub_grp_df_dict[grp].iloc[positions]))
 
-        return list(itertools.chain.from_iterable(combined_events_list))
+        return ret
+
+    @staticmethod
+    def merge_events(df: pd.DataFrame, origin: float, resolution: float) -> List[pd.DataFrame]:
+        """
+        Merges the events shorter than `resolution` that fall in the same
+        group and bucket (i.e., [origin + k * resolution, origin + (k + 1) * resolution))
+        into an aggregate block, spanning from the first start to the last end
+        of the merged events.
 
-    def groups_for_vis_timeline(self) -> Dict:
+        :returns: [events that are kept as-is, aggregate blocks]
+        """
+        if df.empty or resolution <= 0:
+            return [df]
+
+        start = df["start"].to_numpy(dtype=np.float64)
+        end = df["end"].to_numpy(dtype=np.float64) if "end" in df.columns else start
+        end = np.where(np.isnan(end), start, end)
+
+        bucket = np.floor((start - origin) / resolution).astype(np.int64)
+        is_small = end - start < resolution
+        # NOTE: Only the small events of a (group, bucket) are merged, so only those are counted.
+        keys = pd.DataFrame({"group": df["group"].to_numpy(), "bucket": bucket, "is_small": is_small})
+        count = keys.groupby(["group", "bucket"], sort=False)["is_small"].transform("sum").to_numpy()
+        is_merged = is_small & (count > 1)
+        if not is_merged.any():
+            return [df]
+
+        small = df.loc[is_merged, ["group", "className"]].assign(
+            bucket=bucket[is_merged], start=start[is_merged], end=end[is_merged]
+        )
+        blocks = (
+            small.groupby(["group", "bucket"], sort=False)
+            .agg(
+                className=("className", "first"),
+                start=("start", "min"),
+                end=("end", "max"),
+                count=("start", "size"),
+            )
+            .reset_index()
+            .drop(columns=["bucket"])
+        )
+        blocks["dur"] = blocks["end"] - blocks["start"]
+        blocks["name"] = blocks["count"].astype(str) + " events"
+        blocks["content"] = blocks["name"]
+        blocks["type"] = "range"
+
+        return [df.loc[~is_merged], blocks]
+
+    def construct_vis_groups(self) -> List[Dict]:
         """
         Constructs the groups for the vis-timeline interface.
         Groups to vis-timeline format (For further information, refer https://github.com/visjs/vis-timeline).
@@ -588,8 +925,10 @@ class Timeline:
         """
         ret = []
 
-        all_groups = self.get_uniques_from_timeline(
-            ["point", "range", "background", "x-range"], column="group"
+        all_groups = sorted(
+            self.event_index.groups(
+                ["point", "range", "background", "x-range"], include_sub_groups=True
+            )
         )
         ordering_rules = self.rules["ordering"]
 
@@ -622,38 +961,53 @@ class Timeline:
 
         return ret
 
+    def groups_for_vis_timeline(self) -> List[Dict]:
+        """
+        Returns the groups for the vis-timeline interface (see construct_vis_groups).
+        """
+        return [dict(grp) for grp in self.vis_groups]
+
     ################### Exposed APIs ###################
     def get_event_by_id(self, id: int):
-        return self.timeline[id]
+        event = self.timeline_df.iloc[id].to_dict()
+        for col in ["ts", "dur"]:
+            if col in event:
+                event[col] = self.from_ticks(event[col])
+        return {**event, "args": self.get_event_args(id)}
 
     def get_event_args(self, idx):
-        if "args" not in self.timeline[idx]:
-            return json({})
+        args = self.event_args[idx]
+        if args is None:
+            return {}
+
+        return args
 
-        return self.timeline[idx]["args"]
+    def get_event_count(self) -> int:
+        return self.timeline_df.shape[0]
 
-    def get_uniques_from_timeline(
-        self, event_types: List, column: str, exclude_sub_grps: bool = False
-    ) -> List:
+    def get_scalars(self) -> Dict:
         """
-        Get all unique values from all rows (i.e., both timeline_df and sub_grp_df_dicts) based on a column.
+        Returns the cheap per-timeline scalars used to sort and summarize an ensemble.
         """
-        ret = []
-        for type in event_types:
-            if type in self.grp_df_dict:
-                _df = self.grp_df_dict[type]
-                ret += self.grp_df_dict[type][column].unique().tolist()
-
-        if not exclude_sub_grps:
-            for grp in self.sub_grp_df_dict:
-                _df = self.sub_grp_df_dict[grp]
-                if not _df.empty:
-                    ret += self.sub_grp_df_dict[grp][column].unique().tolist()
-
-        return list(set(ret))
+        return {
+            "event_count": self.get_event_count(),
+            "start_ts": self.start_ts,
+            "end_ts": self.end_ts,
+        }
 
-    def get_event_count(self) -> int:
-        return len(self.timeline)
+    def get_memory_usage(self) -> int:
+        """
+        Returns an estimate of the memory (in bytes) held by the Timeline.
+        """
+        dfs = [
+            self.timeline_df,
+            self.args_df,
+            self.dmv_df,
+            *self.grp_df_dict.values(),
+            *self.sub_grp_df_dict.values(),
+        ]
+        df_bytes = sum(df.memory_usage(index=True, deep=True).sum() for df in dfs)
+        return int(df_bytes + self.event_args.nbytes)
 
     def get_start_timestamp(self) -> float:
         return self.start_ts
@@ -664,33 +1018,30 @@ class Timeline:
     def get_metrics(self):
         return self.metrics
 
+    def get_kernel_args(self) -> pd.DataFrame:
+        """
+        Returns the extracted args (see ARGS_COLUMNS) of the kernel events.
+        """
+        df = self.grp_df_dict.get("x-range")
+        if df is None or "cat" not in df.columns:
+            return self.args_df.iloc[:0]
+
+        kernel_idx = df.loc[df["cat"] == "kernel", "idx"].to_numpy()
+        return self.args_df.reindex(kernel_idx)
+
     def get_occupancy(self) -> float:
-        df = self.grp_df_dict["x-range"]
-        kernel_df = df.loc[df['cat'] == 'kernel']
-        indexes = kernel_df['idx'].tolist()
-        occupancy = 0
-        for index in indexes:
-            occupancy += float(self.get_event_args(index)["est. achieved occupancy %"])
-        return occupancy /len(indexes)
+        occupancy = self.get_kernel_args()["occupancy"]
+        if len(occupancy) == 0:
+            return 0
+        return float(occupancy.sum()) / len(occupancy)
 
     def get_cpu_utilization(self) -> float:
-        df = self.grp_df_dict["x-range"]
-        kernel_df = df.loc[df['cat'] == 'kernel']
-        indexes = kernel_df['idx'].tolist()
-        mem = 0
-        for index in indexes:
-            mem += float(self.get_event_args(index)["blocks per SM"])
-
-        return round((mem / 49152) * 100, 2)
+        mem = float(self.get_kernel_args()["blocks_per_sm"].sum())
+        return round((mem / SHARED_MEM_PER_BLOCK) * 100, 2)
 
     def get_shared_mem_utilization(self) -> float:
-        df = self.grp_df_dict["x-range"]
-        kernel_df = df.loc[df['cat'] == 'kernel']
-        indexes = kernel_df['idx'].tolist()
-        mem = 0
-        for index in indexes:
-            mem += float(self.get_event_args(index)["shared memory"])
-        return round((mem / 49152) * 100, 2)
+        mem = float(self.get_kernel_args()["shared_memory"].sum())
+        return round((mem / SHARED_MEM_PER_BLOCK) * 100, 2)
 
 
     def get_metadata(self, exp) -> Tuple[Dict, Dict]:
@@ -713,44 +1064,25 @@ class Timeline:
         """
         Returns the summary timeline based on uniform-sampling.
         """
-        events = Timeline.combine_events(
-            self.grp_df_dict, grp_to_idx=self.grp_to_idx, exclude_background=True
-        )
-
         ts_width = math.ceil((self.end_ts - self.start_ts) / sample_count)
         ts_samples = [
             math.ceil(sample)
             for sample in np.arange(self.start_ts, self.end_ts, ts_width)
         ]
-        events_in_sample = {
-            _s: {grp: 0 for grp in self.rules["grouping"]} for _s in ts_samples
-        }
-
-        for event in events:
-            group = self.idx_to_grp[event["group"]]
-
-            ts = np.array([event["start"], event["end"]])
-            dig = np.digitize(ts, ts_samples)
 
-            if dig[0] == dig[1]:
-                events_in_sample[ts_samples[dig[0] - 1]][group] += (
-                    event["end"] - event["start"]
-                )
-            else:
-                _l = event["start"]
-                _h = event["end"]
-                for i in range(dig[0], dig[1]):
-                    events_in_sample[ts_samples[i - 1]][group] += ts_samples[i] - _l
-                    _l = ts_samples[i]
-
-                if i <= len(ts_samples) - 1:
-                    events_in_sample[ts_samples[i]][group] += _h - ts_samples[i]
-
-        max_ts = 0
-
-        for [sample, val] in events_in_sample.items():
-            max_ts = max(sum(val.values()), max_ts)
-            val["ts"] = sample
+        # Busy time of each group in every sample (i.e., bin).
+        histogram = self.coverage_index.histogram(ts_samples)
+        y_data = {
+            grp: histogram[self.grp_to_idx[grp]].tolist()
+            if self.grp_to_idx[grp] in histogram
+            else [0] * len(ts_samples)
+            for grp in self.rules["grouping"]
+        }
+        events_in_sample = [
+            {**{grp: y_data[grp][idx] for grp in y_data}, "ts": sample}
+            for idx, sample in enumerate(ts_samples)
+        ]
+        max_ts = max((sum(vals) for vals in zip(*y_data.values())), default=0)
 
         return {
             "classNames": self.grp_to_cls,
@@ -761,142 +1093,202 @@ class Timeline:
             "startTs": self.start_ts,
             "ts_width": ts_width,
             "xData": list(ts_samples),
-            "yData": list(events_in_sample.values()),
+            "yData": events_in_sample,
             "zData": list(self.rules["grouping"].keys()),
             "gpuUtilization": self.metadata[-2]["key"],
             "memUtilization": self.metadata[-1]["key"]
         }
 
-    def get_dmv(self):
-        ret = {
-            "total_bytes_DtoH": 0,
-            "total_bytes_HtoD": 0,
-            "avg_mem_bandwidth": 0,
-        }
-        
-        mem_bandwidth = 0
-        mem_count = 0;
-        for event in self.timeline:
-        
-            if 'args' in event.keys() and 'bytes' in event['args'].keys():
-                if (re.search("HtoD", event['name']) != None): 
-                    ret["total_bytes_HtoD"] += event["args"]["bytes"]
-                elif (re.search('DtoH', event['name'])):
-                    ret["total_bytes_DtoH"] += event["args"]["bytes"]
-
-            if 'args' in event.keys() and 'memory bandwidth (GB/s)' in event['args'].keys():
-                mem_bandwidth += event["args"]["memory bandwidth (GB/s)"]
-                mem_count += 1
-        
-        if mem_count != 0:
-            ret["avg_mem_bandwidth"] = mem_bandwidth / mem_count;
-
-        LOGGER.info(f"Total bytes moved (in bytes): {ret['total_bytes_DtoH'] + ret['total_bytes_HtoD']}")
-        return ret
+    def get_dmv(self) -> Dict:
+        """
+        Returns the data movement (i.e., bytes moved per direction and the average memory bandwidth) of the profile.
+        """
+        return dict(self.dmv)
 
-    def get_timeline(self, window_start=None, window_end=None) -> Dict:
+    def get_dmv_by_group(self, window_start=None, window_end=None) -> Dict:
         """
-        Returns the events in a given window. If a window is not provided, it will default to the start and end timestamp of the profile.
+        Returns the data movement per group, of the events that overlap a given window (if provided).
         """
-        if not window_start:
-            window_start = self.start_ts
+        df = self.dmv_df
+        if window_start is not None and window_end is not None:
+            df = df.loc[(df["start"] <= window_end) & (df["end"] >= window_start)]
 
-        if not window_end:
-            window_end = self.end_ts
+        return {
+            "total": Timeline.dmv_stats(df),
+            "groups": {grp: Timeline.dmv_stats(_df) for grp, _df in df.groupby("group", sort=True, observed=True)},
+        }
 
-        # TODO: (surajk) Index the dataframe based on timestamp and allow selection based on window_start, and window_end.
-        # For this task, we will have to construct a `df_dict`, where each entry comprises of events in the window.
-        events = Timeline.combine_events(
-            self.grp_df_dict,
-            sub_grp_df_dict=self.sub_grp_df_dict,
-            grp_to_idx=self.grp_to_idx,
-            exclude_background=True
+    def get_timeline(self, window_start=None, window_end=None, width=None) -> Dict:
+        """
+        Returns the events that overlap a given window. If a window is not provided (or is empty), it will default to the start and end timestamp of the profile.
+        If `width` (i.e., the number of pixels available to render the window) is provided, the events shorter than a pixel are merged into aggregate blocks per group.
+        """
+        timeline = self.get_timeline_frames(window_start, window_end, width)
+        timeline["events"] = list(
+            itertools.chain.from_iterable(df.to_dict("records") for df in timeline["events"])
         )
+        return timeline
+
+    def get_timeline_frames(self, window_start=None, window_end=None, width=None) -> Dict:
+        """
+        Same as `get_timeline`, but the events are left as a list of DataFrames (e.g., to be encoded chunk by chunk).
+        """
+        is_windowed = (
+            window_start is not None
+            and window_end is not None
+            and window_end > window_start
+        )
+
+        if is_windowed:
+            dfs = self.slice_events(window_start, window_end, exclude_background=True)
+        else:
+            window_start, window_end = self.start_ts, self.end_ts
+            dfs = [
+                self.frame_from_ticks(df)
+                for df in [
+                    df for type, df in self.grp_df_dict.items() if type != "background"
+                ] + list(self.sub_grp_df_dict.values())
+            ]
+
+        if width:
+            resolution = (window_end - window_start) / width
+            dfs = list(
+                itertools.chain.from_iterable(
+                    Timeline.merge_events(df, window_start, resolution) for df in dfs
+                )
+            )
+
         groups = self.groups_for_vis_timeline()
 
         return {
             "end_ts": window_end,
-            "events": events,
+            "events": dfs,
             "groups": groups,
             "start_ts": window_start,
             "class_names": self.grp_to_cls,
             "grouping": list(self.rules["grouping"].keys())
         }
 
-    def get_window(self, window_start, window_end) -> Dict:
+    def get_window(self, window_start, window_end) -> List[Dict]:
         """
-        Returns the events in a given windoow.
+        Returns the events (including the sub-group events) that overlap a given window.
         """
-        events = Timeline.slice_and_combine_events(
-            self.grp_df_dict, window_start=window_start, window_end=window_end
-        )
-        return events
+        dfs = self.slice_events(window_start, window_end)
+        return list(itertools.chain.from_iterable(df.to_dict("records") for df in dfs))
 
     def get_timeline_summary(
         self,
         event_types=["point", "range", "x-range"],
         include_sub_groups=False,
+        offset=0,
+        limit=None,
+        top_k=None,
     ):
         """
-        Returns the event-duration summary.
+        Returns the event-duration summary (i.e., the total duration and count of the events per group).
         TODO: Major clean up needed here. Clarify what is a group_idx and group.
         Also make sure the logic is simplified to only show the events that are toggled on in the timeline view.
+
+        :params: offset, limit: Page of the groups (ordered by duration).
+        :params: top_k: Returns the top_k groups, followed by an "other" bucket for the rest (overrides offset and limit).
         """
-        all_groups_idx = self.get_uniques_from_timeline(
-            event_types, column="group", exclude_sub_grps=(not include_sub_groups)
-        )
-        # Sum all the durations within each group.
-        grp_durations = {grp: 0 for grp in all_groups_idx}
-        for grp_idx in all_groups_idx:
-            for event in self.grp_to_events[grp_idx]:
-                if event in self.event_durations:
-                    grp_durations[grp_idx] += self.event_durations[event]
+        all_groups_idx = self.event_index.groups(event_types, include_sub_groups)
+        groups_idx = [
+            grp_idx for grp_idx in self.event_index.groups_by_duration if grp_idx in all_groups_idx
+        ]
+
+        if top_k is not None:
+            offset, limit = 0, top_k
+        end = len(groups_idx) if limit is None else offset + limit
 
         result = []
-        for grp_idx in all_groups_idx:
+        for grp_idx in groups_idx[offset:end]:
             group = self.idx_to_grp[grp_idx]
             result.append(
                 {
                     "event": group.lower(),
-                    "dur": grp_durations[grp_idx],
+                    "dur": self.from_ticks(self.event_index.grp_durations.get(grp_idx, 0)),
+                    "count": self.event_index.grp_counts.get(grp_idx, 0),
                     "group": group,
                     "class_name": self.grp_to_cls[group],
                 }
             )
 
-        return sorted(result, key=lambda x: x["dur"], reverse=True)
+        rest = groups_idx[end:]
+        if top_k is not None and len(rest) > 0:
+            result.append(
+                self.other_summary(
+                    sum(self.event_index.grp_durations.get(grp_idx, 0) for grp_idx in rest),
+                    sum(self.event_index.grp_counts.get(grp_idx, 0) for grp_idx in rest),
+                    len(rest),
+                )
+            )
+
+        return result
 
     def get_event_summary(
         self,
         groups=[],
         event_types=["point", "range", "x-range"],
         include_sub_groups=False,
+        offset=0,
+        limit=None,
+        top_k=None,
     ):
-        """ """
+        """
+        Returns the total duration and count per event (i.e., event name) of the given groups, ordered by duration.
+
+        :params: offset, limit: Page of the events (ordered by duration).
+        :params: top_k: Returns the top_k events, followed by an "other" bucket for the rest (overrides offset and limit).
+        """
         # Determine the groups that should be visualized, if not provided, all
         # events are visualized.
         if len(groups) == 0:
-            all_groups_idx = self.get_uniques_from_timeline(
-                event_types, column="group", exclude_sub_grps=(not include_sub_groups)
-            )
-            all_groups = [self.idx_to_grp[grp_idx] for grp_idx in all_groups_idx]
-            groups = all_groups
+            groups_idx = self.event_index.groups(event_types, include_sub_groups)
+        else:
+            groups_idx = frozenset(self.grp_to_idx[group] for group in groups)
 
-        all_events = []
-        for group in groups:
-            group_idx = self.grp_to_idx[group]
-            all_events = all_events + self.grp_to_events[group_idx]
+        if top_k is not None:
+            offset, limit = 0, top_k
+        page, rest = self.event_index.select_events(groups_idx, offset, limit)
 
+        events = self.event_index.events_by_duration
         result = [
             {
-                "event": event,
-                "dur": self.event_durations[event],
-                "group": self.event_to_grp[event],
-                "class_name": self.grp_to_cls[
-                    self.idx_to_grp[self.event_to_grp[event]]
-                ],
+                "event": events[pos],
+                "dur": self.from_ticks(dur),
+                "count": count,
+                "group": group_idx,
+                "class_name": self.grp_to_cls[self.idx_to_grp[group_idx]],
             }
-            for event in all_events
+            for pos, group_idx, dur, count in zip(
+                page.tolist(),
+                self.event_index.event_groups[page].tolist(),
+                self.event_index.event_duration_array[page].tolist(),
+                self.event_index.event_count_array[page].tolist(),
+            )
         ]
 
-        return sorted(result, key=lambda x: x["dur"], reverse=True)
+        if top_k is not None and len(rest) > 0:
+            result.append(
+                self.other_summary(
+                    int(self.event_index.event_duration_array[rest].sum()),
+                    int(self.event_index.event_count_array[rest].sum()),
+                    len(rest),
+                )
+            )
+
+        return result
+
+    def other_summary(self, dur: int, count: int, entries: int) -> Dict:
+        """
+        Returns the "other" bucket of a top-k summary, aggregating the `entries` remaining rows.
+        """
+        return {
+            "event": OTHER_SUMMARY,
+            "dur": self.from_ticks(dur),
+            "count": count,
+            "entries": entries,
+            "group": None,
+            "class_name": OTHER_SUMMARY,
+        }
@@ -113,18 +113,6 @@ def format_timestamp(timestamp):
     return timestamp / 1000
 
 
-def group_by_and_apply_sum(df, col):
-    f = {col: "sum"}
-    return df.groupby("name").agg(f).to_dict()
-
-
-def combine_dicts_and_sum_values(dict_1, dict_2):
-    return {
-        key: dict_1.get(key, 0) + dict_2.get(key, 0)
-        for key in set(dict_1) | set(dict_2)
-    }
-
-
 def dict_to_list_of_vals(dict):
     ret = {}
     for k, v in dict.items():
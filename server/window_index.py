@@ -0,0 +1,135 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+class WindowIndex:
+    """
+    Index to query the events (of a dict of DataFrames) that overlap a window.
+
+    For each DataFrame, the events are sorted by their start timestamp along
+    with a running maximum of their end timestamps. A query for [start, end]
+    binary searches the last event starting before `end` and the first event
+    whose running maximum end reaches `start`; only the events in between are
+    checked, so a query costs O(log n + k) for well-behaved traces and
+    includes the long events that start before the window.
+
+    NOTE: The index only holds the positions of the events; the DataFrames are
+    owned by the caller and sliced using the returned positions. The timestamps
+    are int64 fixed-point ticks (see Timeline.ts_scale), so the query bounds must
+    be converted to ticks by the caller, rather than compared as float64.
+    """
+
+    def __init__(self, df_dict: Dict[str, pd.DataFrame]):
+        self.entries = {
+            key: WindowIndex._build(df) for key, df in df_dict.items() if not df.empty
+        }
+
+    @staticmethod
+    def _build(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        starts = df["start"].to_numpy(dtype=np.int64)
+        if "end" in df.columns:
+            is_point = df["end"].isna().to_numpy()  # Point events end where they start.
+            ends = np.where(is_point, starts, df["end"].fillna(0).to_numpy(dtype=np.int64))
+        else:
+            ends = starts
+
+        order = np.argsort(starts, kind="stable")
+        return {
+            "order": order,
+            "starts": starts[order],
+            "ends": ends[order],
+            "max_ends": np.maximum.accumulate(ends[order]),
+        }
+
+    def query(self, window_start: int, window_end: int) -> Dict[str, np.ndarray]:
+        """
+        Returns the positions (sorted by start) of the events that overlap [window_start, window_end] (in ticks) for every DataFrame.
+        """
+        ret = {}
+        for key, entry in self.entries.items():
+            hi = np.searchsorted(entry["starts"], window_end, side="right")
+            lo = np.searchsorted(entry["max_ends"], window_start, side="left")
+            if lo >= hi:
+                ret[key] = entry["order"][:0]
+                continue
+
+            overlaps = entry["ends"][lo:hi] >= window_start
+            ret[key] = entry["order"][lo:hi][overlaps]
+
+        return ret
+
+
+class CoverageIndex:
+    """
+    Index to compute the busy time of each group within a set of bins.
+
+    The busy time until `t` (i.e., the total overlap of the events with
+    (-inf, t]) is `sum(t - start for start <= t) - sum(t - end for end <= t)`,
+    which is evaluated with binary searches over the sorted starts and ends
+    and their prefix sums. Once the index is built, binning costs
+    O(bins * log n) per group.
+
+    NOTE: Timestamps are stored relative to `origin` to keep the prefix sums exact.
+    The events may hold fixed-point ticks (i.e., `scale` ticks per unit), while
+    the edges and the busy times of `histogram` are in units.
+    """
+
+    def __init__(self, dfs: List[pd.DataFrame], origin: float, scale: int = 1):
+        self.origin = origin if scale == 1 else round(origin * scale)
+        self.scale = scale
+        self.entries = {}
+
+        dfs = [df for df in dfs if not df.empty]
+        if len(dfs) == 0:
+            return
+
+        starts = np.concatenate([df["start"].to_numpy() for df in dfs])
+        ends = np.concatenate(
+            [
+                df["end"].fillna(df["start"]).to_numpy()
+                if "end" in df.columns
+                else df["start"].to_numpy()
+                for df in dfs
+            ]
+        )
+        groups = np.concatenate([df["group"].to_numpy() for df in dfs])
+
+        for grp in pd.unique(groups):
+            is_grp = groups == grp
+            _starts = np.sort(starts[is_grp] - self.origin)
+            _ends = np.sort(ends[is_grp] - self.origin)
+            self.entries[grp] = {
+                "starts": _starts,
+                "ends": _ends,
+                "cum_starts": np.r_[0, np.cumsum(_starts)],
+                "cum_ends": np.r_[0, np.cumsum(_ends)],
+            }
+
+    @staticmethod
+    def _busy_until(entry: Dict[str, np.ndarray], ts: np.ndarray) -> np.ndarray:
+        started = np.searchsorted(entry["starts"], ts, side="right")
+        ended = np.searchsorted(entry["ends"], ts, side="right")
+        return (started * ts - entry["cum_starts"][started]) - (
+            ended * ts - entry["cum_ends"][ended]
+        )
+
+    def histogram(self, edges: List[float]) -> Dict[int, np.ndarray]:
+        """
+        Returns the busy time of each group in the bins [edges[i], edges[i + 1]).
+        The first bin extends to -inf and the last bin extends to +inf.
+
+        :params: edges: Sorted timestamps of the bins.
+        """
+        edges = np.asarray(edges) * self.scale - self.origin
+
+        ret = {}
+        for grp, entry in self.entries.items():
+            total = entry["cum_ends"][-1] - entry["cum_starts"][-1]
+            busy = CoverageIndex._busy_until(entry, edges[1:])
+            ret[grp] = np.diff(np.r_[0, busy, total])
+            if self.scale != 1:
+                ret[grp] = ret[grp] / self.scale
+
+        return ret
@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+
+import pytest
+
+import server.datasets as datasets_module
+from server.datasets import Datasets
+
+DEVICE_PROPERTIES = [{"id": 0, "name": "NVIDIA TITAN RTX", "numSms": 72}]
+
+METRICS = "timestamp, utilization_gpu, utilization_memory\n1, 10, 20\n2, 30, 40\n"
+
+
+def write_experiment(data_dir, name, event_count, start_ts=1669272387721917):
+    """
+    Writes a DMV trace with `event_count` events (and its metric file) as the experiment `name`.
+    """
+    events = [
+        {
+            "ph": "X",
+            "cat": "cuda_runtime",
+            "name": "cudaMalloc" if i % 2 == 0 else "cudaMemcpy",
+            "pid": 1,
+            "tid": 1,
+            "ts": start_ts + 100 * i,
+            "dur": 10,
+        }
+        for i in range(event_count)
+    ]
+    # NOTE: The last event is a kernel, which the metadata (e.g., the achieved occupancy) is derived from.
+    events[-1].update(
+        cat="kernel",
+        name="sgemm_kernel",
+        args={"est. achieved occupancy %": 100, "blocks per SM": 3640.889, "shared memory": 0},
+    )
+    trace_file_path = data_dir / f"{name}.json"
+    trace_file_path.write_text(
+        json.dumps({"schemaVersion": 1, "deviceProperties": DEVICE_PROPERTIES, "traceEvents": events})
+    )
+    (data_dir / f"{name}.csv").write_text(METRICS)
+
+
+def test_load_profiles_in_a_process_pool(tmp_path):
+    write_experiment(tmp_path, "run-a", 2)
+    write_experiment(tmp_path, "run-b", 4, start_ts=1669272387731917)
+    write_experiment(tmp_path, "run-c", 6)
+
+    serial = Datasets(str(tmp_path), "DMV")
+    parallel = Datasets(str(tmp_path), "DMV", workers=2)
+
+    assert parallel.ensemble == serial.ensemble == {"run-a", "run-b", "run-c"}
+    for exp in serial.ensemble:
+        profile = parallel.get_profile(exp)
+        assert profile.get_event_count() == serial.get_profile(exp).get_event_count()
+        assert profile.get_timeline() == serial.get_profile(exp).get_timeline()
+        # NOTE: The rules can not be pickled; they are re-derived in the parent process.
+        assert profile.rules.keys() == serial.get_profile(exp).rules.keys()
+    assert parallel.sort_by_event_count() == ["run-c", "run-b", "run-a"]
+
+
+def test_lazy_profiles_are_constructed_on_demand_and_evicted(tmp_path):
+    write_experiment(tmp_path, "run-a", 2)
+    write_experiment(tmp_path, "run-b", 4, start_ts=1669272387731917)
+    write_experiment(tmp_path, "run-c", 6)
+
+    eager = Datasets(str(tmp_path), "DMV")
+    lazy = Datasets(str(tmp_path), "DMV", lazy=True, max_profiles=2)
+
+    # NOTE: The index is scanned from the traces without constructing any Timeline.
+    assert len(lazy.profiles) == 0
+    assert lazy.index == eager.index
+    assert lazy.sort_by_event_count() == eager.sort_by_event_count()
+    assert lazy.sort_by_date() == eager.sort_by_date()
+    assert lazy.max_min_runtime() == eager.max_min_runtime()
+
+    assert lazy.get_profile("run-a").get_event_count() == 2
+    lazy.get_profile("run-b")
+    lazy.get_profile("run-a")  # Most recently used.
+    lazy.get_profile("run-c")
+    assert list(lazy.profiles) == ["run-a", "run-c"]
+    assert lazy.get_profile("run-b").get_timeline() == eager.get_profile("run-b").get_timeline()
+    assert list(lazy.profiles) == ["run-c", "run-b"]
+
+
+def test_a_cold_load_does_not_block_the_other_experiments(tmp_path, monkeypatch):
+    write_experiment(tmp_path, "run-a", 2)
+    write_experiment(tmp_path, "run-b", 4)
+    datasets = Datasets(str(tmp_path), "DMV", lazy=True)
+    run_b = datasets.get_profile("run-b")
+
+    started, release = threading.Event(), threading.Event()
+    constructed = []
+    load_profile = Datasets._load_profile
+
+    def slow_load_profile(task):
+        constructed.append(task)
+        started.set()
+        release.wait(timeout=10)
+        return load_profile(task)
+
+    monkeypatch.setattr(Datasets, "_load_profile", staticmethod(slow_load_profile))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(datasets.get_profile("run-a"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(timeout=10)
+
+    # NOTE: The loaded experiments are served while run-a is being constructed.
+    served = []
+    reader = threading.Thread(target=lambda: served.append(datasets.get_profile("run-b")))
+    reader.start()
+    reader.join(timeout=2)
+    assert served == [run_b]
+    release.set()
+    reader.join()
+    for thread in threads:
+        thread.join()
+
+    assert len(constructed) == 1
+    assert len(results) == 3 and all(profile is results[0] for profile in results)
+    assert datasets.get_profile("run-a") is results[0]
+
+
+def test_ensemble_summary_bins_every_run_relative_to_its_start(tmp_path):
+    write_experiment(tmp_path, "run-a", 2)
+    write_experiment(tmp_path, "run-b", 10, start_ts=1669272387731917)
+    datasets = Datasets(str(tmp_path), "DMV")
+
+    summary = datasets.get_summary(sample_count=3)
+    # NOTE: The bins span the longest run (i.e., run-b lasts 900us).
+    assert summary["run-a"]["xData"] == summary["run-b"]["xData"] == [0, 300, 600]
+    assert summary["run-a"]["ts_width"] == 300
+    for exp, binning in summary.items():
+        profile = datasets.get_profile(exp)
+        busy = sum(sum(val for grp, val in sample.items() if grp != "ts") for sample in binning["yData"])
+        x_ranges = profile.grp_df_dict["x-range"]
+        assert busy == (x_ranges["end"] - x_ranges["start"]).sum()
+
+    # The binnings are computed once.
+    assert datasets.get_summary(sample_count=3)["run-a"] is summary["run-a"]
+    assert datasets.get_individual_summary(sample_count=3)["run-b"] == datasets.get_profile("run-b").get_summary(3)
+
+
+@pytest.fixture(params=[False, True], ids=["eager", "lazy"])
+def lazy(request):
+    return request.param
+
+
+def test_refresh_applies_added_modified_and_deleted_experiments(tmp_path, lazy):
+    write_experiment(tmp_path, "run-a", 2)
+    write_experiment(tmp_path, "run-b", 4, start_ts=1669272387731917)
+    datasets = Datasets(str(tmp_path), "DMV", lazy=lazy)
+
+    assert datasets.ensemble == {"run-a", "run-b"}
+    assert datasets.sort_by_event_count() == ["run-b", "run-a"]
+    assert not datasets.refresh()
+
+    # Added.
+    write_experiment(tmp_path, "run-c", 6)
+    version = datasets.version
+    assert datasets.refresh()
+    assert datasets.version > version
+    assert datasets.ensemble == {"run-a", "run-b", "run-c"}
+    assert datasets.index["run-c"]["event_count"] == 6
+    assert datasets.get_profile("run-c").get_event_count() == 6
+    assert datasets.sort_by_event_count() == ["run-c", "run-b", "run-a"]
+
+    # Modified.
+    write_experiment(tmp_path, "run-a", 8)
+    assert datasets.refresh()
+    assert datasets.index["run-a"]["event_count"] == 8
+    assert datasets.get_profile("run-a").get_event_count() == 8
+    assert datasets.sort_by_event_count() == ["run-a", "run-c", "run-b"]
+
+    # Deleted.
+    os.remove(tmp_path / "run-b.json")
+    assert datasets.refresh()
+    assert datasets.ensemble == {"run-a", "run-c"}
+    assert "run-b" not in datasets.index
+    assert datasets.sort_by_event_count() == ["run-a", "run-c"]
+    assert datasets.sort_by_date() == ["run-a", "run-c"]
+    assert set(datasets.get_summary()) == {"run-a", "run-c"}
+
+
+def test_refresh_to_an_empty_ensemble(tmp_path, lazy):
+    write_experiment(tmp_path, "run-a", 2)
+    datasets = Datasets(str(tmp_path), "DMV", lazy=lazy)
+    assert set(datasets.get_summary(sample_count=3)) == {"run-a"}
+
+    os.remove(tmp_path / "run-a.json")
+    assert datasets.refresh()
+    assert datasets.ensemble == set()
+    assert datasets.max_min_runtime() == [0, 0]
+    assert datasets.get_summary(sample_count=3) == {}
+    assert datasets.get_individual_summary(sample_count=3) == {}
+
+
+def test_refresh_retries_an_experiment_that_failed_to_ingest(tmp_path, lazy):
+    write_experiment(tmp_path, "run-a", 2)
+    datasets = Datasets(str(tmp_path), "DMV", lazy=lazy)
+
+    # NOTE: A trace still being written is not valid JSON yet.
+    (tmp_path / "run-b.json").write_text('{"schemaVersion": 1, "traceEvents": [')
+    (tmp_path / "run-b.csv").write_text(METRICS)
+    assert not datasets.refresh()
+    assert datasets.ensemble == {"run-a"}
+
+    write_experiment(tmp_path, "run-b", 4)
+    assert datasets.refresh()
+    assert datasets.ensemble == {"run-a", "run-b"}
+    assert datasets.index["run-b"]["event_count"] == 4
+
+
+def test_refresh_skips_files_being_written(tmp_path):
+    write_experiment(tmp_path, "run-a", 2)
+    datasets = Datasets(str(tmp_path), "DMV")
+
+    write_experiment(tmp_path, "run-b", 4)
+    assert not datasets.refresh(min_age=3600)
+    assert datasets.ensemble == {"run-a"}
+    assert datasets.refresh()
+    assert datasets.ensemble == {"run-a", "run-b"}
+
+
+def test_refresh_with_a_process_pool(tmp_path, monkeypatch):
+    write_experiment(tmp_path, "run-a", 2)
+    write_experiment(tmp_path, "run-b", 4)
+    datasets = Datasets(str(tmp_path), "DMV", workers=2)
+    assert datasets.sort_by_event_count() == ["run-b", "run-a"]
+
+    start_methods = []
+    executor = datasets_module.ProcessPoolExecutor
+
+    def process_pool(*args, **kwargs):
+        start_methods.append(kwargs["mp_context"].get_start_method())
+        return executor(*args, **kwargs)
+
+    monkeypatch.setattr(datasets_module, "ProcessPoolExecutor", process_pool)
+
+    # NOTE: The refresh runs on a (watcher) thread, while this thread holds a lock.
+    write_experiment(tmp_path, "run-c", 6)
+    (tmp_path / "run-d.json").write_text('{"schemaVersion": 1, "traceEvents": [')
+    refreshed = []
+    with threading.Lock():
+        watcher = threading.Thread(target=lambda: refreshed.append(datasets.refresh()))
+        watcher.start()
+        watcher.join(timeout=60)
+    assert refreshed == [True]
+    assert start_methods == [datasets_module.START_METHOD] and start_methods[0] != "fork"
+    assert datasets.ensemble == {"run-a", "run-b", "run-c"}
+    assert datasets.get_profile("run-c").get_event_count() == 6
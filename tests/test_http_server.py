@@ -0,0 +1,358 @@
+import gzip
+import http.client
+import json
+import threading
+import zlib
+
+import pytest
+from flask import Flask, request
+from werkzeug.serving import make_server
+
+import server.http_server as http_server
+from server.http_server import HTTPServer, app
+from server.production import KeepAliveRequestHandler
+from server.sessions import EXPERIMENT_HEADER, SESSION_HEADER, SessionStore
+from server.timeline import Timeline
+from test_datasets import write_experiment
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    # NOTE: The routes are registered on the (global) Flask app, so a single HTTPServer is shared by the module.
+    data_dir = tmp_path_factory.mktemp("data")
+    write_experiment(data_dir, "run-a", 2)
+    write_experiment(data_dir, "run-b", 4, start_ts=1669272387731917)
+
+    http_server.DEV_MODE = False
+    server = HTTPServer({"data_dir": str(data_dir), "no_cache": True})
+    server.load(str(data_dir))
+    return server
+
+
+@pytest.fixture
+def client(server):
+    # NOTE: Loading the loaded data_dir keeps the state of the other sessions, so it is reset here.
+    server.sessions.clear()
+    server.response_cache.clear()
+    server.load(server.data_dir)
+    return app.test_client()
+
+
+def test_cached_responses_carry_an_etag_and_answer_304(client, monkeypatch):
+    client.post("/set_experiment", json={"experiment": "run-a"})
+
+    calls = []
+    get_summary = Timeline.get_summary
+    monkeypatch.setattr(Timeline, "get_summary", lambda *args, **kwargs: calls.append(1) or get_summary(*args, **kwargs))
+
+    response = client.post("/fetch_summary", json={"sample_count": 5})
+    assert response.status_code == 200
+    etag = response.headers["ETag"].strip('"')
+
+    cached = client.post("/fetch_summary", json={"sample_count": 5})
+    assert cached.get_data() == response.get_data()
+    assert cached.headers["ETag"] == response.headers["ETag"]
+    assert len(calls) == 1
+
+    not_modified = client.post("/fetch_summary", json={"sample_count": 5}, headers={"If-None-Match": f'"{etag}"'})
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b""
+
+    # A different request body, or another experiment, is not served from the same entry.
+    other = client.post("/fetch_summary", json={"sample_count": 6}, headers={"If-None-Match": f'"{etag}"'})
+    assert other.status_code == 200
+    client.post("/set_experiment", json={"experiment": "run-b"})
+    other = client.post("/fetch_summary", json={"sample_count": 5}, headers={"If-None-Match": f'"{etag}"'})
+    assert other.status_code == 200
+    assert other.headers["ETag"] != response.headers["ETag"]
+    assert len(calls) == 3
+
+
+def test_cached_responses_do_not_touch_the_timeline(client, monkeypatch):
+    client.post("/set_experiment", json={"experiment": "run-a"})
+    summary = client.post("/fetch_summary", json={"sample_count": 5})
+    dmv = client.post("/fetch_dmv", json={})
+
+    def timeline(self):
+        raise AssertionError("The timeline is loaded on a cache hit.")
+
+    monkeypatch.setattr(HTTPServer, "timeline", property(timeline))
+    assert client.post("/fetch_summary", json={"sample_count": 5}).get_data() == summary.get_data()
+    assert client.post("/fetch_dmv", json={}).get_data() == dmv.get_data()
+
+
+def test_the_ensemble_summary_is_shared_across_the_experiments(server, client, monkeypatch):
+    calls = []
+    get_summary = server.profiles.get_summary
+    monkeypatch.setattr(server.profiles, "get_summary", lambda *args, **kwargs: calls.append(1) or get_summary(*args, **kwargs))
+
+    alice, bob = {SESSION_HEADER: "alice"}, {SESSION_HEADER: "bob"}
+    client.post("/set_experiment", json={"experiment": "run-a"}, headers=alice)
+    app.test_client().post("/set_experiment", json={"experiment": "run-b"}, headers=bob)
+    summary = client.post("/fetch_ensemble_summary", json={"sample_count": 5}, headers=alice)
+    other = app.test_client().post("/fetch_ensemble_summary", json={"sample_count": 5}, headers=bob)
+    assert other.get_data() == summary.get_data()
+    assert len(calls) == 1
+
+
+def test_no_experiment_selected_returns_an_empty_json(client):
+    assert client.post("/fetch_summary", json={"sample_count": 5}).get_json() == {}
+    assert client.post("/fetch_metrics_timeline").get_json() == {}
+
+
+def test_loading_another_data_dir_clears_the_response_cache(server, client, tmp_path):
+    client.post("/set_experiment", json={"experiment": "run-a"})
+    client.post("/fetch_summary", json={"sample_count": 5})
+    assert len(server.response_cache.entries) > 0
+
+    server.load(server.data_dir)
+    assert len(server.response_cache.entries) > 0
+
+    write_experiment(tmp_path, "run-c", 2)
+    data_dir = server.data_dir
+    server.load(str(tmp_path))
+    assert len(server.response_cache.entries) == 0
+    server.load(data_dir)
+
+
+def test_loading_the_loaded_data_dir_keeps_the_other_sessions(server):
+    alice, bob = app.test_client(), app.test_client()
+    alice.post("/set_experiment", json={"experiment": "run-b"}, headers={SESSION_HEADER: "alice"})
+    alice.post("/fetch_summary", json={"sample_count": 5}, headers={SESSION_HEADER: "alice"})
+    entries = len(server.response_cache.entries)
+
+    # NOTE: Another client opening the app loads the same data_dir.
+    assert bob.post("/load_example", json={"example": None}, headers={SESSION_HEADER: "bob"}).get_json() == {"status": True}
+    assert server.sessions.get_experiment("alice") == "run-b"
+    assert len(server.response_cache.entries) == entries
+    summary = alice.post("/fetch_summary", json={"sample_count": 5}, headers={SESSION_HEADER: "alice"}).get_json()
+    assert summary["startTs"] == 1669272387731917
+
+
+WINDOW = {"window_start": 1669272387731917, "window_end": 1669272387732317}
+
+
+@pytest.mark.parametrize("encoding, decompress", [("gzip", gzip.decompress), ("deflate", zlib.decompress)])
+def test_responses_are_compressed_as_negotiated(client, encoding, decompress):
+    client.post("/set_experiment", json={"experiment": "run-b"})
+    identity = client.post("/fetch_timeline", json=WINDOW)
+    assert "Content-Encoding" not in identity.headers
+
+    response = client.post("/fetch_timeline", json=WINDOW, headers={"Accept-Encoding": f"br, {encoding}"})
+    assert response.headers["Content-Encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert decompress(response.get_data()) == identity.get_data()
+
+    # The cached responses keep a separate ETag per content-coding.
+    cached = client.post("/fetch_summary", json={"sample_count": 50}, headers={"Accept-Encoding": encoding})
+    plain = client.post("/fetch_summary", json={"sample_count": 50})
+    assert cached.headers["Content-Encoding"] == encoding
+    assert decompress(cached.get_data()) == plain.get_data()
+    assert cached.headers["ETag"] != plain.headers["ETag"]
+    not_modified = client.post(
+        "/fetch_summary",
+        json={"sample_count": 50},
+        headers={"Accept-Encoding": encoding, "If-None-Match": cached.headers["ETag"]},
+    )
+    assert not_modified.status_code == 304
+
+
+def test_unsupported_encodings_fall_back_to_identity(client):
+    client.post("/set_experiment", json={"experiment": "run-b"})
+    identity = client.post("/fetch_timeline", json=WINDOW)
+    for accept_encoding in ["br", "identity", "gzip;q=0, br"]:
+        response = client.post("/fetch_timeline", json=WINDOW, headers={"Accept-Encoding": accept_encoding})
+        assert "Content-Encoding" not in response.headers
+        assert response.get_data() == identity.get_data()
+
+
+@pytest.mark.parametrize("endpoint", ["/fetch_timeline", "/fetch_window"])
+def test_streamed_json_is_byte_equivalent(client, endpoint):
+    client.post("/set_experiment", json={"experiment": "run-b"})
+    response = client.post(endpoint, json=WINDOW)
+    streamed = client.post(endpoint, json={**WINDOW, "stream": 1})
+
+    assert streamed.is_streamed
+    # NOTE: jsonify only appends a newline after the JSON document.
+    assert streamed.get_data() == response.get_data().rstrip(b"\n")
+    events = json.loads(streamed.get_data())
+    assert len(events["events"] if endpoint == "/fetch_timeline" else events) == 4
+
+    compressed = client.post(endpoint, json={**WINDOW, "stream": 1}, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.get_data()) == streamed.get_data()
+
+
+def decode_columnar(payload):
+    """
+    Decodes the columnar wire format (see `encode_columnar`) back into a list of events.
+    """
+    columns = {}
+    for col, values in payload["columns"].items():
+        if col in payload["dictionaries"]:
+            uniques = payload["dictionaries"][col]
+            values = [uniques[code] if code >= 0 else None for code in values]
+        columns[col] = values
+    for alias, col in payload["aliases"].items():
+        columns[alias] = columns[col]
+
+    return [{col: values[idx] for col, values in columns.items()} for idx in range(payload["length"])]
+
+
+def normalize(events):
+    # NOTE: A missing value is NaN in the records and null in the columnar format.
+    return sorted(
+        (json.dumps({key: None if val != val else val for key, val in event.items()}, sort_keys=True) for event in events)
+    )
+
+
+@pytest.mark.parametrize("endpoint", ["/fetch_timeline", "/fetch_window"])
+def test_columnar_events_decode_to_the_same_events(client, endpoint):
+    client.post("/set_experiment", json={"experiment": "run-b"})
+    response = client.post(endpoint, json=WINDOW).get_json()
+    columnar = client.post(endpoint, json={**WINDOW, "format": "columnar"}).get_json()
+
+    if endpoint == "/fetch_timeline":
+        assert {key: val for key, val in columnar.items() if key != "events"} == {
+            key: val for key, val in response.items() if key != "events"
+        }
+        response, columnar = response["events"], columnar["events"]
+
+    assert columnar["length"] == 4
+    assert columnar["aliases"] == {"content": "name"}
+    assert "name" in columnar["dictionaries"]
+    assert normalize(decode_columnar(columnar)) == normalize(response)
+
+
+def test_summary_pages_are_validated_and_cached_per_query(client):
+    client.post("/set_experiment", json={"experiment": "run-b"})
+    full = client.post("/fetch_event_summary", json={"groups": []}).get_json()
+    top = client.post("/fetch_event_summary", json={"groups": [], "top_k": 1}).get_json()
+    assert top[0] == full[0]
+    assert top[-1]["event"] == "other"
+
+    groups = client.get("/fetch_timeline_summary").get_json()
+    assert client.get("/fetch_timeline_summary?limit=1").get_json() == groups[:1]
+    assert client.get("/fetch_timeline_summary").get_json() == groups
+
+    assert client.get("/fetch_timeline_summary?limit=x").status_code == 400
+    assert client.post("/fetch_event_summary", json={"groups": [], "offset": -1}).status_code == 400
+
+
+def test_sessions_keep_their_own_experiment(client):
+    # NOTE: Each session is a separate client, with its own cookies.
+    alice, bob = {SESSION_HEADER: "alice"}, {SESSION_HEADER: "bob"}
+    clients = {"alice": client, "bob": app.test_client()}
+    assert clients["alice"].post("/set_experiment", json={"experiment": "run-a"}, headers=alice).status_code == 200
+    assert clients["bob"].post("/set_experiment", json={"experiment": "run-b"}, headers=bob).status_code == 200
+
+    for headers, start_ts, event_count in [(alice, 1669272387721917, 2), (bob, 1669272387731917, 4)]:
+        _client = clients[headers[SESSION_HEADER]]
+        timeline = _client.post("/fetch_timeline", json={"window_start": None, "window_end": None}, headers=headers)
+        assert timeline.get_json()["start_ts"] == start_ts
+        summary = _client.post("/fetch_summary", json={"sample_count": 5}, headers=headers).get_json()
+        assert summary["startTs"] == start_ts
+        window = _client.post("/fetch_window", json={**WINDOW, "window_start": start_ts}, headers=headers)
+        assert len(window.get_json()) == event_count
+
+
+def test_sessions_sharing_the_cookies_keep_their_own_experiment(client):
+    # NOTE: The tabs of a browser are separate sessions sharing one cookie jar.
+    alice, bob = {SESSION_HEADER: "alice"}, {SESSION_HEADER: "bob"}
+    client.post("/set_experiment", json={"experiment": "run-a"}, headers=alice)
+    client.post("/set_experiment", json={"experiment": "run-b"}, headers=bob)
+
+    for headers, start_ts in [(alice, 1669272387721917), (bob, 1669272387731917)]:
+        timeline = client.post("/fetch_timeline", json={"window_start": None, "window_end": None}, headers=headers)
+        assert timeline.get_json()["start_ts"] == start_ts
+
+    # Opening the app again resets the experiment of the session only.
+    assert client.post("/load_example", json={"example": None}, headers=alice).get_json() == {"status": True}
+    assert client.post("/fetch_summary", json={"sample_count": 5}, headers=alice).get_json() == {}
+    summary = client.post("/fetch_summary", json={"sample_count": 5}, headers=bob).get_json()
+    assert summary["startTs"] == 1669272387731917
+
+
+def test_set_experiment_rejects_a_missing_or_unknown_experiment(client):
+    assert client.post("/set_experiment", json={}).status_code == 400
+    assert client.post("/set_experiment", json={"experiment": "../run-a"}).status_code == 404
+    assert client.post("/set_experiment", json={"experiment": "run-c"}).status_code == 404
+
+    # NOTE: An unknown experiment mirrored by the client falls back to the one of the session.
+    headers = {SESSION_HEADER: "alice"}
+    client.post("/set_experiment", json={"experiment": "run-b"}, headers=headers)
+    timeline = client.post(
+        "/fetch_timeline",
+        json={"window_start": None, "window_end": None},
+        headers={**headers, EXPERIMENT_HEADER: "run-c"},
+    )
+    assert timeline.get_json()["start_ts"] == 1669272387731917
+
+
+def test_session_store_drops_the_least_recently_used_sessions():
+    sessions = SessionStore(max_sessions=2)
+    sessions.set_experiment("a", "run-a")
+    sessions.set_experiment("b", "run-b")
+    assert sessions.get_experiment("a") == "run-a"
+    sessions.set_experiment("c", "run-c")
+
+    assert sessions.get_experiment("b") == ""
+    assert list(sessions.experiments) == ["a", "c"]
+
+
+def test_the_experiment_mirrored_by_the_client_takes_precedence(client):
+    # NOTE: In the production mode, the session may have been set on another worker.
+    client.post("/set_experiment", json={"experiment": "run-a"}, headers={SESSION_HEADER: "alice"})
+    timeline = client.post(
+        "/fetch_timeline",
+        json={"window_start": None, "window_end": None},
+        headers={SESSION_HEADER: "alice", EXPERIMENT_HEADER: "run-b"},
+    )
+    assert timeline.get_json()["start_ts"] == 1669272387731917
+
+
+def test_a_preloaded_server_does_not_load_another_data_dir(server, tmp_path):
+    server.is_preloaded = True
+    try:
+        assert server.load(server.data_dir)
+        assert not server.load(str(tmp_path))
+        assert server.profiles.ensemble == {"run-a", "run-b"}
+    finally:
+        server.is_preloaded = False
+
+
+def test_keep_alive_handler_reuses_one_connection():
+    echo_app = Flask("echo")
+
+    @echo_app.route("/echo", methods=["POST"])
+    def echo():
+        return request.get_data()
+
+    @echo_app.route("/stream", methods=["GET"])
+    def stream():
+        return echo_app.response_class((chunk for chunk in [b"a", b"b", b"c"]), mimetype="text/plain")
+
+    server = make_server("127.0.0.1", 0, echo_app, threaded=True, request_handler=KeepAliveRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+        sockets = []
+        for idx in range(3):
+            connection.request("POST", "/echo", body=f"request-{idx}")
+            response = connection.getresponse()
+            assert response.read() == f"request-{idx}".encode()
+            assert response.version == 11
+            assert not response.will_close
+            sockets.append(connection.sock)
+
+            connection.request("GET", "/stream")
+            response = connection.getresponse()
+            assert response.read() == b"abc"
+            assert not response.will_close
+            sockets.append(connection.sock)
+
+        assert all(sock is sockets[0] for sock in sockets)
+        connection.close()
+    finally:
+        server.shutdown()
@@ -0,0 +1,167 @@
+import json
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+from server.recorder import LOAD_RECORD, RECORDINGS_DIR, ResponseRecorder, load_recording
+from server.sessions import EXPERIMENT_HEADER, SESSION_HEADER
+from test_datasets import write_experiment
+
+
+def fake_request(path, body=None, headers={}, cookies={}):
+    return SimpleNamespace(
+        endpoint=path.strip("/"),
+        method="POST",
+        path=path,
+        args=SimpleNamespace(to_dict=lambda: {}),
+        get_json=lambda silent=False: body,
+        headers=headers,
+        cookies=cookies,
+    )
+
+
+def test_recorder_writes_requests_and_responses_in_the_background(tmp_path):
+    recorder = ResponseRecorder(str(tmp_path))
+    recorder.record_request(
+        fake_request("/set_experiment", {"experiment": "run-a"}),
+        SimpleNamespace(status_code=200, content_length=10),
+        1.5,
+    )
+    recorder.record_response({"events": [1, 2, 3]}, "fetch_timeline.json")
+    recorder.flush()
+
+    assert (tmp_path / RECORDINGS_DIR).is_dir()
+    [record] = load_recording(recorder.recording_path)
+    assert record["path"] == "/set_experiment"
+    assert record["body"] == {"experiment": "run-a"}
+    assert record["status"] == 200
+    assert json.loads((tmp_path / "fetch_timeline.json").read_text()) == {"events": [1, 2, 3]}
+
+
+def test_recorder_samples_and_caps_the_responses(tmp_path):
+    recorder = ResponseRecorder(str(tmp_path), sample_rate=0.0)
+    recorder.record_response({"events": []}, "sampled_out.json")
+    recorder.flush()
+    assert not (tmp_path / "sampled_out.json").exists()
+
+    recorder = ResponseRecorder(str(tmp_path), max_bytes=16)
+    recorder.record_response({"events": list(range(100))}, "too_large.json")
+    recorder.record_response({"events": []}, "small.json")
+    recorder.flush()
+    assert not (tmp_path / "too_large.json").exists()
+    assert (tmp_path / "small.json").exists()
+
+
+def test_recorder_bounds_the_pending_response_bytes(tmp_path, monkeypatch):
+    release = threading.Event()
+    write_response = ResponseRecorder._write_response
+
+    def blocked_write_response(self, body, file_name):
+        release.wait(timeout=10)
+        write_response(self, body, file_name)
+
+    monkeypatch.setattr(ResponseRecorder, "_write_response", blocked_write_response)
+
+    # NOTE: Each payload takes 27 bytes once serialized.
+    recorder = ResponseRecorder(str(tmp_path), max_bytes=30, max_queue_bytes=60)
+    payload = {"events": list(range(5))}
+    assert len(json.dumps(payload)) == 27
+    recorder.record_response({"events": list(range(100))}, "too_large.json")
+    for i in range(3):
+        recorder.record_response(payload, f"response-{i}.json")
+    assert recorder.dropped == 1
+    assert recorder._pending_bytes == 54
+
+    release.set()
+    recorder.flush()
+    assert recorder._pending_bytes == 0
+    assert [json.loads((tmp_path / f"response-{i}.json").read_text()) for i in range(2)] == [payload, payload]
+    assert not (tmp_path / "response-2.json").exists()
+    assert not (tmp_path / "too_large.json").exists()
+
+    recorder.record_response(payload, "response-2.json")
+    recorder.flush()
+    assert (tmp_path / "response-2.json").exists()
+
+
+def test_recorder_records_the_session_headers(tmp_path):
+    recorder = ResponseRecorder(str(tmp_path))
+    response = SimpleNamespace(status_code=200, content_length=10)
+    recorder.record_request(fake_request("/fetch_timeline", headers={SESSION_HEADER: "alice"}), response, 1.0)
+    recorder.record_request(
+        fake_request("/fetch_timeline", cookies={"dmv_session": "bob", "dmv_experiment.bob": "run b"}), response, 1.0
+    )
+    recorder.record_request(fake_request("/fetch_timeline"), response, 1.0)
+    recorder.flush()
+
+    records = load_recording(recorder.recording_path)
+    assert [record["headers"] for record in records] == [
+        {SESSION_HEADER: "alice"},
+        {SESSION_HEADER: "bob", EXPERIMENT_HEADER: "run%20b"},
+        {},
+    ]
+
+
+def test_replay_reports_the_latency_per_endpoint(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    write_experiment(data_dir, "run-a", 2)
+
+    recording_path = tmp_path / "recording.jsonl"
+    records = [
+        ("/load_example", {"example": "run"}),
+        ("/set_experiment", {"experiment": "run-a"}),
+        ("/fetch_timeline", {"window_start": None, "window_end": None}),
+    ]
+    recording_path.write_text(
+        "".join(
+            json.dumps({"endpoint": path.strip("/"), "method": "POST", "path": path, "query": {}, "body": body}) + "\n"
+            for path, body in records
+        )
+    )
+
+    # NOTE: The replay registers the routes on the (global) Flask app, so it runs in its own process.
+    result = subprocess.run(
+        [sys.executable, "-m", "server.recorder", str(recording_path), "--data_dir", str(data_dir)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    endpoints = [line.split()[0] for line in result.stdout.splitlines()[1:]]
+    assert endpoints == ["fetch_timeline", "load_example", "set_experiment"]
+    assert "returned" not in result.stdout + result.stderr
+
+
+def test_replay_loads_the_recorded_data_dir(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    write_experiment(data_dir, "run-a", 2)
+
+    recorder = ResponseRecorder(str(tmp_path))
+    recorder.record_load(str(data_dir), "DMV")
+    for path, body in [("/load_example", {"example": "run"}), ("/set_experiment", {"experiment": "run-a"})]:
+        recorder.record_request(fake_request(path, body), SimpleNamespace(status_code=200, content_length=10), 1.0)
+    recorder.flush()
+    [load, *requests] = load_recording(recorder.recording_path)
+    assert load["type"] == LOAD_RECORD and load["data_dir"] == str(data_dir)
+    assert all("type" not in request for request in requests)
+
+    result = subprocess.run(
+        [sys.executable, "-m", "server.recorder", recorder.recording_path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    endpoints = [line.split()[0] for line in result.stdout.splitlines()[1:]]
+    assert endpoints == ["load_example", "set_experiment"]
+    assert "returned" not in result.stdout + result.stderr
+
+    # NOTE: Without a recorded data_dir, it must be passed explicitly.
+    recording_path = tmp_path / "recording.jsonl"
+    recording_path.write_text("".join(json.dumps(request) + "\n" for request in requests))
+    result = subprocess.run(
+        [sys.executable, "-m", "server.recorder", str(recording_path)], capture_output=True, text=True
+    )
+    assert result.returncode != 0
+    assert "does not record a data directory" in result.stderr
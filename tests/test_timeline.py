@@ -0,0 +1,739 @@
+import json
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from server.cache import TimelineCache
+from server.ingest import ArgsStore, TraceReader
+from server.rules import Classifier, Rules
+from server.timeline import GROUP_DTYPE, TS_SCALE, Timeline
+from server.window_index import CoverageIndex, WindowIndex
+
+DEVICE_PROPERTIES = [{"id": 0, "name": "NVIDIA TITAN RTX", "numSms": 72}]
+
+METRICS = "timestamp, utilization_gpu, utilization_memory\n1, 10, 20\n2, 30, 40\n"
+
+
+def write_dmv_trace(tmp_path, events, name="run"):
+    """
+    Writes a DMV trace (and its metric file) with the given events; returns (metric path, trace path).
+    """
+    trace_file_path = tmp_path / f"{name}.json"
+    metric_file_path = tmp_path / f"{name}.csv"
+    trace_file_path.write_text(
+        json.dumps({"schemaVersion": 1, "deviceProperties": DEVICE_PROPERTIES, "traceEvents": events})
+    )
+    metric_file_path.write_text(METRICS)
+    return str(metric_file_path), str(trace_file_path)
+
+
+def x_event(name, ts, dur, **kwargs):
+    return {"ph": "X", "cat": "cuda_runtime", "name": name, "pid": 1, "tid": 1, "ts": ts, "dur": dur, **kwargs}
+
+
+def write_raw_trace(tmp_path, events_text, name="run"):
+    """
+    Same as write_dmv_trace, but with the (JSON) text of the events as-is.
+    """
+    trace_file_path = tmp_path / f"{name}.json"
+    metric_file_path = tmp_path / f"{name}.csv"
+    header = json.dumps({"schemaVersion": 1, "deviceProperties": DEVICE_PROPERTIES})[:-1]
+    trace_file_path.write_text(header + ', "traceEvents": [' + ",".join(events_text) + "]}")
+    metric_file_path.write_text(METRICS)
+    return str(metric_file_path), str(trace_file_path)
+
+
+def test_trace_reader_across_chunk_boundaries(tmp_path):
+    # NOTE: A tiny chunk size splits every token (strings, numbers, nested objects) across chunks.
+    document = {
+        "test": {"owner": "me", "tags": ["a", "b"]},
+        "data": {
+            "schemaVersion": 1,
+            "traceEvents": [
+                {"name": f"event-{i}", "ph": "X", "ts": 1000 + i, "dur": 2.5, "args": {"nested": {"id": [i, None]}}}
+                for i in range(20)
+            ],
+            "tail": "value with \"escapes\" and ]}",
+        },
+    }
+    trace_file_path = tmp_path / "run.json"
+    trace_file_path.write_text(json.dumps(document, indent=1))
+
+    for chunk_size in [1, 7, 64, 1 << 20]:
+        reader = TraceReader(str(trace_file_path), ["data", "traceEvents"], chunk_size=chunk_size)
+        assert list(reader) == document["data"]["traceEvents"]
+        assert reader.found
+        assert reader.header == {
+            "test": document["test"],
+            "data": {"schemaVersion": 1, "tail": document["data"]["tail"]},
+        }
+
+
+def test_timeline_streams_the_allowed_events(tmp_path):
+    events = [
+        {"ph": "M", "name": "process_name", "pid": 1, "tid": 1, "ts": 0, "args": {"name": "proc"}},
+        x_event("cudaMalloc", 1669272387721917, 246, args={"bytes": 10}),
+        x_event("cudaMemcpy", 1669272387738317, 10),
+    ]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    assert timeline.timeline_df["name"].tolist() == ["cudaMalloc", "cudaMemcpy"]
+    assert timeline.timeline_df["ts"].tolist() == [1669272387721917, 1669272387738317]
+    assert timeline.start_ts == 1669272387721917
+    assert timeline.end_ts == 1669272387738317
+    assert {"name": "numSms", "key": 72} in timeline.metadata
+
+
+def test_timeline_cache_round_trip_and_invalidation(tmp_path):
+    events = [
+        x_event("cudaMalloc", 1669272387721917, 246, args={"bytes": 10}),
+        x_event("cudaMemcpy", 1669272387738317, 10, args={"bytes": 20}),
+    ]
+    metric_file_path, trace_file_path = write_dmv_trace(tmp_path, events)
+    cache = TimelineCache(str(tmp_path / "cache"))
+
+    timeline = cache.load_or_construct(metric_file_path, trace_file_path, "DMV")
+    fingerprint = TimelineCache.fingerprint(trace_file_path, metric_file_path)
+    cached = cache.load(trace_file_path, fingerprint)
+
+    assert cached is not None
+    assert cached.get_scalars() == timeline.get_scalars()
+    assert cache.load_scalars(metric_file_path, trace_file_path) == timeline.get_scalars()
+    # NOTE: The numeric columns of the cached frames are memory-mapped, hence compared with `equals`.
+    assert cached.timeline_df.equals(timeline.timeline_df)
+    assert cached.grp_df_dict.keys() == timeline.grp_df_dict.keys()
+    for key, df in timeline.grp_df_dict.items():
+        assert cached.grp_df_dict[key].equals(df)
+    assert cached.get_timeline() == timeline.get_timeline()
+
+    # A changed trace invalidates the entry.
+    events.append(x_event("cudaMalloc", 1669272387738417, 5))
+    write_dmv_trace(tmp_path, events)
+    os.utime(trace_file_path, ns=(0, os.stat(trace_file_path).st_mtime_ns + 1))
+    assert TimelineCache.fingerprint(trace_file_path, metric_file_path) != fingerprint
+    assert cache.load(trace_file_path, TimelineCache.fingerprint(trace_file_path, metric_file_path)) is None
+    assert cache.load_scalars(metric_file_path, trace_file_path) is None
+
+    timeline = cache.load_or_construct(metric_file_path, trace_file_path, "DMV")
+    assert timeline.get_event_count() == 3
+    assert cache.load_scalars(metric_file_path, trace_file_path)["event_count"] == 3
+
+
+def test_concurrent_loads_construct_a_cache_entry_once(tmp_path, monkeypatch):
+    events = [x_event("cudaMalloc", 1669272387721917, 246), x_event("cudaMemcpy", 1669272387738317, 10)]
+    metric_file_path, trace_file_path = write_dmv_trace(tmp_path, events)
+
+    constructed = []
+    barrier = threading.Barrier(4)
+
+    init = Timeline.__init__
+
+    def construct(self, *args):
+        constructed.append(args)
+        time.sleep(0.1)
+        init(self, *args)
+
+    monkeypatch.setattr(Timeline, "__init__", construct)
+
+    def load(results):
+        # NOTE: Each worker has its own cache instance, as each production worker does.
+        cache = TimelineCache(str(tmp_path / "cache"))
+        barrier.wait()
+        results.append(cache.load_or_construct(metric_file_path, trace_file_path, "DMV"))
+
+    results = []
+    threads = [threading.Thread(target=load, args=(results,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(constructed) == 1
+    assert len(results) == 4
+    assert all(timeline.get_event_count() == 2 for timeline in results)
+
+
+def test_classifier_picks_the_first_matching_regex():
+    grouping = {
+        "memory": {"regex": ["Memcpy", "Memset"], "event_type": "range"},
+        "runtime": {"regex": ["^cuda"]},
+        "kernel": {"regex": ["kernel"]},
+    }
+    classifier = Classifier(grouping)
+    names = pd.Series(["cudaMemcpy", "cudaMalloc", "gemm_kernel", "cudaMalloc", "other"])
+
+    groups = classifier.classify(names)
+    assert groups[:4].tolist() == ["memory", "runtime", "kernel", "runtime"]
+    assert groups.isna().tolist() == [False, False, False, False, True]
+    assert classifier.group_to_type == {"memory": "range"}
+
+
+def test_the_shared_classifier_does_not_grow_with_the_event_names():
+    classifier = Rules.get_classifier("dmv")
+    assert Rules.get_classifier("dmv") is classifier
+    state = pickle.dumps(classifier.__dict__)
+
+    groups = classifier.classify(pd.Series([f"cudaMalloc_{i}" for i in range(1000)]))
+    assert groups.nunique() == 1
+    assert pickle.dumps(classifier.__dict__) == state
+
+
+def test_timeline_vis_fields_by_group_and_phase(tmp_path):
+    events = [x_event("cudaMalloc", 1669272387721917, 246), x_event("cudaMemcpy", 1669272387738317, 10)]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    classifier = Classifier(timeline.rules["grouping"])
+    assert timeline.timeline_df["group"].tolist() == classifier.classify(pd.Series(["cudaMalloc", "cudaMemcpy"])).tolist()
+    assert timeline.timeline_df["type"].tolist() == ["x-range", "x-range"]
+    assert timeline.timeline_df["content"].tolist() == ["cudaMalloc", "cudaMemcpy"]
+
+
+def test_match_start_and_end_events_per_thread():
+    df = pd.DataFrame(
+        [
+            ("outer", "B", 1, 1),  # 0
+            ("other", "B", 1, 2),  # 1: Interleaved with (1, 1).
+            ("inner", "B", 1, 1),  # 2: Nested in `outer`.
+            ("inner", "E", 1, 1),  # 3
+            ("point", "X", 1, 1),  # 4: Neither a begin nor an end event.
+            ("other", "E", 1, 2),  # 5
+            ("outer", "E", 1, 1),  # 6
+            ("stray", "E", 2, 1),  # 7: End event without a begin event.
+            ("open", "B", 2, 1),  # 8: Begin event without an end event.
+            ("same", "B", 2, 2),  # 9
+            ("same", "E", 2, 2),  # 10
+        ],
+        columns=["name", "ph", "pid", "tid"],
+    )
+    begin, end = Timeline.match_start_and_end_events(df)
+
+    assert sorted(zip(begin.tolist(), end.tolist())) == [(0, 6), (1, 5), (2, 3), (9, 10)]
+    assert end.tolist() == sorted(end.tolist())
+
+
+def test_match_start_and_end_events_skips_the_malformed_end_events():
+    df = pd.DataFrame(
+        [
+            ("outer", "B", 1, 1),  # 0
+            ("stray", "E", 1, 1),  # 1: Does not close `outer`; skipped.
+            ("inner", "B", 1, 1),  # 2
+            ("inner", "E", 1, 1),  # 3
+            ("outer", "E", 1, 1),  # 4
+            ("open", "B", 1, 1),  # 5
+            ("inner", "B", 1, 1),  # 6
+            ("other", "E", 1, 1),  # 7: Does not close `inner`; skipped.
+            ("inner", "E", 1, 1),  # 8
+            ("same", "B", 1, 2),  # 9: A well-formed thread.
+            ("same", "E", 1, 2),  # 10
+        ],
+        columns=["name", "ph", "pid", "tid"],
+    )
+    df["name"] = df["name"].astype("category")
+    begin, end = Timeline.match_start_and_end_events(df)
+
+    # NOTE: The pairs of a stack over the events (i.e., the pairing of the events in order).
+    assert sorted(zip(begin.tolist(), end.tolist())) == [(0, 4), (2, 3), (6, 8), (9, 10)]
+    assert end.tolist() == sorted(end.tolist())
+
+
+def test_range_events_span_their_begin_and_end(tmp_path):
+    def event(name, ph, ts, id):
+        return {"name": name, "ph": ph, "ts": ts, "pid": 1, "tid": 1, "args": {}, "id": id}
+
+    events = [
+        event("Epoch", "B", 1669272387721910, 0),
+        event("runtime", "B", 1669272387721911, 1),
+        event("runtime", "E", 1669272387721920, 2),
+        event("Epoch", "E", 1669272387721930, 3),
+    ]
+    trace_file_path = tmp_path / "run.json"
+    trace_file_path.write_text(json.dumps({"test": {"owner": "me"}, "data": {"traceEvents": events}}))
+    timeline = Timeline("", str(trace_file_path), "JIT")
+
+    ranges = timeline.grp_df_dict["range"]
+    assert ranges["name"].tolist() == ["runtime"]
+    assert ranges["start"].tolist() == [1669272387721911]
+    assert ranges["end"].tolist() == [1669272387721920]
+    assert ranges["dur"].tolist() == [9]
+
+
+def test_x_events_become_ranges_of_their_duration(tmp_path):
+    events = [x_event("cudaMalloc", 1669272387721917, 246), x_event("cudaMemcpy", 1669272387738317, 10)]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    x_ranges = timeline.grp_df_dict["x-range"].sort_values("start")
+    assert x_ranges["start"].tolist() == [1669272387721917, 1669272387738317]
+    assert x_ranges["end"].tolist() == [1669272387722163, 1669272387738327]
+    assert x_ranges["dur"].tolist() == [246, 10]
+    assert x_ranges["type"].tolist() == ["range", "range"]
+    assert x_ranges["idx"].tolist() == [0, 1]
+    assert x_ranges["group"].tolist() == [timeline.grp_to_idx[grp] for grp in timeline.timeline_df["group"]]
+    assert x_ranges["className"].tolist() == [timeline.grp_to_cls[grp] for grp in timeline.timeline_df["group"]]
+
+
+def test_window_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    starts = rng.integers(0, 1000, size=500).astype(np.float64)
+    ends = starts + rng.integers(0, 200, size=500)
+    ends[::10] = np.nan  # Point events.
+    df_dict = {
+        "range": pd.DataFrame({"start": starts, "end": ends}),
+        "point": pd.DataFrame({"start": starts[:50]}),
+        "empty": pd.DataFrame({"start": [], "end": []}),
+    }
+    index = WindowIndex(df_dict)
+
+    for window_start, window_end in [(-10, 2000), (0, 0), (500, 500), (250, 600), (999, 1500), (1300, 1400)]:
+        ret = index.query(window_start, window_end)
+        for key, df in df_dict.items():
+            if df.empty:
+                assert key not in ret
+                continue
+
+            _ends = df["end"].fillna(df["start"]) if "end" in df.columns else df["start"]
+            expected = np.flatnonzero((df["start"] <= window_end) & (_ends >= window_start))
+            assert sorted(ret[key].tolist()) == expected.tolist()
+            assert np.all(np.diff(df["start"].to_numpy()[ret[key]]) >= 0)
+
+
+def test_window_index_keeps_the_ticks_of_large_timestamps():
+    # NOTE: float64 can not tell these ticks apart (i.e., they are 256 ticks apart at this magnitude).
+    end = 1669272387721918123
+    df = pd.DataFrame(
+        {
+            "start": np.array([end - 1000, end + 1], dtype=np.int64),
+            "end": np.array([end, end + 2], dtype=np.int64),
+        }
+    )
+    index = WindowIndex({"range": df})
+
+    assert index.query(end, end + 10)["range"].tolist() == [0, 1]
+    assert index.query(end + 1, end + 10)["range"].tolist() == [1]
+    assert index.query(end - 2000, end)["range"].tolist() == [0]
+
+
+def test_get_window_at_a_large_fractional_timestamp(tmp_path):
+    events = [
+        '{"ph": "X", "cat": "cuda_runtime", "name": "cudaMalloc", "pid": 1, "tid": 1, '
+        '"ts": 1669272387721917.124, "dur": 1}',
+        '{"ph": "X", "cat": "cuda_runtime", "name": "cudaMemcpy", "pid": 1, "tid": 1, '
+        '"ts": 1669272387721917.5, "dur": 0.75}',
+    ]
+    timeline = Timeline(*write_raw_trace(tmp_path, events), "DMV")
+
+    # NOTE: The window starts exactly at the end of the cudaMemcpy, after the end of the cudaMalloc.
+    window = timeline.get_window(1669272387721918.25, 1669272387721919)
+    assert [event["name"] for event in window] == ["cudaMemcpy"]
+    window = timeline.get_window(1669272387721918.0, 1669272387721919)
+    assert sorted(event["name"] for event in window) == ["cudaMalloc", "cudaMemcpy"]
+
+
+def test_get_window_includes_the_events_overlapping_the_window(tmp_path):
+    events = [
+        x_event("cudaMalloc", 1669272387721000, 500),  # Starts before the window.
+        x_event("cudaMemcpy", 1669272387721600, 10),
+        x_event("cudaMalloc", 1669272387722000, 10),  # Starts after the window.
+    ]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    window = timeline.get_window(1669272387721400, 1669272387721700)
+    assert sorted(event["start"] for event in window) == [1669272387721000, 1669272387721600]
+
+
+def test_get_timeline_honors_the_window_and_merges_sub_pixel_events(tmp_path):
+    start_ts = 1669272387721000
+    events = [x_event("cudaMalloc", start_ts + 10 * i, 2) for i in range(10)]
+    events.append(x_event("cudaMalloc", start_ts + 1000, 500))
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    window = timeline.get_timeline(start_ts + 900, start_ts + 2000)
+    assert [event["start"] for event in window["events"]] == [start_ts + 1000]
+
+    # NOTE: With 10 pixels, a pixel spans 150us; the 10 short events fall in the first one.
+    merged = timeline.get_timeline(start_ts, start_ts + 1500, width=10)
+    assert sorted((event["name"], event["start"], event["end"]) for event in merged["events"]) == [
+        ("10 events", start_ts, start_ts + 92),
+        ("cudaMalloc", start_ts + 1000, start_ts + 1500),
+    ]
+
+
+def brute_force_histogram(df, edges):
+    """
+    Busy time of each group in the bins [edges[i], edges[i + 1]) by overlapping every event with every bin.
+    """
+    bins = list(zip([-np.inf, *edges[1:]], [*edges[1:], np.inf]))
+    ret = {}
+    for grp, start, end in df[["group", "start", "end"]].itertuples(index=False):
+        busy = ret.setdefault(grp, np.zeros(len(bins)))
+        for i, (lo, hi) in enumerate(bins):
+            busy[i] += max(0, min(end, hi) - max(start, lo))
+    return ret
+
+
+def test_coverage_index_matches_brute_force_binning():
+    rng = np.random.default_rng(1)
+    start_ts = 1669272387721917
+    starts = start_ts + rng.integers(0, 10000, size=300)
+    df = pd.DataFrame(
+        {
+            "group": rng.integers(0, 3, size=300),
+            "start": starts,
+            "end": starts + rng.integers(0, 3000, size=300),
+        }
+    )
+    edges = np.arange(start_ts, start_ts + 12000, 1000)
+
+    ret = CoverageIndex([df.iloc[:100], df.iloc[100:], df.iloc[:0]], origin=start_ts).histogram(edges)
+    expected = brute_force_histogram(df, edges)
+    assert ret.keys() == expected.keys()
+    for grp in expected:
+        assert ret[grp].tolist() == expected[grp].tolist()
+
+    # Fixed-point ticks are binned in units.
+    ticks = df.assign(start=df["start"] * TS_SCALE, end=df["end"] * TS_SCALE)
+    ret = CoverageIndex([ticks], origin=start_ts, scale=TS_SCALE).histogram(edges)
+    for grp in expected:
+        assert ret[grp].tolist() == expected[grp].tolist()
+
+
+def test_get_summary_bins_the_busy_time_of_each_group(tmp_path):
+    start_ts = 1669272387721000
+    events = [x_event("cudaMalloc", start_ts + 100 * i, 60) for i in range(10)]
+    events.append(x_event("cudaMemcpy", start_ts + 1000, 10))
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    summary = timeline.get_summary(sample_count=5)
+    assert summary["xData"] == list(range(start_ts, start_ts + 1000, 200))
+    for grp in summary["zData"]:
+        busy = [sample[grp] for sample in summary["yData"]]
+        x_ranges = timeline.grp_df_dict["x-range"]
+        x_ranges = x_ranges[x_ranges["group"] == timeline.grp_to_idx[grp]]
+        assert sum(busy) == (x_ranges["end"] - x_ranges["start"]).sum()
+    # NOTE: The last bin extends to the end of the trace: two cudaMalloc and the cudaMemcpy.
+    assert summary["maxY"] == 130
+
+
+def test_dmv_totals_per_direction_and_group(tmp_path):
+    start_ts = 1669272387721000
+    events = [
+        x_event("cudaMemcpyHtoD", start_ts, 10, args={"bytes": 100, "memory bandwidth (GB/s)": 2.0}),
+        x_event("cudaMemcpyDtoH", start_ts + 100, 10, args={"bytes": 30, "memory bandwidth (GB/s)": 4.0}),
+        x_event("cudaMemcpyHtoD", start_ts + 200, 10, args={"bytes": 50}),
+        x_event("cudaMalloc", start_ts + 300, 10, args={"size": 1}),
+    ]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    dmv = timeline.get_dmv()
+    assert dmv == {
+        "total_bytes_HtoD": 150,
+        "total_bytes_DtoH": 30,
+        "total_bytes_DtoD": 0,
+        "total_bytes_PtoP": 0,
+        "avg_mem_bandwidth": 3.0,
+        "min_mem_bandwidth": 2.0,
+        "max_mem_bandwidth": 4.0,
+        # NOTE: 180 bytes over 30us.
+        "weighted_mem_bandwidth": pytest.approx(0.006),
+    }
+
+    by_group = timeline.get_dmv_by_group()
+    assert by_group["total"] == dmv
+    assert sum(stats["total_bytes_HtoD"] for stats in by_group["groups"].values()) == 150
+
+    # NOTE: Only the events overlapping the window (i.e., the second and third memcpy).
+    window = timeline.get_dmv_by_group(start_ts + 105, start_ts + 205)
+    assert window["total"]["total_bytes_HtoD"] == 50
+    assert window["total"]["total_bytes_DtoH"] == 30
+    assert window["total"]["avg_mem_bandwidth"] == 4.0
+
+
+def test_dmv_bandwidth_of_a_known_memcpy_set(tmp_path):
+    start_ts = 1669272387721000
+    events = [
+        x_event("cudaMemcpyHtoD", start_ts, 10, args={"bytes": 2000000, "memory bandwidth (GB/s)": 200.0}),
+        x_event("cudaMemcpyDtoH", start_ts + 100, 40, args={"bytes": 1000000, "memory bandwidth (GB/s)": 25.0}),
+    ]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    dmv = timeline.get_dmv()
+    assert dmv["min_mem_bandwidth"] == 25.0
+    assert dmv["max_mem_bandwidth"] == 200.0
+    assert dmv["avg_mem_bandwidth"] == 112.5
+    # The long (slow) memcpy weighs more: 3MB over 50us.
+    assert dmv["weighted_mem_bandwidth"] == pytest.approx(60.0)
+
+    window = timeline.get_dmv_by_group(start_ts + 100, start_ts + 140)
+    assert window["total"]["min_mem_bandwidth"] == window["total"]["max_mem_bandwidth"] == 25.0
+    assert window["total"]["weighted_mem_bandwidth"] == pytest.approx(25.0)
+
+
+def test_typed_args_columns_of_the_kernels(tmp_path):
+    start_ts = 1669272387721000
+    kernel_args = {
+        "est. achieved occupancy %": 50,
+        "blocks per SM": 4.5,
+        "shared memory": 1024,
+        "registers per thread": 32,
+        "grid": [8, 4, 1],
+        "block": [256, 1, 1],
+        "stream": 7,
+    }
+    events = [
+        x_event("cudaMemcpy", start_ts, 10, args={"bytes": 100}),
+        x_event("sgemm_kernel", start_ts + 100, 10, cat="kernel", args=kernel_args),
+        x_event("sgemm_kernel", start_ts + 200, 10, cat="kernel", args={**kernel_args, "est. achieved occupancy %": 100}),
+    ]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    args_df = timeline.args_df
+    assert args_df.index.tolist() == [0, 1, 2]
+    assert str(args_df["grid_x"].dtype) == "Int64"
+    assert args_df["grid_x"].tolist()[1:] == [8, 8]
+    assert args_df["block_x"].tolist()[1:] == [256, 256]
+    assert pd.isna(args_df["stream"].iloc[0])
+    assert args_df["bytes"].iloc[0] == 100
+    assert args_df["occupancy"].tolist()[1:] == [50.0, 100.0]
+
+    assert timeline.get_occupancy() == 75.0
+    assert timeline.get_cpu_utilization() == round(9 / 49152 * 100, 2)
+
+    # NOTE: A trace without kernels has no occupancy rather than a division by zero.
+    timeline = Timeline(*write_dmv_trace(tmp_path, events[:1], name="no-kernels"), "DMV")
+    assert timeline.get_occupancy() == 0
+
+
+def test_args_store_decodes_the_args_of_each_event(tmp_path):
+    args = [{"bytes": 10, "name": "ünïcode"}, None, {"nested": {"grid": [1, 2, 3]}}, {}]
+    store = ArgsStore()
+    for _args in args:
+        store.append(_args)
+    store.freeze()
+    assert len(store) == 4
+    assert [store[idx] for idx in range(4)] == [args[0], None, args[2], {}]
+    assert store[-2] == args[2]
+
+    events = [
+        x_event("cudaMalloc", 1669272387721917, 246, args={"bytes": 10, "stream": 7}),
+        x_event("cudaMemcpy", 1669272387738317, 10),
+    ]
+    metric_file_path, trace_file_path = write_dmv_trace(tmp_path, events)
+    cache = TimelineCache(str(tmp_path / "cache"))
+    timeline = cache.load_or_construct(metric_file_path, trace_file_path, "DMV")
+    cached = cache.load(trace_file_path, TimelineCache.fingerprint(trace_file_path, metric_file_path))
+    for _timeline in [timeline, cached]:
+        assert _timeline.get_event_args(0) == {"bytes": 10, "stream": 7}
+        assert _timeline.get_event_args(1) == {}
+
+
+def test_integral_timestamps_are_not_scaled(tmp_path):
+    events = [x_event("cudaMalloc", 1669272387721917, 246), x_event("cudaMemcpy", 1669272387738317, 10)]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    assert timeline.ts_scale == 1
+    assert timeline.timeline_df["ts"].tolist() == [1669272387721917, 1669272387738317]
+    assert timeline.start_ts == 1669272387721917
+
+
+def test_events_are_stored_in_a_compact_typed_schema(tmp_path):
+    events = [
+        x_event("cudaMalloc", 1000.5, 2.25),
+        x_event("cudaMemcpy", 1010, 4),
+        x_event("cudaMalloc", 1020.125, 1),
+    ]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    df = timeline.timeline_df
+    for col in ["ph", "cat", "name", "group", "type", "content"]:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype), col
+    assert df["pid"].dtype == np.int8 and df["tid"].dtype == np.int8
+    assert df["ts"].dtype == np.int64 and df["dur"].dtype == np.int64
+
+    # NOTE: The fractional timestamps are stored as ticks, and converted back to the trace units by the APIs.
+    assert timeline.ts_scale == TS_SCALE
+    assert df["ts"].tolist() == [1000500, 1010000, 1020125]
+    ranges = timeline.grp_df_dict["x-range"]
+    assert ranges["group"].dtype == GROUP_DTYPE
+    assert isinstance(ranges["className"].dtype, pd.CategoricalDtype)
+
+    window = timeline.get_window(1002.5, 1015)
+    assert sorted((event["start"], event["end"]) for event in window) == [(1000.5, 1002.75), (1010.0, 1014.0)]
+
+
+def test_event_and_group_summaries_from_the_event_index(tmp_path):
+    start_ts = 1669272387721000
+    events = [
+        x_event("cudaMalloc", start_ts, 30),
+        x_event("cudaMemcpy", start_ts + 100, 5),
+        x_event("cudaMalloc", start_ts + 200, 20),
+        x_event("cudaFree", start_ts + 300, 70),
+    ]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    event_summary = timeline.get_event_summary()
+    assert [(row["event"], row["dur"], row["count"]) for row in event_summary] == [
+        ("cudaFree", 70, 1),
+        ("cudaMalloc", 50, 2),
+        ("cudaMemcpy", 5, 1),
+    ]
+    for row in event_summary:
+        group = timeline.timeline_df.loc[timeline.timeline_df["name"] == row["event"], "group"].iloc[0]
+        assert row["group"] == timeline.grp_to_idx[group]
+
+    # NOTE: The duration and count of a group are the sums over its events.
+    expected = {}
+    for row in event_summary:
+        group = timeline.idx_to_grp[row["group"]]
+        dur, count = expected.get(group, (0, 0))
+        expected[group] = (dur + row["dur"], count + row["count"])
+    timeline_summary = timeline.get_timeline_summary()
+    assert {row["group"]: (row["dur"], row["count"]) for row in timeline_summary} == expected
+    assert [row["dur"] for row in timeline_summary] == sorted(dur for dur, _ in expected.values())[::-1]
+
+    group = timeline_summary[-1]["group"]
+    assert {row["event"] for row in timeline.get_event_summary(groups=[group])} == {
+        row["event"] for row in event_summary if timeline.idx_to_grp[row["group"]] == group
+    }
+
+
+def test_summaries_are_paginated_or_folded_into_the_top_k(tmp_path):
+    start_ts = 1669272387721000
+    events = [x_event(f"cudaMalloc{i}", start_ts + 100 * i, 10 * (i + 1)) for i in range(6)]
+    timeline = Timeline(*write_dmv_trace(tmp_path, events), "DMV")
+
+    full = timeline.get_event_summary()
+    assert [row["event"] for row in full] == [f"cudaMalloc{i}" for i in reversed(range(6))]
+    assert timeline.get_event_summary(offset=2, limit=3) == full[2:5]
+    assert timeline.get_event_summary(offset=5, limit=3) == full[5:]
+
+    top = timeline.get_event_summary(top_k=2)
+    assert top[:2] == full[:2]
+    assert top[2]["event"] == "other"
+    assert top[2]["entries"] == 4
+    assert top[2]["dur"] == sum(row["dur"] for row in full[2:])
+    assert top[2]["count"] == 4
+    assert timeline.get_event_summary(top_k=6) == full
+
+    groups = timeline.get_timeline_summary()
+    assert timeline.get_timeline_summary(offset=0, limit=1) == groups[:1]
+    top = timeline.get_timeline_summary(top_k=0)
+    assert len(top) == 1 and top[0]["entries"] == len(groups)
+    assert top[0]["dur"] == sum(row["dur"] for row in groups)
+
+
+def test_runtime_sub_groups_of_every_span(tmp_path):
+    def event(name, ph, ts, id, args={}):
+        return {"name": name, "ph": ph, "ts": ts, "pid": 1, "tid": 1, "args": args, "id": id}
+
+    def nested(*spans):
+        return {
+            "traceEvents": [
+                {"name": name, "ph": ph, "ts": ts, "pid": 1, "tid": 2}
+                for name, start, end in spans
+                for ph, ts in [("B", start), ("E", end)]
+            ]
+        }
+
+    events = [
+        event("Epoch", "B", 1000, 0),
+        event("runtime", "B", 1001, 1),
+        event("runtime", "E", 1010, 2, nested(("FE_a", 1002, 1004), ("FE_b", 1005, 1008))),
+        event("runtime", "B", 1020, 3),
+        event("runtime", "E", 1030, 4, nested(("FE_a", 1021, 1029))),
+        event("Epoch", "E", 1040, 5),
+    ]
+    trace_file_path = tmp_path / "run.json"
+    trace_file_path.write_text(json.dumps({"test": {"owner": "me"}, "data": {"traceEvents": events}}))
+    timeline = Timeline("", str(trace_file_path), "JIT")
+
+    runtime = timeline.sub_grp_df_dict["runtime"]
+    rows = [
+        (row["rt_id"], row["name"], row["start"], row["end"], row["dur"])
+        for _, row in runtime.iterrows()
+    ]
+    # NOTE: Each span is followed by the synthetic setup (span start to the first event) and teardown (last event to the span end).
+    assert sorted(rows) == sorted(
+        [
+            (2, "FE_a", 1002, 1004, 2),
+            (2, "FE_b", 1005, 1008, 3),
+            (2, "RT_SETUP", 1001, 1002, 1),
+            (2, "RT_TEARDOWN", 1008, 1010, 2),
+            (4, "FE_a", 1021, 1029, 8),
+            (4, "RT_SETUP", 1020, 1021, 1),
+            (4, "RT_TEARDOWN", 1029, 1030, 1),
+        ]
+    )
+    assert runtime["rt_id"].tolist() == sorted(runtime["rt_id"].tolist())
+    assert runtime.index.equals(pd.RangeIndex(runtime.shape[0]))
+
+
+def test_fractional_epoch_timestamps_keep_sub_microsecond_precision(tmp_path):
+    # NOTE: float64 can not represent these timestamps; they must be converted from their decimal text.
+    events = [
+        '{"ph": "X", "cat": "cuda_runtime", "name": "cudaMalloc", "pid": 1, "tid": 1, '
+        '"ts": 1669272387721917.123, "dur": 10.001}',
+        '{"ph": "X", "cat": "cuda_runtime", "name": "cudaMemcpy", "pid": 1, "tid": 1, '
+        '"ts": 1669272387721917.456, "dur": 2}',
+    ]
+    timeline = Timeline(*write_raw_trace(tmp_path, events), "DMV")
+
+    assert timeline.ts_scale == TS_SCALE
+    assert timeline.timeline_df["ts"].tolist() == [1669272387721917123, 1669272387721917456]
+    assert timeline.timeline_df["dur"].tolist() == [10001, 2000]
+
+    ranges = timeline.grp_df_dict["x-range"].sort_values("start")
+    assert ranges["start"].tolist() == [1669272387721917123, 1669272387721917456]
+    assert ranges["end"].tolist() == [1669272387721927124, 1669272387721919456]
+
+
+def test_fractional_timestamps_of_nested_events_keep_sub_microsecond_precision(tmp_path):
+    # NOTE: The nested (sub-group) events are read back from the args store, which must keep the decimal text.
+    def event(name, ph, ts, id, args="{}"):
+        return f'{{"name": "{name}", "ph": "{ph}", "ts": {ts}, "pid": 1, "tid": 1, "args": {args}, "id": {id}}}'
+
+    nested = (
+        '{"traceEvents": ['
+        '{"name": "FE_a", "ph": "B", "ts": 1669272387721917.123, "pid": 1, "tid": 2}, '
+        '{"name": "FE_a", "ph": "E", "ts": 1669272387721917.456, "pid": 1, "tid": 2}]}'
+    )
+    events = [
+        event("Epoch", "B", 1669272387721910, 0),
+        event("runtime", "B", 1669272387721911, 1),
+        event("runtime", "E", 1669272387721920, 2, nested),
+        event("Epoch", "E", 1669272387721930, 3),
+    ]
+    trace_file_path = tmp_path / "run.json"
+    trace_file_path.write_text(
+        '{"test": {"owner": "me"}, "data": {"traceEvents": [' + ",".join(events) + "]}}"
+    )
+    timeline = Timeline("", str(trace_file_path), "JIT")
+
+    assert timeline.ts_scale == TS_SCALE
+    sub_grp_df = pd.concat(timeline.sub_grp_df_dict.values())
+    fe = sub_grp_df[sub_grp_df["name"] == "FE_a"]
+    assert fe["start"].tolist() == [1669272387721917123]
+    assert fe["end"].tolist() == [1669272387721917456]
+
+
+def test_merge_events_counts_only_the_small_events_of_a_bucket():
+    df = pd.DataFrame(
+        {
+            "group": [0, 0, 0, 0, 1],
+            "className": ["a", "a", "a", "a", "b"],
+            "start": [0.0, 1.0, 2.0, 12.0, 3.0],
+            "end": [8.0, 2.0, 3.0, 13.0, 4.0],
+        }
+    )
+    # Bucket [0, 10) of group 0 holds one long and two small events; bucket [10, 20) holds a single small event.
+    kept, blocks = Timeline.merge_events(df, origin=0, resolution=5)
+
+    assert kept["start"].tolist() == [0.0, 12.0, 3.0]
+    assert blocks[["group", "start", "end", "count"]].values.tolist() == [[0, 1.0, 3.0, 2]]
+    assert blocks["name"].tolist() == ["2 events"]
+
+    # A lone small event next to a long one is kept as-is (i.e., without any block).
+    assert len(Timeline.merge_events(df.iloc[[0, 1]], origin=0, resolution=5)) == 1